@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .services import metricas  # noqa: F401  (señales de Celery)
+
+        from django.conf import settings
+        if getattr(settings, 'SQL_LENTAS_ACTIVO', False):
+            from .services import consultas_lentas
+            consultas_lentas.activar()
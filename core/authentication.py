@@ -0,0 +1,233 @@
+"""
+Autenticación JWT basada en claims.
+
+Los tokens emitidos por el login llevan, firmados, los datos que las vistas
+consultan en cada request: tipo de usuario, rol, versión del rol e ids de
+médico/paciente/administrador. ``ClaimsJWTAuthentication`` construye con
+ellos un ``Usuario`` liviano sin tocar la base de datos:
+
+    - ``hasattr(user, 'paciente' | 'medico' | 'administrador')`` se responde
+      desde la caché de relaciones de la instancia (sin consultas).
+    - ``user.paciente`` / ``user.medico`` son instancias diferidas con su pk,
+      suficientes para filtrar; cualquier otro campo se carga al usarse.
+    - Los campos de Usuario que no vienen en el token también son diferidos.
+
+Si la versión del rol cambió desde que se emitió el token (Rol.permisos
+modificado), o la del usuario (``invalidar_usuario``: desactivado, cambio de
+rol, de perfil o de contraseña), el token se rechaza y el cliente debe
+refrescarlo; el refresco vuelve a leer los claims desde la base de datos.
+Si la caché no responde, el usuario se busca en la base de datos como con
+JWTAuthentication (nunca se aceptan los claims sin verificar las versiones).
+
+Se activa con JWT_AUTH_MODO=claims (ver settings); requiere la caché
+compartida, donde viven las versiones.
+
+Alternativa menos invasiva: ``CachedUserJWTAuthentication`` (JWT_AUTH_MODO=cache)
+sigue usando el ``Usuario`` completo, pero lo toma de la caché compartida
+con id_rol y los perfiles médico/paciente/administrador ya resueltos. Las
+vistas que modifican usuarios llaman a ``invalidar_usuario``.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import Administrador, Medico, Paciente, Rol, Usuario
+from .services import metricas
+from .services import permisos as permisos_rbac
+
+CLAIM_TIPO = 'tipo_usuario'
+CLAIM_ROL = 'rol_id'
+CLAIM_ROL_VERSION = 'rol_version'
+CLAIM_USUARIO_VERSION = 'usuario_version'
+CLAIM_MEDICO = 'medico_id'
+CLAIM_PACIENTE = 'paciente_id'
+CLAIM_ADMINISTRADOR = 'administrador_id'
+
+# Incrementar si cambia la forma del Usuario cacheado (campos o relaciones)
+ESQUEMA_USUARIO_CACHE = 1
+CLAVE_USUARIO = 'auth:usuario:v{esquema}:{usuario_id}'
+CLAVE_VERSION_USUARIO = 'auth:usuario:{usuario_id}:version'
+
+# Campos de Usuario que viajan en el token (el resto queda diferido)
+CAMPOS_USUARIO = ('email', 'nombre', 'apellido', 'is_active', 'is_staff', 'is_superuser')
+
+PERFILES = (
+    ('medico', Medico, CLAIM_MEDICO),
+    ('paciente', Paciente, CLAIM_PACIENTE),
+    ('administrador', Administrador, CLAIM_ADMINISTRADOR),
+)
+
+
+def version_claims_rol(rol_id):
+    """Parte propia del rol en su versión RBAC (None si la caché no responde)"""
+    version = permisos_rbac.version_rol(rol_id)
+    return version.split('.')[-1] if version else None
+
+
+def version_usuario(usuario_id):
+    """Versión de los datos del usuario en la caché compartida (None si no responde)"""
+    clave = CLAVE_VERSION_USUARIO.format(usuario_id=usuario_id)
+    try:
+        version = cache.get(clave)
+        if version is None:
+            cache.add(clave, permisos_rbac.version_inicial(), None)
+            version = cache.get(clave)
+    except Exception as e:
+        print(f"Error leyendo versión del usuario {usuario_id}: {str(e)}")
+        return None
+    return version
+
+
+def agregar_claims(token, usuario):
+    """Escribe en el token los claims de rol y perfil del usuario"""
+    token[CLAIM_TIPO] = usuario.tipo_usuario
+    token[CLAIM_ROL] = usuario.id_rol_id
+    token[CLAIM_ROL_VERSION] = version_claims_rol(usuario.id_rol_id)
+    token[CLAIM_USUARIO_VERSION] = version_usuario(usuario.pk)
+    for accesor, _modelo, claim in PERFILES:
+        token[claim] = usuario.pk if hasattr(usuario, accesor) else None
+    for campo in CAMPOS_USUARIO:
+        token[campo] = getattr(usuario, campo)
+    return token
+
+
+def tokens_para_usuario(usuario):
+    """RefreshToken con claims; su access_token hereda los mismos claims"""
+    return agregar_claims(RefreshToken.for_user(usuario), usuario)
+
+
+def _instancia_diferida(modelo, valores):
+    """Instancia con solo los campos de ``valores`` cargados; el resto se lee al accederlo"""
+    campos = [f.attname for f in modelo._meta.concrete_fields if f.attname in valores]
+    return modelo.from_db(DEFAULT_DB_ALIAS, campos, [valores[campo] for campo in campos])
+
+
+def usuario_desde_claims(token):
+    valores = {campo: token[campo] for campo in CAMPOS_USUARIO}
+    valores.update(
+        id=Usuario._meta.pk.to_python(token[api_settings.USER_ID_CLAIM]),
+        id_rol_id=token[CLAIM_ROL],
+    )
+    usuario = _instancia_diferida(Usuario, valores)
+    Usuario._meta.get_field('id_rol').set_cached_value(
+        usuario, _instancia_diferida(Rol, {'id': token[CLAIM_ROL]})
+    )
+
+    for accesor, modelo, claim in PERFILES:
+        relacion = Usuario._meta.get_field(accesor)
+        perfil = None
+        if token.get(claim) is not None:
+            perfil = _instancia_diferida(modelo, {'usuario_id': token[claim]})
+            modelo._meta.get_field('usuario').set_cached_value(perfil, usuario)
+        # Cachear None hace que hasattr(user, accesor) sea False sin consultar
+        relacion.set_cached_value(usuario, perfil)
+
+    return usuario
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication que arma el usuario desde los claims del token.
+    Los tokens emitidos antes de este modo (sin claims) siguen funcionando
+    con la búsqueda normal en la base de datos.
+    """
+
+    def get_user(self, validated_token):
+        if CLAIM_TIPO not in validated_token or CLAIM_ROL not in validated_token:
+            return super().get_user(validated_token)
+
+        version_rol = version_claims_rol(validated_token[CLAIM_ROL])
+        version_actual = version_usuario(validated_token[api_settings.USER_ID_CLAIM])
+        if version_rol is None or version_actual is None:
+            # Sin la caché no se puede saber si el token fue revocado: se
+            # valida el usuario contra la base de datos en lugar de los claims
+            return super().get_user(validated_token)
+
+        if validated_token.get(CLAIM_ROL_VERSION) != version_rol:
+            raise InvalidToken('Los permisos del rol cambiaron, refresque el token')
+        if validated_token.get(CLAIM_USUARIO_VERSION) != version_actual:
+            raise InvalidToken('Los datos del usuario cambiaron, refresque el token')
+
+        return usuario_desde_claims(validated_token)
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """Al refrescar, los claims se vuelven a leer desde la base de datos"""
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+
+        refresh = self.token_class(attrs['refresh'])
+        usuario = Usuario.objects.select_related(
+            'medico', 'paciente', 'administrador'
+        ).filter(**{api_settings.USER_ID_FIELD: refresh[api_settings.USER_ID_CLAIM]}).first()
+        if usuario is not None:
+            data['access'] = str(agregar_claims(refresh.access_token, usuario))
+
+        return data
+
+
+# ----- Usuario cacheado -----
+
+def _clave_usuario(usuario_id):
+    return CLAVE_USUARIO.format(esquema=ESQUEMA_USUARIO_CACHE, usuario_id=usuario_id)
+
+
+def cargar_usuario(usuario_id):
+    """Usuario con rol y perfiles resueltos en una sola consulta"""
+    return Usuario.objects.select_related(
+        'id_rol', 'medico', 'paciente', 'administrador'
+    ).get(pk=usuario_id)
+
+
+def invalidar_usuario(usuario_id):
+    """
+    Llamar después de modificar el usuario, su perfil o su contraseña:
+    descarta el Usuario cacheado y rechaza los tokens con claims anteriores
+    """
+    try:
+        cache.delete(_clave_usuario(usuario_id))
+    except Exception as e:
+        print(f"Error invalidando usuario {usuario_id} en caché: {str(e)}")
+    permisos_rbac.incrementar_version(CLAVE_VERSION_USUARIO.format(usuario_id=usuario_id))
+
+
+class CachedUserJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication que toma el Usuario de la caché compartida en lugar
+    de consultarlo (junto con sus perfiles) en cada request.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            usuario_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('El token no contiene identificación de usuario')
+
+        clave = _clave_usuario(usuario_id)
+        try:
+            usuario = cache.get(clave)
+        except Exception as e:
+            print(f"Error leyendo usuario de la caché: {str(e)}")
+            usuario = None
+        metricas.registrar_cache('auth_usuario', usuario is not None)
+
+        if usuario is None:
+            try:
+                usuario = cargar_usuario(usuario_id)
+            except Usuario.DoesNotExist:
+                raise AuthenticationFailed('Usuario no encontrado', code='user_not_found')
+            try:
+                cache.set(clave, usuario, getattr(settings, 'AUTH_USUARIO_CACHE_TTL', 300))
+            except Exception as e:
+                print(f"Error guardando usuario en caché: {str(e)}")
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not usuario.is_active:
+            raise AuthenticationFailed('Usuario inactivo', code='user_inactive')
+
+        return usuario
@@ -0,0 +1,166 @@
+import re
+from functools import reduce
+from operator import add
+
+from django.contrib.postgres.lookups import TrigramWordSimilar
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db.models import F, Lookup, Q, Value
+from django.db.models.functions import Greatest
+from rest_framework.filters import SearchFilter
+
+from .models import SinAcentos, Usuario
+from .services.typeahead import palabras_busqueda
+
+# Con menos letras los trigramas no discriminan: solo se busca por subcadena
+MINIMO_SIMILITUD = 3
+
+
+class BitacoraSearchFilter(SearchFilter):
+    """
+    Búsqueda de texto completo sobre la bitácora usando la columna
+    generada ``busqueda`` (tsvector en español con índice GIN).
+
+    ?search= acepta la sintaxis de búsqueda web de PostgreSQL:
+        palabras sueltas          todas deben aparecer (con stemming)
+        "frase exacta"            búsqueda por frase
+        termino1 or termino2      alternativas
+        -termino                  excluir
+    El término también se compara con el email del usuario que realizó
+    la acción.
+
+    ?ordering=relevancia ordena por SearchRank en lugar de por fecha.
+    Debe ir después de OrderingFilter en filter_backends.
+    """
+    config = 'spanish'
+    campo_vector = 'busqueda'
+    orden_relevancia = ('relevancia', '-relevancia')
+
+    def filter_queryset(self, request, queryset, view):
+        termino = request.query_params.get(self.search_param, '').strip()
+        if not termino:
+            return queryset
+
+        consulta = SearchQuery(termino, config=self.config, search_type='websearch')
+        condicion = Q(**{self.campo_vector: consulta})
+        # Los ids se resuelven antes: con una subconsulta dentro del OR el
+        # planificador deja de usar el índice GIN en cada partición
+        usuarios = list(Usuario.objects.filter(email__icontains=termino).values_list('id', flat=True))
+        if usuarios:
+            condicion |= Q(usuario_id__in=usuarios)
+        queryset = queryset.filter(condicion)
+
+        if request.query_params.get('ordering') in self.orden_relevancia:
+            queryset = queryset.annotate(
+                relevancia=SearchRank(F(self.campo_vector), consulta)
+            ).order_by('-relevancia', '-fecha_hora', '-id')
+
+        return queryset
+
+
+class ContieneSinMayusculas(Lookup):
+    """
+    ``campo ILIKE patron`` tal cual. ``icontains`` envuelve ambos lados en
+    UPPER() y el planificador ya no puede usar el índice trigram.
+    """
+    lookup_name = 'ilike'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} ILIKE {rhs}", (*lhs_params, *rhs_params)
+
+
+def _patron_contiene(termino):
+    escapado = termino.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escapado}%"
+
+
+def filtro_contiene(campo, termino):
+    """Q para ``termino`` como subcadena de ``campo`` sin distinguir mayúsculas ni acentos"""
+    return Q(ContieneSinMayusculas(SinAcentos(campo), SinAcentos(Value(_patron_contiene(termino)))))
+
+
+class EmpiezaPalabra(Lookup):
+    """
+    ``campo ~* '(^|separador)prefijo'``: alguna palabra de ``campo`` empieza
+    con el valor, que ya debe venir escapado como expresión regular. Usa el
+    mismo índice trigram que ``ilike``.
+    """
+    lookup_name = 'empieza_palabra'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} ~* ('(^|[[:space:]@._+-])' || {rhs})", (*lhs_params, *rhs_params)
+
+
+def filtrar_por_prefijos(queryset, termino, campos):
+    """
+    Misma coincidencia que el índice de los selects (services/typeahead.py):
+    cada palabra de ``termino`` debe ser prefijo de alguna palabra de
+    alguno de ``campos``, sin distinguir mayúsculas ni acentos.
+    """
+    for palabra in palabras_busqueda(termino):
+        valor = Value(re.escape(palabra))
+        condicion = Q()
+        for campo in campos:
+            condicion |= Q(EmpiezaPalabra(SinAcentos(campo), valor))
+        queryset = queryset.filter(condicion)
+    return queryset
+
+
+def filtrar_por_similitud(queryset, termino, campos):
+    """
+    Filtra ``queryset`` para que cada palabra de ``termino`` aparezca en
+    alguno de ``campos``, sin distinguir mayúsculas ni acentos: como
+    subcadena o, desde MINIMO_SIMILITUD letras, por similitud de trigramas
+    (tolera errores de tipeo). Ambas condiciones usan los índices GIN
+    ``gin_trgm_ops`` sobre ``inmutable_unaccent(campo)``.
+
+    Anota ``similitud`` (suma por palabra de la mejor similitud entre los
+    campos) para ordenar por relevancia.
+    """
+    palabras = termino.split()
+    if not palabras:
+        return queryset
+
+    columnas = [SinAcentos(campo) for campo in campos]
+    puntajes = []
+    for palabra in palabras:
+        valor = SinAcentos(Value(palabra))
+        condicion = Q()
+        for campo, columna in zip(campos, columnas):
+            condicion |= filtro_contiene(campo, palabra)
+            if len(palabra) >= MINIMO_SIMILITUD:
+                condicion |= Q(TrigramWordSimilar(columna, valor))
+        queryset = queryset.filter(condicion)
+
+        similitudes = [TrigramWordSimilarity(valor, columna) for columna in columnas]
+        puntajes.append(Greatest(*similitudes) if len(similitudes) > 1 else similitudes[0])
+
+    return queryset.annotate(similitud=reduce(add, puntajes))
+
+
+class SimilitudSearchFilter(SearchFilter):
+    """
+    SearchFilter sobre ``search_fields`` con ``filtrar_por_similitud``.
+
+    Sin ?ordering= explícito los resultados se ordenan por similitud y luego
+    por el orden que ya tenía el queryset. Debe ir después de OrderingFilter
+    en filter_backends.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        termino = request.query_params.get(self.search_param, '').strip()
+        campos = [campo.lstrip('^=@$') for campo in self.get_search_fields(view, request) or []]
+        if not termino or not campos:
+            return queryset
+
+        queryset = filtrar_por_similitud(queryset, termino, campos)
+        if 'ordering' not in request.query_params:
+            queryset = queryset.order_by('-similitud', *queryset.query.order_by)
+
+        # Las condiciones sobre relaciones múltiples pueden repetir filas
+        if self.must_call_distinct(queryset, campos):
+            queryset = queryset.distinct()
+        return queryset
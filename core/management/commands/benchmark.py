@@ -0,0 +1,65 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.services import benchmark
+
+
+class Command(BaseCommand):
+    help = 'Mide latencia, consultas SQL y memoria de los endpoints principales y compara con la línea base'
+
+    def add_arguments(self, parser):
+        parser.add_argument('escenarios', nargs='*', help=f"Escenarios a medir (por defecto todos: {', '.join(benchmark.NOMBRES_ESCENARIOS)})")
+        parser.add_argument('--repeticiones', type=int, default=benchmark.REPETICIONES,
+                            help=f'Requests medidos por escenario (por defecto {benchmark.REPETICIONES}; menos vuelve inestable el p95)')
+        parser.add_argument('--calentamiento', type=int, default=2)
+        parser.add_argument('--umbral', type=float, default=0.25, help='Tolerancia relativa de latencia p50/p95 y memoria (0.25 = 25%%)')
+        parser.add_argument('--linea-base', default=getattr(settings, 'BENCHMARK_LINEA_BASE', None))
+        parser.add_argument('--guardar', action='store_true', help='Reemplazar la línea base con estos resultados')
+        parser.add_argument('--descripcion', default='', help='Nota guardada con la línea base (datos, equipo)')
+        parser.add_argument('--json', dest='salida_json', help='Guardar los resultados en este archivo')
+
+    def handle(self, *args, **options):
+        desconocidos = set(options['escenarios']) - set(benchmark.NOMBRES_ESCENARIOS)
+        if desconocidos:
+            raise CommandError(f"Escenarios desconocidos: {', '.join(sorted(desconocidos))}")
+
+        try:
+            resultados = benchmark.ejecutar(options['escenarios'], options['repeticiones'], options['calentamiento'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(f"{'Escenario':32} {'HTTP':>4} {'p50 ms':>9} {'p95 ms':>9} {'SQL':>5} {'Mem KiB':>9}")
+        for nombre, r in resultados.items():
+            self.stdout.write(
+                f"{nombre:32} {r['estado_http']:>4} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} "
+                f"{r['consultas']:>5} {r['memoria_pico_kib']:>9.1f}"
+            )
+
+        if options['salida_json']:
+            with open(options['salida_json'], 'w', encoding='utf-8') as archivo:
+                json.dump(resultados, archivo, ensure_ascii=False, indent=2)
+
+        ruta = options['linea_base']
+        if options['guardar']:
+            if not ruta:
+                raise CommandError("Indique --linea-base o BENCHMARK_LINEA_BASE")
+            if options['escenarios'] and os.path.exists(ruta):
+                # Actualización parcial: se conservan los demás escenarios
+                resultados = {**benchmark.cargar_linea_base(ruta), **resultados}
+            benchmark.guardar_linea_base(ruta, resultados, options['descripcion'])
+            self.stdout.write(self.style.SUCCESS(f"Línea base guardada en {ruta}"))
+            return
+
+        if not ruta or not os.path.exists(ruta):
+            self.stdout.write(self.style.WARNING("Sin línea base para comparar (use --guardar para crearla)"))
+            return
+
+        regresiones = benchmark.comparar(resultados, benchmark.cargar_linea_base(ruta), options['umbral'])
+        for nombre, metrica, base, actual in regresiones:
+            self.stdout.write(self.style.ERROR(f"REGRESIÓN {nombre}: {metrica} {base} -> {actual}"))
+        if regresiones:
+            raise CommandError(f"{len(regresiones)} regresiones respecto de {ruta}")
+        self.stdout.write(self.style.SUCCESS("Sin regresiones respecto de la línea base"))
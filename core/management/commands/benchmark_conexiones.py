@@ -0,0 +1,169 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import RequestFactory
+from rest_framework.views import APIView
+
+from core.authentication import tokens_para_usuario
+from core.models import Notificacion, Paciente
+
+MODOS = ('nueva', 'persistente', 'pool')
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara el throughput de la API con cada modo de conexión a PostgreSQL (DB_CONEXIONES_MODO). '
+        'Cada modo corre en un proceso aparte con la configuración real de settings y el ciclo de request '
+        'completo de WSGI (incluido el cierre/devolución de conexiones al terminar cada request).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modos', default=','.join(MODOS), help='Modos separados por coma')
+        parser.add_argument('--hilos', type=int, default=4, help='Requests concurrentes')
+        parser.add_argument('--segundos', type=float, default=10, help='Duración de la medición por modo')
+        parser.add_argument('--endpoint', choices=['no-leidas', 'marcar-leida'], default='marcar-leida')
+        parser.add_argument('--interno', action='store_true', help='Ejecuta un solo modo en este proceso (uso interno)')
+
+    def handle(self, *args, **options):
+        if options['interno']:
+            self.stdout.write(json.dumps(self.medir(options)))
+            return
+
+        modos = [modo.strip() for modo in options['modos'].split(',') if modo.strip()]
+        invalidos = set(modos) - set(MODOS)
+        if invalidos:
+            raise CommandError(f"Modos inválidos: {', '.join(sorted(invalidos))}")
+
+        self.stdout.write(
+            f"{options['endpoint']} - {options['hilos']} hilos - {options['segundos']:g} s por modo\n"
+            f"{'Modo':12} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'conexiones':>11} {'errores':>8}"
+        )
+        for modo in modos:
+            proceso = subprocess.run(
+                [
+                    sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'benchmark_conexiones', '--interno',
+                    '--hilos', str(options['hilos']), '--segundos', str(options['segundos']),
+                    '--endpoint', options['endpoint'],
+                ],
+                env={**os.environ, 'DB_CONEXIONES_MODO': modo},
+                capture_output=True, text=True,
+            )
+            try:
+                r = json.loads(proceso.stdout.strip().splitlines()[-1])
+            except (IndexError, ValueError):
+                raise CommandError(f"Falló el modo {modo}:\n{proceso.stderr[-2000:]}")
+            self.stdout.write(
+                f"{modo:12} {r['req_s']:>9.1f} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} "
+                f"{r['conexiones']:>11} {r['errores']:>8}"
+            )
+
+    def medir(self, options):
+        paciente = Paciente.objects.filter(usuario__activo=True).select_related('usuario').order_by('pk').first()
+        if paciente is None:
+            raise CommandError("No hay pacientes (ejecute seed_scale)")
+        usuario = paciente.usuario
+        token = str(tokens_para_usuario(usuario).access_token)
+        notificacion = Notificacion.objects.create(
+            usuario=usuario, tipo='sistema', titulo='benchmark_conexiones', mensaje='Notificación de prueba'
+        )
+        rutas = {
+            'no-leidas': ('get', '/api/notificaciones/no-leidas/'),
+            'marcar-leida': ('post', f'/api/notificaciones/{notificacion.pk}/marcar-leida/'),
+        }
+        metodo, ruta = rutas[options['endpoint']]
+        connections.close_all()
+
+        handler = WSGIHandler()
+        fabrica = RequestFactory()
+        host = next((h for h in settings.ALLOWED_HOSTS if h not in ('*', '') and ':' not in h), 'localhost')
+
+        abiertas = [0]
+        bloqueo = threading.Lock()
+
+        def conexion_creada(sender, **kwargs):
+            with bloqueo:
+                abiertas[0] += 1
+
+        def conexiones_fisicas():
+            # Con pool, connection_created se emite en cada préstamo: se cuentan las del pool
+            pool = getattr(connections['default'], 'pool', None)
+            if pool is not None:
+                return pool.get_stats().get('connections_num', 0)
+            return abiertas[0]
+
+        def pedir():
+            # Ciclo completo: request_started/request_finished cierran o devuelven la conexión según el modo
+            environ = getattr(fabrica, metodo)(ruta, HTTP_AUTHORIZATION=f'Bearer {token}', HTTP_HOST=host).environ
+            estado = []
+            respuesta = handler(environ, lambda status, headers, exc_info=None: estado.append(status))
+            try:
+                for _ in respuesta:
+                    pass
+            finally:
+                respuesta.close()
+            return estado[0].startswith('2')
+
+        tiempos, errores = [], [0]
+        fin = [0.0]
+
+        def trabajador():
+            locales = []
+            try:
+                while time.perf_counter() < fin[0]:
+                    inicio = time.perf_counter()
+                    ok = pedir()
+                    locales.append((time.perf_counter() - inicio) * 1000)
+                    if not ok:
+                        with bloqueo:
+                            errores[0] += 1
+            finally:
+                connections.close_all()
+                with bloqueo:
+                    tiempos.extend(locales)
+
+        connection_created.connect(conexion_creada)
+        try:
+            with mock.patch.object(APIView, 'get_throttles', lambda self: []):
+                # Calentamiento (imports, pool inicial) fuera de la medición
+                fin[0] = time.perf_counter() + 1
+                trabajador()
+                tiempos.clear()
+                errores[0] = 0
+                abiertas[0] = 0
+                conexiones_previas = conexiones_fisicas()
+
+                fin[0] = time.perf_counter() + options['segundos']
+                inicio = time.perf_counter()
+                hilos = [threading.Thread(target=trabajador) for _ in range(options['hilos'])]
+                for hilo in hilos:
+                    hilo.start()
+                for hilo in hilos:
+                    hilo.join()
+                duracion = time.perf_counter() - inicio
+                conexiones = conexiones_fisicas() - conexiones_previas
+        finally:
+            connection_created.disconnect(conexion_creada)
+            notificacion.delete()
+            connections.close_all()
+
+        tiempos.sort()
+        return {
+            'modo': settings.DB_CONEXIONES_MODO,
+            'requests': len(tiempos),
+            'req_s': round(len(tiempos) / duracion, 1),
+            'p50_ms': round(statistics.median(tiempos), 2) if tiempos else 0,
+            'p95_ms': round(tiempos[max(0, -(-len(tiempos) * 95 // 100) - 1)], 2) if tiempos else 0,
+            'conexiones': conexiones,
+            'errores': errores[0],
+        }
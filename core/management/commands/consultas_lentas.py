@@ -0,0 +1,46 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from core.services import consultas_lentas
+
+
+class Command(BaseCommand):
+    help = 'Reporte de consultas lentas agrupadas por huella (ver services/consultas_lentas.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=1, help='Días hacia atrás (incluido hoy)')
+        parser.add_argument('--top', type=int, default=20)
+        parser.add_argument('--orden', choices=['total', 'peor', 'cantidad', 'promedio'], default='total')
+        parser.add_argument('--planes', action='store_true', help='Mostrar el EXPLAIN de la peor muestra')
+        parser.add_argument('--json', action='store_true', help='Salida en JSON')
+        parser.add_argument('--purgar', type=int, metavar='DIAS', help='Borrar los registros de más de DIAS días')
+
+    def handle(self, *args, **options):
+        if options['purgar'] is not None:
+            borrados = consultas_lentas.purgar(options['purgar'])
+            self.stdout.write(self.style.SUCCESS(f"{borrados} archivos de consultas lentas eliminados"))
+            return
+
+        grupos = consultas_lentas.reporte(options['dias'], options['top'], options['orden'])
+        if options['json']:
+            self.stdout.write(json.dumps(grupos, ensure_ascii=False, indent=2, default=str))
+            return
+
+        if not grupos:
+            self.stdout.write(f"Sin consultas lentas en los últimos {options['dias']} días")
+            return
+
+        for posicion, grupo in enumerate(grupos, start=1):
+            peor = grupo['peor']
+            self.stdout.write(self.style.WARNING(
+                f"#{posicion} {grupo['cantidad']} veces - total {grupo['total_ms']:.0f} ms - "
+                f"promedio {grupo['promedio_ms']:.0f} ms - peor {grupo['peor_ms']:.0f} ms - última {grupo['ultima']}"
+            ))
+            self.stdout.write(f"  {grupo['huella'][:500]}")
+            if peor.get('origen'):
+                self.stdout.write(f"  origen: {' <- '.join(peor['origen'])}")
+            if options['planes'] and grupo['plan']:
+                for linea in grupo['plan'].splitlines():
+                    self.stdout.write(f"    {linea}")
+            self.stdout.write('')
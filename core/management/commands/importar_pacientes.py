@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Rol
+from core.services import importacion_pacientes
+
+
+class Command(BaseCommand):
+    help = 'Importa pacientes desde un archivo CSV (ver services/importacion_pacientes.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del CSV (columnas: email, nombre, apellido, ...)')
+        parser.add_argument('--sin-historia', action='store_true', help='No crear la historia clínica')
+        parser.add_argument('--max-errores', type=int, default=50, help='Errores a mostrar en pantalla')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Importando pacientes desde {options['archivo']}...")
+
+        try:
+            with open(options['archivo'], 'rb') as archivo:
+                resultado = importacion_pacientes.importar(archivo, crear_historia=not options['sin_historia'])
+        except FileNotFoundError:
+            raise CommandError(f"No existe el archivo {options['archivo']}")
+        except (ValueError, UnicodeDecodeError) as e:
+            raise CommandError(f"Archivo inválido: {str(e)}")
+        except Rol.DoesNotExist:
+            raise CommandError("No existe el rol Paciente (ejecute populate_user_db)")
+
+        for error in resultado['errores'][:options['max_errores']]:
+            self.stdout.write(self.style.WARNING(
+                f"Fila {error['fila']} ({error['email'] or 'sin email'}): {'; '.join(error['errores'])}"
+            ))
+        if resultado['con_errores'] > options['max_errores']:
+            self.stdout.write(f"... y {resultado['con_errores'] - options['max_errores']} errores más")
+
+        if resultado['restablecer_password']:
+            self.stdout.write(
+                f"{len(resultado['restablecer_password'])} pacientes sin contraseña "
+                f"(asignarla con POST /api/usuarios/<id>/cambiar-password/):"
+            )
+            for paciente in resultado['restablecer_password'][:options['max_errores']]:
+                self.stdout.write(f"  {paciente['id']} {paciente['email']}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Filas: {resultado['total_filas']} - Creados: {resultado['creados']} - Con errores: {resultado['con_errores']}"
+        ))
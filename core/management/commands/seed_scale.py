@@ -0,0 +1,403 @@
+"""
+Datos sintéticos a escala de producción para pruebas de carga y benchmarks.
+
+    python manage.py seed_scale --pacientes 100000 --citas 1000000 --bitacora 5000000
+
+Los registros se generan por bloques en procesos paralelos. Cada bloque usa
+su propio ``random.Random`` derivado de --seed y del número de bloque, así
+el contenido no depende de la cantidad de procesos. Usuarios, pacientes,
+médicos y citas se cargan con ``bulk_create``; la bitácora (que necesita
+``fecha_hora`` histórica, ignorada por auto_now_add) con COPY.
+
+Las fechas se generan hacia atrás desde --referencia (por defecto, hoy).
+Todos los usuarios generados usan el dominio @seed.local y la contraseña
+--password; --limpiar elimina los datos de una ejecución anterior.
+"""
+import csv
+import io
+import os
+import random
+import time as reloj
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from multiprocessing import get_context
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, connection, connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from faker import Faker
+
+from core.models import (
+    AgendaCita, Bitacora, Especialidad, HistoriaClinica, HorarioMedico, Medico, MedicoEspecialidad,
+    Paciente, Rol, Usuario,
+)
+
+DOMINIO = 'seed.local'
+
+ESPECIALIDADES = [
+    ('CARD', 'Cardiología'), ('NEUR', 'Neurología'), ('PED', 'Pediatría'), ('GINE', 'Ginecología'),
+    ('TRAU', 'Traumatología'), ('ORTO', 'Ortopedia'), ('DERM', 'Dermatología'), ('PSIQ', 'Psiquiatría'),
+    ('MGEN', 'Medicina General'), ('OFTA', 'Oftalmología'),
+]
+TIPOS_SANGRE = ['O+', 'O+', 'O+', 'A+', 'A+', 'B+', 'AB+', 'O-', 'A-', 'B-']
+ALERGIAS = ['Penicilina', 'Polen', 'Mariscos', 'Lactosa', 'Ácaros', 'Aspirina']
+ENFERMEDADES = ['Hipertensión', 'Diabetes tipo 2', 'Asma', 'Hipotiroidismo', 'Artritis']
+MEDICAMENTOS = ['Losartán 50mg', 'Metformina 850mg', 'Salbutamol', 'Levotiroxina 100mcg']
+PARENTESCOS = ['Madre', 'Padre', 'Esposo/a', 'Hermano/a', 'Hijo/a']
+MOTIVOS = [
+    'Control de rutina', 'Dolor de cabeza persistente', 'Revisión de exámenes', 'Dolor abdominal',
+    'Control de presión arterial', 'Seguimiento de tratamiento', 'Consulta por fiebre', 'Chequeo anual',
+]
+DIAS = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes']
+# (acción, módulo, detalle) con la forma de los registros de Bitacora.registrar_accion
+ACCIONES_BITACORA = [
+    ('Inició sesión', 'autenticacion', 'Login exitoso desde {ip}'),
+    ('Cerró sesión', 'autenticacion', 'Logout del usuario'),
+    ('Creó cita', 'agenda', 'Cita para el {fecha} a las {hora}'),
+    ('Canceló cita', 'agenda', 'Cita del {fecha} cancelada'),
+    ('Consultó historial médico', 'historias', 'Historial completo consultado'),
+    ('Actualizó paciente', 'pacientes', 'Paciente actualizado - Estado: Activo'),
+    ('Exportó lista de pacientes', 'pacientes', 'Exportación de datos de pacientes'),
+    ('Registró resultado de examen', 'examenes', 'Resultado registrado para solicitud'),
+]
+
+# Estado compartido por los procesos (se asigna en _inicializar_worker)
+_contexto = {}
+
+
+def _inicializar_worker(contexto):
+    # Con 'spawn' (Windows/macOS) el proceso hijo no hereda Django configurado
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+    _contexto.update(contexto)
+
+
+def _rng(tipo, bloque):
+    return random.Random(f"{_contexto['seed']}:{tipo}:{bloque}")
+
+
+def _fecha_hora(rng, desde, hasta):
+    return desde + timedelta(seconds=rng.randrange(int((hasta - desde).total_seconds())))
+
+
+def _telefono(rng):
+    return f"7{rng.randrange(1000000, 9999999)}"
+
+
+# ----- Bloques (se ejecutan en los procesos) -----
+
+def _bloque_pacientes(bloque):
+    rng = _rng('pacientes', bloque)
+    nombres, apellidos = _contexto['nombres'], _contexto['apellidos']
+    inicio = bloque * _contexto['lote']
+    fin = min(inicio + _contexto['lote'], _contexto['pacientes'])
+    hoy = _contexto['hoy']
+
+    usuarios, pacientes = [], []
+    for n in range(inicio, fin):
+        usuarios.append(Usuario(
+            email=f"paciente{n}@{DOMINIO}",
+            password=_contexto['password'],
+            nombre=rng.choice(nombres),
+            apellido=f"{rng.choice(apellidos)} {rng.choice(apellidos)}",
+            telefono=_telefono(rng),
+            direccion=rng.choice(_contexto['direcciones']),
+            fecha_nacimiento=hoy - timedelta(days=rng.randrange(365, 365 * 90)),
+            genero=rng.choice('MF'),
+            id_rol_id=_contexto['rol_paciente'],
+        ))
+        pacientes.append(dict(
+            tipo_sangre=rng.choice(TIPOS_SANGRE),
+            alergias=rng.choice(ALERGIAS) if rng.random() < 0.25 else None,
+            enfermedades_cronicas=rng.choice(ENFERMEDADES) if rng.random() < 0.2 else None,
+            medicamentos_actuales=rng.choice(MEDICAMENTOS) if rng.random() < 0.3 else None,
+            contacto_emergencia_nombre=f"{rng.choice(nombres)} {rng.choice(apellidos)}" if rng.random() < 0.7 else None,
+            contacto_emergencia_telefono=_telefono(rng),
+            contacto_emergencia_parentesco=rng.choice(PARENTESCOS),
+            estado='Activo' if rng.random() < 0.92 else 'Inactivo',
+        ))
+
+    with transaction.atomic():
+        usuarios = Usuario.objects.bulk_create(usuarios)
+        Paciente.objects.bulk_create([
+            Paciente(usuario_id=usuario.pk, **datos) for usuario, datos in zip(usuarios, pacientes)
+        ])
+        HistoriaClinica.objects.bulk_create([HistoriaClinica(paciente_id=usuario.pk) for usuario in usuarios])
+    return len(usuarios)
+
+
+def _bloque_citas(bloque):
+    rng = _rng('citas', bloque)
+    inicio = bloque * _contexto['lote']
+    fin = min(inicio + _contexto['lote'], _contexto['citas'])
+    pacientes, medico_especialidades = _contexto['paciente_ids'], _contexto['medico_especialidad_ids']
+    hoy = _contexto['hoy']
+    desde = hoy - timedelta(days=_contexto['dias_historia'])
+    dias = _contexto['dias_historia'] + 60
+
+    citas = []
+    for _n in range(inicio, fin):
+        fecha = desde + timedelta(days=rng.randrange(dias))
+        if fecha < hoy:
+            estado = 'realizada' if rng.random() < 0.8 else 'cancelada'
+        else:
+            estado = 'confirmada' if rng.random() < 0.6 else 'pendiente'
+        citas.append(AgendaCita(
+            paciente_id=rng.choice(pacientes),
+            medico_especialidad_id=rng.choice(medico_especialidades),
+            fecha_cita=fecha,
+            hora_cita=time(8 + rng.randrange(10), rng.choice((0, 30))),
+            estado=estado,
+            motivo=rng.choice(MOTIVOS),
+        ))
+    AgendaCita.objects.bulk_create(citas)
+    return len(citas)
+
+
+def _copiar(cursor, tabla, columnas, filas):
+    """COPY ... FROM STDIN en formato CSV (psycopg2 o psycopg 3)"""
+    sql = f"COPY {tabla} ({', '.join(columnas)}) FROM STDIN WITH (FORMAT csv)"
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(filas)
+    buffer.seek(0)
+    crudo = cursor.cursor
+    if hasattr(crudo, 'copy_expert'):
+        crudo.copy_expert(sql, buffer)
+    else:
+        with crudo.copy(sql) as copia:
+            copia.write(buffer.getvalue())
+
+
+def _bloque_bitacora(bloque):
+    rng = _rng('bitacora', bloque)
+    inicio = bloque * _contexto['lote']
+    fin = min(inicio + _contexto['lote'], _contexto['bitacora'])
+    usuarios = _contexto['usuario_ids']
+    ahora = _contexto['ahora']
+    desde = ahora - timedelta(days=_contexto['dias_historia'])
+
+    filas = []
+    for _n in range(inicio, fin):
+        accion, modulo, detalle = rng.choice(ACCIONES_BITACORA)
+        fecha_hora = _fecha_hora(rng, desde, ahora)
+        ip = f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}"
+        filas.append((
+            rng.choice(usuarios), ip, accion, modulo, fecha_hora.isoformat(),
+            detalle.format(ip=ip, fecha=fecha_hora.date().isoformat(), hora=f"{8 + rng.randrange(10)}:00"),
+        ))
+
+    qn = connection.ops.quote_name
+    columnas = [qn(Bitacora._meta.get_field(campo).column) for campo in (
+        'usuario', 'ip_address', 'accion_realizada', 'modulo_afectado', 'fecha_hora', 'detalles'
+    )]
+    with transaction.atomic(), connection.cursor() as cursor:
+        _copiar(cursor, qn(Bitacora._meta.db_table), columnas, filas)
+    return len(filas)
+
+
+# ----- Comando -----
+
+class Command(BaseCommand):
+    help = 'Genera datos sintéticos a escala (pacientes, médicos, citas y bitácora) en paralelo'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pacientes', type=int, default=100000)
+        parser.add_argument('--medicos', type=int, default=500)
+        parser.add_argument('--citas', type=int, default=1000000)
+        parser.add_argument('--bitacora', type=int, default=5000000)
+        parser.add_argument('--dias-historia', type=int, default=365, help='Días hacia atrás de citas y bitácora')
+        parser.add_argument('--seed', type=int, default=42, help='Semilla (mismo valor = mismos datos)')
+        parser.add_argument('--referencia', type=parse_date, default=None,
+                            help='Fecha AAAA-MM-DD a la que se refieren las fechas generadas (por defecto, hoy)')
+        parser.add_argument('--workers', type=int, default=None, help='Procesos paralelos (por defecto, núcleos)')
+        parser.add_argument('--lote', type=int, default=5000, help='Filas por bloque/transacción')
+        parser.add_argument('--password', default='password123', help='Contraseña de todos los usuarios generados')
+        parser.add_argument('--limpiar', action='store_true', help='Eliminar antes los datos de @seed.local')
+
+    def handle(self, *args, **options):
+        self.workers = options['workers'] or min(os.cpu_count() or 1, 8)
+        self.lote = options['lote']
+
+        existentes = Usuario.objects.filter(email__endswith=f"@{DOMINIO}").exists()
+        if existentes and not options['limpiar']:
+            raise CommandError(f"Ya hay datos de @{DOMINIO}; use --limpiar para regenerarlos")
+        if existentes:
+            self.limpiar()
+
+        try:
+            rol_paciente = Rol.objects.get(nombre_rol='Paciente')
+            rol_medico = Rol.objects.get(nombre_rol='Medico')
+        except Rol.DoesNotExist:
+            raise CommandError("Faltan los roles Paciente/Medico (ejecute populate_user_db)")
+
+        referencia = options['referencia'] or timezone.localdate()
+        fake = Faker('es_ES')
+        fake.seed_instance(options['seed'])
+        contexto = {
+            'seed': options['seed'],
+            'lote': self.lote,
+            'pacientes': options['pacientes'],
+            'citas': options['citas'],
+            'bitacora': options['bitacora'],
+            'dias_historia': options['dias_historia'],
+            'hoy': referencia,
+            # Inicio del día de referencia: misma semilla y fecha = mismos datos
+            'ahora': datetime.combine(referencia, time(), tzinfo=dt_timezone.utc),
+            'password': make_password(options['password']),
+            'rol_paciente': rol_paciente.pk,
+            'nombres': sorted({fake.first_name() for _ in range(600)}),
+            'apellidos': sorted({fake.last_name() for _ in range(600)}),
+            'direcciones': [fake.address().replace('\n', ', ') for _ in range(500)],
+        }
+
+        self.stdout.write(f"Generando datos con seed={options['seed']} en {self.workers} procesos...")
+
+        medico_especialidad_ids = self.crear_medicos(options['medicos'], rol_medico, contexto)
+        self.ejecutar('Pacientes', _bloque_pacientes, options['pacientes'], contexto)
+
+        contexto['paciente_ids'] = self.ids_por_numero(Paciente.objects, 'usuario__email', 'usuario_id', 'paciente')
+        contexto['medico_especialidad_ids'] = medico_especialidad_ids
+        if options['citas']:
+            if not contexto['paciente_ids'] or not medico_especialidad_ids:
+                raise CommandError("Se necesitan pacientes y médicos para generar citas")
+            self.ejecutar('Citas', _bloque_citas, options['citas'], contexto)
+
+        if options['bitacora']:
+            contexto['usuario_ids'] = contexto['paciente_ids'] + self.ids_por_numero(
+                Medico.objects, 'usuario__email', 'usuario_id', 'medico'
+            )
+            self.asegurar_particiones(contexto['ahora'], options['dias_historia'])
+            self.ejecutar('Bitácora', _bloque_bitacora, options['bitacora'], contexto)
+
+        self.finalizar()
+        self.stdout.write(self.style.SUCCESS("¡Datos a escala generados exitosamente!"))
+
+    def ejecutar(self, nombre, funcion, total, contexto):
+        """Reparte ``total`` filas en bloques de --lote entre los procesos"""
+        if not total:
+            return
+        bloques = range((total + self.lote - 1) // self.lote)
+        inicio = reloj.monotonic()
+        generadas = 0
+
+        # Los hijos no deben heredar la conexión abierta del proceso padre
+        connections.close_all()
+        if self.workers <= 1:
+            _inicializar_worker(contexto)
+            resultados = map(funcion, bloques)
+            for filas in resultados:
+                generadas += filas
+        else:
+            metodo = 'fork' if os.name == 'posix' else 'spawn'
+            with get_context(metodo).Pool(self.workers, initializer=_inicializar_worker, initargs=(contexto,)) as pool:
+                for filas in pool.imap_unordered(funcion, bloques):
+                    generadas += filas
+                    if generadas % (self.lote * 20) < self.lote:
+                        self.stdout.write(f"  {nombre}: {generadas}/{total}")
+
+        segundos = reloj.monotonic() - inicio
+        self.stdout.write(f"{nombre}: {generadas} filas en {segundos:.1f}s ({generadas / max(segundos, 0.001):.0f} filas/s)")
+
+    def ids_por_numero(self, manager, campo_email, campo_id, prefijo):
+        """Ids ordenados por el número del email (no por orden de inserción), para ser deterministas"""
+        pares = manager.filter(**{f'{campo_email}__endswith': f"@{DOMINIO}"}).values_list(campo_email, campo_id)
+        return [id_ for _email, id_ in sorted(pares, key=lambda par: int(par[0].split('@')[0][len(prefijo):]))]
+
+    def crear_medicos(self, cantidad, rol_medico, contexto):
+        """Médicos, especialidades y horarios (pocos: se crean en el proceso principal)"""
+        existentes = set(Especialidad.objects.values_list('codigo', flat=True))
+        existentes.update(Especialidad.objects.values_list('nombre', flat=True))
+        Especialidad.objects.bulk_create([
+            Especialidad(codigo=codigo, nombre=nombre)
+            for codigo, nombre in ESPECIALIDADES if codigo not in existentes and nombre not in existentes
+        ])
+        especialidades = list(Especialidad.objects.order_by('codigo').values_list('id', flat=True))
+
+        rng = random.Random(f"{contexto['seed']}:medicos")
+        usuarios = []
+        for n in range(cantidad):
+            usuarios.append(Usuario(
+                email=f"medico{n}@{DOMINIO}",
+                password=contexto['password'],
+                nombre=rng.choice(contexto['nombres']),
+                apellido=rng.choice(contexto['apellidos']),
+                telefono=_telefono(rng),
+                genero=rng.choice('MF'),
+                id_rol=rol_medico,
+            ))
+
+        with transaction.atomic():
+            usuarios = Usuario.objects.bulk_create(usuarios, batch_size=self.lote)
+            Medico.objects.bulk_create([
+                Medico(usuario_id=usuario.pk, numero_licencia=f"SEED-{n:06d}")
+                for n, usuario in enumerate(usuarios)
+            ], batch_size=self.lote)
+            asignaciones = MedicoEspecialidad.objects.bulk_create([
+                MedicoEspecialidad(medico_id=usuario.pk, especialidad_id=especialidad)
+                for usuario in usuarios
+                for especialidad in rng.sample(especialidades, rng.choice((1, 1, 2)))
+            ], batch_size=self.lote)
+            HorarioMedico.objects.bulk_create([
+                HorarioMedico(
+                    medico_especialidad_id=asignacion.pk, dia_semana=dia,
+                    hora_inicio=time(8 if manana else 14), hora_fin=time(12 if manana else 18),
+                )
+                for asignacion in asignaciones
+                for dia in DIAS
+                for manana in (rng.random() < 0.5,)
+            ], batch_size=self.lote)
+
+        self.stdout.write(f"Médicos: {len(usuarios)} ({len(asignaciones)} especialidades asignadas)")
+        return [asignacion.pk for asignacion in asignaciones]
+
+    def asegurar_particiones(self, ahora, dias_historia):
+        """Particiones mensuales de todo el rango, para no llenar la DEFAULT"""
+        from core.services.particiones_bitacora import crear_particion, inicio_mes, sumar_meses
+
+        mes = inicio_mes(ahora - timedelta(days=dias_historia))
+        while mes <= ahora:
+            crear_particion(mes)
+            mes = sumar_meses(mes, 1)
+
+    def limpiar(self):
+        """
+        DELETE directos en orden de dependencias: el ORM cargaría cada fila
+        y emitiría una señal por usuario.
+        """
+        self.stdout.write(f"Eliminando datos anteriores de @{DOMINIO}...")
+        usuarios = f"SELECT id FROM {Usuario._meta.db_table} WHERE email LIKE %s"
+        especialidades = f"SELECT id FROM {MedicoEspecialidad._meta.db_table} WHERE medico_id IN ({usuarios})"
+        borrados = [
+            (Bitacora, 'usuario_id', usuarios),
+            (AgendaCita, 'paciente_id', usuarios),
+            (AgendaCita, 'medico_especialidad_id', especialidades),
+            (HorarioMedico, 'medico_especialidad_id', especialidades),
+            (MedicoEspecialidad, 'medico_id', usuarios),
+            (HistoriaClinica, 'paciente_id', usuarios),
+            (Paciente, 'usuario_id', usuarios),
+            (Medico, 'usuario_id', usuarios),
+            (Usuario, 'id', usuarios),
+        ]
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                for modelo, columna, subconsulta in borrados:
+                    cursor.execute(
+                        f"DELETE FROM {modelo._meta.db_table} WHERE {columna} IN ({subconsulta})", [f"%@{DOMINIO}"]
+                    )
+        except IntegrityError as e:
+            raise CommandError(f"Hay otros registros que referencian los datos generados: {str(e).splitlines()[0]}")
+
+    def finalizar(self):
+        """bulk_create/COPY no emiten señales: refrescar datos derivados y estadísticas del planificador"""
+        from core.services import estadisticas_pacientes, typeahead
+
+        for tipo in typeahead.TIPOS:
+            typeahead.registrar_cambio(tipo)
+        estadisticas_pacientes.invalidar()
+
+        with connection.cursor() as cursor:
+            for modelo in (Usuario, Paciente, Medico, MedicoEspecialidad, HistoriaClinica, AgendaCita, Bitacora):
+                cursor.execute(f"ANALYZE {connection.ops.quote_name(modelo._meta.db_table)}")
@@ -0,0 +1,138 @@
+import json
+import logging
+import os
+import time
+
+from django.conf import settings
+from django.urls import Resolver404, resolve, reverse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.settings import api_settings
+
+from .services import metricas, perfil_sql, perfilador
+
+logger = logging.getLogger('core.perfil_sql')
+
+
+def _ascii(texto, largo):
+    # Los valores de los headers HTTP deben ser latin-1 y de una sola línea
+    texto = ' '.join(texto.split())
+    return texto.encode('ascii', 'replace').decode()[:largo]
+
+
+class PerfilSQLMiddleware:
+    """
+    Detector de N+1 para desarrollo/staging (SQL_PERFIL_ACTIVO).
+
+    Captura todas las consultas del request y agrega los headers:
+
+        X-SQL-Consultas: total de consultas
+        X-SQL-Tiempo-Ms: tiempo total en la base de datos
+        X-SQL-N1: huellas repetidas SQL_N1_UMBRAL veces o más, separadas por
+                  " | " (repeticiones, origen en el código y SQL recortado)
+
+    Con N+1 se escribe además un log estructurado (JSON) en 'core.perfil_sql'.
+    Las consultas de respuestas en streaming que ocurren después de retornar
+    la vista no se cuentan.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.umbral = getattr(settings, 'SQL_N1_UMBRAL', 5)
+        self.maximo = getattr(settings, 'SQL_N1_MAXIMO_REPORTADAS', 5)
+        self.profundidad = getattr(settings, 'SQL_PERFIL_PROFUNDIDAD_PILA', 3)
+
+    def __call__(self, request):
+        with perfil_sql.Captura(self.profundidad) as captura:
+            response = self.get_response(request)
+
+        response['X-SQL-Consultas'] = str(len(captura.consultas))
+        response['X-SQL-Tiempo-Ms'] = f'{captura.tiempo_ms:.2f}'
+
+        repetidas = perfil_sql.repetidas(captura.consultas, self.umbral)[:self.maximo]
+        if repetidas:
+            response['X-SQL-N1'] = ' | '.join(
+                _ascii(f"{grupo['repeticiones']}x {grupo['origenes'][0]['origen']} {grupo['huella']}", 300)
+                for grupo in repetidas
+            )
+            logger.warning(json.dumps({
+                'evento': 'sql_n_mas_1',
+                'metodo': request.method,
+                'ruta': request.get_full_path(),
+                'estado': response.status_code,
+                'consultas': len(captura.consultas),
+                'tiempo_ms': round(captura.tiempo_ms, 2),
+                'repetidas': [
+                    {
+                        'huella': grupo['huella'],
+                        'repeticiones': grupo['repeticiones'],
+                        'tiempo_ms': grupo['tiempo_ms'],
+                        'origenes': grupo['origenes'][:3],
+                    }
+                    for grupo in repetidas
+                ],
+            }, ensure_ascii=False))
+        return response
+
+
+class MetricasMiddleware:
+    """Latencia, consultas SQL y tiempo en la base de datos por request (services/metricas.py)"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        inicio = time.perf_counter()
+        with perfil_sql.Contador() as contador:
+            response = self.get_response(request)
+        duracion = time.perf_counter() - inicio
+
+        coincidencia = getattr(request, 'resolver_match', None)
+        ruta = (coincidencia.view_name or coincidencia.route) if coincidencia else 'sin_ruta'
+        metricas.registrar_request(
+            request.method, ruta, response.status_code, duracion, contador.consultas, contador.segundos
+        )
+        return response
+
+
+class PerfiladorMiddleware:
+    """
+    ``?__profile=1`` (cProfile) o ``?__profile=muestreo`` (pilas colapsadas)
+    en cualquier request de un administrador: el request se perfila y el
+    archivo se informa en los headers X-Perfil / X-Perfil-Url
+    (services/perfilador.py). Para el resto de los usuarios el parámetro se
+    ignora.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def _es_administrador(self, request):
+        usuario = getattr(request, 'user', None)
+        if usuario is None or not usuario.is_authenticated:
+            # La API autentica con JWT dentro de la vista de DRF: se valida el token acá
+            usuario = None
+            for clase in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+                try:
+                    resultado = clase().authenticate(request)
+                except AuthenticationFailed:
+                    return False
+                if resultado:
+                    usuario = resultado[0]
+                    break
+        return usuario is not None and hasattr(usuario, 'administrador')
+
+    def __call__(self, request):
+        modo = perfilador.modo_solicitado(request.GET.get('__profile'))
+        if not modo or not self._es_administrador(request):
+            return self.get_response(request)
+
+        try:
+            etiqueta = resolve(request.path_info).view_name
+        except Resolver404:
+            etiqueta = ''
+        response, ruta = perfilador.perfilar(modo, lambda: self.get_response(request), etiqueta)
+
+        nombre = os.path.basename(ruta)
+        response['X-Perfil'] = nombre
+        response['X-Perfil-Url'] = request.build_absolute_uri(reverse('perfil-descargar', args=[nombre]))
+        return response
@@ -0,0 +1,112 @@
+from django.db import migrations, models
+
+# Meses futuros creados al particionar; luego los mantiene la tarea
+# core.tasks.mantener_particiones_bitacora
+MESES_ADELANTE = 3
+
+COLUMNAS = 'id, ip_address, accion_realizada, modulo_afectado, fecha_hora, detalles, usuario_id'
+
+PARTICIONAR_SQL = f"""
+ALTER TABLE core_bitacora RENAME TO core_bitacora_legado;
+ALTER INDEX core_bitacora_pkey RENAME TO core_bitacora_legado_pkey;
+
+CREATE SEQUENCE core_bitacora_id_seq_nueva;
+
+CREATE TABLE core_bitacora (
+    id bigint NOT NULL DEFAULT nextval('core_bitacora_id_seq_nueva'),
+    ip_address inet NOT NULL,
+    accion_realizada varchar(200) NOT NULL,
+    modulo_afectado varchar(50) NOT NULL,
+    fecha_hora timestamp with time zone NOT NULL,
+    detalles text NULL,
+    usuario_id bigint NOT NULL,
+    CONSTRAINT core_bitacora_pkey PRIMARY KEY (id, fecha_hora),
+    CONSTRAINT core_bitacora_usuario_id_fk_core_usuario_id FOREIGN KEY (usuario_id)
+        REFERENCES core_usuario (id) DEFERRABLE INITIALLY DEFERRED
+) PARTITION BY RANGE (fecha_hora);
+
+CREATE INDEX core_bitacora_usuario_id_idx ON core_bitacora (usuario_id);
+
+CREATE TABLE core_bitacora_default PARTITION OF core_bitacora DEFAULT;
+
+DO $$
+DECLARE
+    mes date := date_trunc(
+        'month', coalesce((SELECT min(fecha_hora) FROM core_bitacora_legado), now()) AT TIME ZONE 'UTC'
+    )::date;
+    limite date := (date_trunc('month', now() AT TIME ZONE 'UTC') + interval '{MESES_ADELANTE} months')::date;
+BEGIN
+    WHILE mes <= limite LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF core_bitacora FOR VALUES FROM (%L) TO (%L)',
+            'core_bitacora_p' || to_char(mes, 'YYYYMM'),
+            mes::timestamp AT TIME ZONE 'UTC',
+            (mes + interval '1 month')::timestamp AT TIME ZONE 'UTC'
+        );
+        mes := (mes + interval '1 month')::date;
+    END LOOP;
+END $$;
+
+INSERT INTO core_bitacora ({COLUMNAS}) SELECT {COLUMNAS} FROM core_bitacora_legado;
+-- Verificar ahora las FK diferidas para poder crear índices en la misma transacción
+SET CONSTRAINTS ALL IMMEDIATE;
+SELECT setval('core_bitacora_id_seq_nueva', coalesce((SELECT max(id) FROM core_bitacora), 0) + 1, false);
+
+DROP TABLE core_bitacora_legado;
+ALTER SEQUENCE core_bitacora_id_seq_nueva RENAME TO core_bitacora_id_seq;
+ALTER SEQUENCE core_bitacora_id_seq OWNED BY core_bitacora.id;
+"""
+
+REVERTIR_SQL = f"""
+ALTER TABLE core_bitacora RENAME TO core_bitacora_particionada;
+ALTER TABLE core_bitacora_particionada RENAME CONSTRAINT core_bitacora_pkey TO core_bitacora_particionada_pkey;
+
+CREATE TABLE core_bitacora (
+    id bigint NOT NULL GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    ip_address inet NOT NULL,
+    accion_realizada varchar(200) NOT NULL,
+    modulo_afectado varchar(50) NOT NULL,
+    fecha_hora timestamp with time zone NOT NULL,
+    detalles text NULL,
+    usuario_id bigint NOT NULL REFERENCES core_usuario (id) DEFERRABLE INITIALLY DEFERRED
+);
+CREATE INDEX core_bitacora_usuario_id_idx_plano ON core_bitacora (usuario_id);
+
+INSERT INTO core_bitacora ({COLUMNAS}) SELECT {COLUMNAS} FROM core_bitacora_particionada;
+SET CONSTRAINTS ALL IMMEDIATE;
+SELECT setval(
+    pg_get_serial_sequence('core_bitacora', 'id'),
+    coalesce((SELECT max(id) FROM core_bitacora), 0) + 1,
+    false
+);
+
+DROP TABLE core_bitacora_particionada;
+"""
+
+
+def particionar_bitacora(apps, schema_editor):
+    # El particionado declarativo solo existe en PostgreSQL
+    if schema_editor.connection.vendor == 'postgresql':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(PARTICIONAR_SQL)
+
+
+def revertir_particionado(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(REVERTIR_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_alter_detallereceta_receta'),
+    ]
+
+    operations = [
+        migrations.RunPython(particionar_bitacora, revertir_particionado),
+        migrations.AddIndex(
+            model_name='bitacora',
+            index=models.Index(fields=['-fecha_hora', '-id'], name='bitacora_fecha_id_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_bitacora_particionada'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='agendacita',
+            index=models.Index(fields=['-fecha_cita', '-hora_cita', '-id'], name='agenda_fecha_hora_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificacion',
+            index=models.Index(fields=['usuario', '-fecha_envio', '-id'], name='notif_usuario_fecha_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificacion',
+            index=models.Index(fields=['-fecha_envio', '-id'], name='notif_fecha_id_idx'),
+        ),
+    ]
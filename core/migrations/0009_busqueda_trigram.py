@@ -0,0 +1,50 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:59
+
+import core.models
+import django.contrib.postgres.indexes
+import django.contrib.postgres.operations
+from django.db import migrations
+
+# unaccent() es STABLE (depende del diccionario configurado); fijando el
+# diccionario se puede declarar IMMUTABLE y usar en índices de expresión.
+CREAR_FUNCION_SQL = """
+CREATE OR REPLACE FUNCTION inmutable_unaccent(text) RETURNS text
+AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$
+LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT;
+"""
+
+ELIMINAR_FUNCION_SQL = "DROP FUNCTION IF EXISTS inmutable_unaccent(text);"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0008_bitacora_busqueda_texto_completo'),
+    ]
+
+    operations = [
+        django.contrib.postgres.operations.TrigramExtension(),
+        django.contrib.postgres.operations.UnaccentExtension(),
+        migrations.RunSQL(CREAR_FUNCION_SQL, ELIMINAR_FUNCION_SQL),
+        migrations.AddIndex(
+            model_name='medico',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(core.models.SinAcentos('numero_licencia'), name='gin_trgm_ops'), name='medico_licencia_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='paciente',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(core.models.SinAcentos('contacto_emergencia_nombre'), name='gin_trgm_ops'), name='paciente_contacto_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='usuario',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(core.models.SinAcentos('nombre'), name='gin_trgm_ops'), name='usuario_nombre_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='usuario',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(core.models.SinAcentos('apellido'), name='gin_trgm_ops'), name='usuario_apellido_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='usuario',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(core.models.SinAcentos('email'), name='gin_trgm_ops'), name='usuario_email_trgm'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.5 on 2026-10-19 12:04
+
+import core.models
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0009_busqueda_trigram'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paciente',
+            name='tiene_alergias',
+            field=models.GeneratedField(db_persist=True, expression=models.ExpressionWrapper(models.Q(('alergias__isnull', False), ('alergias__regex', '\\S')), output_field=models.BooleanField()), output_field=models.BooleanField()),
+        ),
+        migrations.AddField(
+            model_name='paciente',
+            name='tiene_contacto_emergencia',
+            field=models.GeneratedField(db_persist=True, expression=models.ExpressionWrapper(models.Q(('contacto_emergencia_nombre__isnull', False), ('contacto_emergencia_nombre__regex', '\\S'), ('contacto_emergencia_telefono__isnull', False), ('contacto_emergencia_telefono__regex', '\\S')), output_field=models.BooleanField()), output_field=models.BooleanField()),
+        ),
+        migrations.AddField(
+            model_name='paciente',
+            name='tiene_enfermedades_cronicas',
+            field=models.GeneratedField(db_persist=True, expression=models.ExpressionWrapper(models.Q(('enfermedades_cronicas__isnull', False), ('enfermedades_cronicas__regex', '\\S')), output_field=models.BooleanField()), output_field=models.BooleanField()),
+        ),
+        migrations.AddField(
+            model_name='paciente',
+            name='tiene_medicamentos_actuales',
+            field=models.GeneratedField(db_persist=True, expression=models.ExpressionWrapper(models.Q(('medicamentos_actuales__isnull', False), ('medicamentos_actuales__regex', '\\S')), output_field=models.BooleanField()), output_field=models.BooleanField()),
+        ),
+        migrations.AddIndex(
+            model_name='paciente',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(core.models.SinAcentos('enfermedades_cronicas'), name='gin_trgm_ops'), name='paciente_enfermedades_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='paciente',
+            index=models.Index(condition=models.Q(('tiene_alergias', True)), fields=['estado'], name='paciente_alergias_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paciente',
+            index=models.Index(condition=models.Q(('tiene_enfermedades_cronicas', True)), fields=['estado'], name='paciente_cronicos_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paciente',
+            index=models.Index(condition=models.Q(('tiene_medicamentos_actuales', True)), fields=['estado'], name='paciente_medicados_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paciente',
+            index=models.Index(condition=models.Q(('tiene_contacto_emergencia', True)), fields=['estado'], name='paciente_contacto_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usuario',
+            index=models.Index(fields=['fecha_nacimiento'], name='usuario_fecha_nac_idx'),
+        ),
+    ]
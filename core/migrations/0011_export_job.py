@@ -0,0 +1,44 @@
+# Generated by Django 5.2.5 on 2026-10-19 12:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_indicadores_clinicos_paciente'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(max_length=50)),
+                ('formato', models.CharField(choices=[('pdf', 'PDF'), ('excel', 'Excel'), ('html', 'HTML'), ('csv', 'CSV')], max_length=10)),
+                ('huella', models.CharField(db_index=True, max_length=64)),
+                ('consulta', models.BinaryField()),
+                ('parametros', models.JSONField(default=dict)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('procesando', 'Procesando'), ('completado', 'Completado'), ('fallido', 'Fallido')], default='pendiente', max_length=15)),
+                ('filas_totales', models.PositiveIntegerField(blank=True, null=True)),
+                ('filas_procesadas', models.PositiveIntegerField(default=0)),
+                ('nombre_archivo', models.CharField(max_length=255)),
+                ('ruta_archivo', models.CharField(blank=True, max_length=500, null=True)),
+                ('tamano_bytes', models.BigIntegerField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_inicio', models.DateTimeField(blank=True, null=True)),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True)),
+                ('expira_en', models.DateTimeField()),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exportaciones', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Trabajo de Exportación',
+                'verbose_name_plural': 'Trabajos de Exportación',
+                'indexes': [models.Index(fields=['usuario', '-fecha_creacion'], name='exportjob_usuario_fecha_idx'), models.Index(fields=['expira_en'], name='exportjob_expira_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('estado__in', ['pendiente', 'procesando'])), fields=('huella',), name='exportjob_huella_activa_unica')],
+            },
+        ),
+    ]
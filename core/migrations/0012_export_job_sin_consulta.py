@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:35
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_export_job'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='exportjob',
+            name='consulta',
+        ),
+    ]
@@ -1,7 +1,31 @@
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.db import models
 from django.utils import timezone
 
+
+class SinAcentos(models.Func):
+    """
+    unaccent() envuelto en una función IMMUTABLE (migración 0009) para
+    poder usarse en índices de expresión.
+    """
+    function = 'inmutable_unaccent'
+
+
+def texto_informado(*campos):
+    """Verdadero si todos los campos tienen algún carácter que no sea espacio"""
+    condicion = models.Q()
+    for campo in campos:
+        condicion &= models.Q(**{f'{campo}__isnull': False, f'{campo}__regex': r'\S'})
+    return models.ExpressionWrapper(condicion, output_field=models.BooleanField())
+
+
+def indice_trigram(campo, nombre):
+    """Índice GIN trigram sobre el campo sin acentos (búsqueda ILIKE y por similitud)"""
+    return GinIndex(OpClass(SinAcentos(campo), name='gin_trgm_ops'), name=nombre)
+
+
 class Permiso(models.Model):
     nombre = models.CharField(max_length=100, unique=True)
     codigo = models.CharField(max_length=50, unique=True)
@@ -60,6 +84,14 @@ class Usuario(AbstractBaseUser, PermissionsMixin):
 
     def __str__(self):
         return f"{self.nombre} {self.apellido} ({self.email})"
+
+    class Meta:
+        indexes = [
+            indice_trigram('nombre', 'usuario_nombre_trgm'),
+            indice_trigram('apellido', 'usuario_apellido_trgm'),
+            indice_trigram('email', 'usuario_email_trgm'),
+            models.Index(fields=['fecha_nacimiento'], name='usuario_fecha_nac_idx'),
+        ]
     
     @property
     def nombre_completo(self):
@@ -85,18 +117,11 @@ class Usuario(AbstractBaseUser, PermissionsMixin):
 
     def tiene_permiso_componente(self, codigo_componente, accion='ver'):
         """
-        Verifica si el usuario tiene permiso para un componente específico
+        Verifica si el usuario tiene permiso para un componente específico.
+        Usa la matriz compilada del rol (ver services/permisos.py)
         """
-        try:
-            componente = ComponenteUI.objects.get(codigo_componente=codigo_componente, activo=True)
-            permiso_componente = PermisoComponente.objects.filter(
-                componente=componente,
-                accion_permitida__in=[accion, 'todos'],
-                permiso__in=self.permisos
-            ).exists()
-            return permiso_componente
-        except ComponenteUI.DoesNotExist:
-            return False
+        from .services.permisos import tiene_permiso
+        return tiene_permiso(self.id_rol_id, codigo_componente, accion)
 
     @property
     def edad(self):
@@ -135,6 +160,11 @@ class Medico(models.Model):
 
     def __str__(self):
         return f"Dr. {self.usuario.nombre} {self.usuario.apellido} ({self.numero_licencia})"
+
+    class Meta:
+        indexes = [
+            indice_trigram('numero_licencia', 'medico_licencia_trgm'),
+        ]
     
 class Paciente(models.Model):
     usuario = models.OneToOneField(Usuario, on_delete=models.CASCADE, primary_key=True)
@@ -176,25 +206,32 @@ class Paciente(models.Model):
         """Retorna la edad del paciente"""
         return self.usuario.edad
     
-    @property
-    def tiene_alergias(self):
-        """Indica si el paciente tiene alergias registradas"""
-        return bool(self.alergias and self.alergias.strip())
-    
-    @property
-    def tiene_enfermedades_cronicas(self):
-        """Indica si el paciente tiene enfermedades crónicas registradas"""
-        return bool(self.enfermedades_cronicas and self.enfermedades_cronicas.strip())
-    
-    @property
-    def tiene_medicamentos_actuales(self):
-        """Indica si el paciente tiene medicamentos actuales registrados"""
-        return bool(self.medicamentos_actuales and self.medicamentos_actuales.strip())
-    
-    @property
-    def tiene_contacto_emergencia(self):
-        """Indica si el paciente tiene contacto de emergencia registrado"""
-        return bool(self.contacto_emergencia_nombre and self.contacto_emergencia_telefono)
+    # Indicadores clínicos calculados por PostgreSQL (columnas generadas
+    # almacenadas) para filtrar con índices parciales. Paciente.save() los
+    # descarta de la instancia para que se relean al accederlos.
+    tiene_alergias = models.GeneratedField(
+        expression=texto_informado('alergias'), output_field=models.BooleanField(), db_persist=True
+    )
+    tiene_enfermedades_cronicas = models.GeneratedField(
+        expression=texto_informado('enfermedades_cronicas'), output_field=models.BooleanField(), db_persist=True
+    )
+    tiene_medicamentos_actuales = models.GeneratedField(
+        expression=texto_informado('medicamentos_actuales'), output_field=models.BooleanField(), db_persist=True
+    )
+    tiene_contacto_emergencia = models.GeneratedField(
+        expression=texto_informado('contacto_emergencia_nombre', 'contacto_emergencia_telefono'),
+        output_field=models.BooleanField(),
+        db_persist=True
+    )
+
+    INDICADORES = (
+        'tiene_alergias', 'tiene_enfermedades_cronicas', 'tiene_medicamentos_actuales', 'tiene_contacto_emergencia',
+    )
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        for campo in self.INDICADORES:
+            self.__dict__.pop(campo, None)
     
     class Meta:
         verbose_name = "Paciente"
@@ -202,6 +239,19 @@ class Paciente(models.Model):
         indexes = [
             models.Index(fields=['estado']),
             models.Index(fields=['tipo_sangre']),
+            indice_trigram('contacto_emergencia_nombre', 'paciente_contacto_trgm'),
+            indice_trigram('enfermedades_cronicas', 'paciente_enfermedades_trgm'),
+            # Índices parciales: solo las filas con el indicador en verdadero
+            models.Index(fields=['estado'], condition=models.Q(tiene_alergias=True), name='paciente_alergias_idx'),
+            models.Index(
+                fields=['estado'], condition=models.Q(tiene_enfermedades_cronicas=True), name='paciente_cronicos_idx'
+            ),
+            models.Index(
+                fields=['estado'], condition=models.Q(tiene_medicamentos_actuales=True), name='paciente_medicados_idx'
+            ),
+            models.Index(
+                fields=['estado'], condition=models.Q(tiene_contacto_emergencia=True), name='paciente_contacto_idx'
+            ),
         ]
 
 class Administrador(models.Model):
@@ -288,12 +338,28 @@ class Bitacora(models.Model):
     fecha_hora = models.DateTimeField(auto_now_add=True)
     detalles = models.TextField(blank=True, null=True)
 
+    # Vector de búsqueda de texto completo (columna generada en PostgreSQL)
+    busqueda = models.GeneratedField(
+        expression=(
+            SearchVector('accion_realizada', weight='A', config='spanish')
+            + SearchVector('modulo_afectado', weight='B', config='spanish')
+            + SearchVector('detalles', weight='C', config='spanish')
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
     def __str__(self):
         return f"{self.usuario.email} - {self.accion_realizada} - {self.fecha_hora}"
 
     class Meta:
         verbose_name = "Bitácora"
         verbose_name_plural = "Bitácoras"
+        # La tabla está particionada por mes sobre fecha_hora (migración 0006)
+        indexes = [
+            models.Index(fields=['-fecha_hora', '-id'], name='bitacora_fecha_id_idx'),
+            GinIndex(fields=['busqueda'], name='bitacora_busqueda_gin'),
+        ]
 
     @classmethod
     def registrar_accion(cls, usuario, request, accion, modulo, detalles=None):
@@ -368,6 +434,9 @@ class AgendaCita(models.Model):
     class Meta:
         verbose_name = "Agenda Cita"
         verbose_name_plural = "Agenda Citas"
+        indexes = [
+            models.Index(fields=['-fecha_cita', '-hora_cita', '-id'], name='agenda_fecha_hora_id_idx'),
+        ]
 
 class HistoriaClinica(models.Model):
     paciente = models.ForeignKey(Paciente, on_delete=models.CASCADE)
@@ -435,6 +504,75 @@ class RegistroBackup(models.Model):
         verbose_name = "Registro Backup"
         verbose_name_plural = "Registros Backup"
 
+class ExportJob(models.Model):
+    """
+    Exportación generada en segundo plano (services/trabajos_exportacion.py).
+    El archivo queda en EXPORTACION_TRABAJOS_DIR hasta ``expira_en``.
+    """
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('procesando', 'Procesando'),
+        ('completado', 'Completado'),
+        ('fallido', 'Fallido'),
+    ]
+    ESTADOS_ACTIVOS = ('pendiente', 'procesando')
+
+    FORMATO_CHOICES = [
+        ('pdf', 'PDF'),
+        ('excel', 'Excel'),
+        ('html', 'HTML'),
+        ('csv', 'CSV'),
+    ]
+
+    usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='exportaciones')
+    tipo = models.CharField(max_length=50)  # pacientes, bitacora, horarios, examenes
+    formato = models.CharField(max_length=10, choices=FORMATO_CHOICES)
+    # sha256 de usuario + tipo + formato + parámetros de filtrado: identifica solicitudes idénticas
+    huella = models.CharField(max_length=64, db_index=True)
+    # Acción y parámetros de la solicitud (para volver a armar el queryset) y columnas/título
+    parametros = models.JSONField(default=dict)
+
+    estado = models.CharField(max_length=15, choices=ESTADO_CHOICES, default='pendiente')
+    filas_totales = models.PositiveIntegerField(blank=True, null=True)
+    filas_procesadas = models.PositiveIntegerField(default=0)
+    nombre_archivo = models.CharField(max_length=255)
+    ruta_archivo = models.CharField(max_length=500, blank=True, null=True)
+    tamano_bytes = models.BigIntegerField(blank=True, null=True)
+    error = models.TextField(blank=True, null=True)
+
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_inicio = models.DateTimeField(blank=True, null=True)
+    fecha_fin = models.DateTimeField(blank=True, null=True)
+    expira_en = models.DateTimeField()
+
+    @property
+    def progreso(self):
+        """Porcentaje de filas procesadas (0-100)"""
+        if self.estado == 'completado':
+            return 100
+        if not self.filas_totales:
+            return 0
+        return min(99, int(self.filas_procesadas * 100 / self.filas_totales))
+
+    def __str__(self):
+        return f"Exportación {self.tipo} ({self.formato}) - {self.estado}"
+
+    class Meta:
+        verbose_name = "Trabajo de Exportación"
+        verbose_name_plural = "Trabajos de Exportación"
+        constraints = [
+            # Una sola exportación en curso por solicitud idéntica
+            models.UniqueConstraint(
+                fields=['huella'],
+                condition=models.Q(estado__in=['pendiente', 'procesando']),
+                name='exportjob_huella_activa_unica',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['usuario', '-fecha_creacion'], name='exportjob_usuario_fecha_idx'),
+            models.Index(fields=['expira_en'], name='exportjob_expira_idx'),
+        ]
+
 # -------------------------------
 # EXÁMENES MÉDICOS 
 # -------------------------------
@@ -598,6 +736,10 @@ class Notificacion(models.Model):
         verbose_name_plural = "Notificaciones"
         db_table = 'notificaciones'
         ordering = ['-fecha_envio']
+        indexes = [
+            models.Index(fields=['usuario', '-fecha_envio', '-id'], name='notif_usuario_fecha_id_idx'),
+            models.Index(fields=['-fecha_envio', '-id'], name='notif_fecha_id_idx'),
+        ]
 
 class Dispositivo(models.Model):
     """
@@ -0,0 +1,224 @@
+"""
+Paginación por cursor (keyset) para listados que crecen por inserción.
+
+En lugar de ``OFFSET N`` + ``COUNT(*)`` cada página se obtiene filtrando
+a partir de la última fila entregada sobre un orden estable y único
+(por ejemplo ``(-fecha_hora, -id)``), por lo que el costo es el mismo en
+la página 1 que en la página 10.000.
+
+Parámetros de consulta:
+    cursor     Cursor opaco devuelto en ``next`` / ``previous``.
+    page_size  Tamaño de página (máximo ``max_page_size``).
+    conteo     ``exacto`` (COUNT(*), por defecto), ``aproximado``
+               (estimación del planificador) o ``ninguno`` (sin ``count``
+               en la respuesta, el modo más barato).
+
+Los clientes que aún envían ``page`` u ``ordering`` reciben la paginación
+por número de página de siempre. Las dos formas traen ``count`` (la
+paginación por cursor lo omite solo con ``conteo=ninguno``).
+"""
+import base64
+import json
+from datetime import date, datetime, time
+
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetCursorPagination(BasePagination):
+    ordering = ('-id',)
+    page_size = api_settings.PAGE_SIZE or 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    conteo_query_param = 'conteo'
+    conteo_por_defecto = 'exacto'
+    # Parámetros que fuerzan la paginación clásica por número de página
+    parametros_legado = ('page', 'ordering')
+    invalid_cursor_message = 'Cursor inválido'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.legado = None
+
+        if any(param in request.query_params for param in self.parametros_legado):
+            self.legado = PageNumberPagination()
+            self.legado.page_size = self.get_page_size(request)
+            return self.legado.paginate_queryset(queryset, request, view)
+
+        self.page_size = self.get_page_size(request)
+        self.base_url = remove_query_param(request.build_absolute_uri(), 'page')
+        self.campos = [(campo.lstrip('-'), campo.startswith('-')) for campo in self.ordering]
+        self.total = self.get_total(queryset, request)
+
+        valores, reverso = self.decode_cursor(request, queryset.model)
+        queryset = queryset.order_by(*self._orden(reverso))
+        if valores is not None:
+            queryset = queryset.filter(self._filtro_posterior(valores, reverso))
+
+        resultados = list(queryset[:self.page_size + 1])
+        hay_mas = len(resultados) > self.page_size
+        resultados = resultados[:self.page_size]
+
+        if reverso:
+            resultados.reverse()
+            self.has_previous = hay_mas
+            self.has_next = True
+        else:
+            self.has_previous = valores is not None
+            self.has_next = hay_mas
+
+        self.page = resultados
+        return resultados
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                size = int(request.query_params[self.page_size_query_param])
+                if size > 0:
+                    return min(size, self.max_page_size)
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    # ----- Filtro keyset -----
+
+    def _orden(self, reverso):
+        orden = []
+        for nombre, descendente in self.campos:
+            if reverso:
+                descendente = not descendente
+            orden.append(f"-{nombre}" if descendente else nombre)
+        return orden
+
+    def _filtro_posterior(self, valores, reverso):
+        """
+        Construye (c1, c2, ...) > (v1, v2, ...) respetando la dirección de
+        cada campo. La cota redundante sobre el primer campo permite que
+        PostgreSQL recorra el índice como un rango.
+        """
+        def operador(descendente, inclusivo=False):
+            if reverso:
+                descendente = not descendente
+            base = 'lt' if descendente else 'gt'
+            return base + ('e' if inclusivo else '')
+
+        primer_campo, primer_desc = self.campos[0]
+        cota = Q(**{f"{primer_campo}__{operador(primer_desc, inclusivo=True)}": valores[0]})
+
+        condicion = Q()
+        for i, (nombre, descendente) in enumerate(self.campos):
+            tramo = Q(**{f"{nombre}__{operador(descendente)}": valores[i]})
+            for j in range(i):
+                tramo &= Q(**{self.campos[j][0]: valores[j]})
+            condicion |= tramo
+
+        return cota & condicion
+
+    # ----- Cursor -----
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+
+        try:
+            crudo = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8')
+            datos = json.loads(crudo)
+            valores = [
+                model._meta.get_field(nombre).to_python(valor)
+                for (nombre, _desc), valor in zip(self.campos, datos['v'], strict=True)
+            ]
+            return valores, bool(datos.get('r'))
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, instancia, reverso):
+        valores = []
+        for nombre, _desc in self.campos:
+            valor = getattr(instancia, nombre)
+            if isinstance(valor, (datetime, date, time)):
+                valor = valor.isoformat()
+            valores.append(valor)
+
+        datos = {'v': valores}
+        if reverso:
+            datos['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(datos, separators=(',', ':')).encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if self.legado:
+            return self.legado.get_next_link()
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverso=False)
+
+    def get_previous_link(self):
+        if self.legado:
+            return self.legado.get_previous_link()
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverso=True)
+
+    # ----- Conteo opcional -----
+
+    def get_total(self, queryset, request):
+        modo = request.query_params.get(self.conteo_query_param, self.conteo_por_defecto)
+        if modo == 'exacto':
+            return queryset.count()
+        if modo == 'aproximado':
+            return self.estimar_total(queryset)
+        return None
+
+    def estimar_total(self, queryset):
+        """Estimación de filas del planificador de PostgreSQL (sin recorrer la tabla)"""
+        if connections[queryset.db].vendor != 'postgresql':
+            return queryset.count()
+        plan = json.loads(queryset.order_by().explain(format='json'))
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    # ----- Respuesta -----
+
+    def get_paginated_response(self, data):
+        if self.legado:
+            return self.legado.get_paginated_response(data)
+
+        respuesta = {}
+        if self.total is not None:
+            respuesta['count'] = self.total
+        respuesta['next'] = self.get_next_link()
+        respuesta['previous'] = self.get_previous_link()
+        respuesta['results'] = data
+        return Response(respuesta)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'count': {'type': 'integer', 'example': 123},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class BitacoraPagination(KeysetCursorPagination):
+    ordering = ('-fecha_hora', '-id')
+
+
+class NotificacionPagination(KeysetCursorPagination):
+    ordering = ('-fecha_envio', '-id')
+
+
+class AgendaCitaPagination(KeysetCursorPagination):
+    ordering = ('-fecha_cita', '-hora_cita', '-id')
+    # ?search= ordena por similitud (SimilitudSearchFilter), que el cursor descartaría
+    parametros_legado = ('page', 'ordering', 'search')
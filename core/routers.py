@@ -0,0 +1,84 @@
+"""
+Réplica de lectura.
+
+Las lecturas van a la base principal salvo dentro de ``solo_lectura()``
+(intención de solo lectura marcada por la vista: dashboard, estadísticas,
+listados/búsqueda de bitácora, historiales). Ahí ``ReplicaRouter`` las manda
+al alias ``replica`` si está configurado (settings.DB_REPLICA_*), excepto:
+
+    - después de una escritura en el mismo contexto (lectura después de
+      escritura: lo recién escrito puede no haber llegado a la réplica)
+    - dentro de una transacción abierta en la base principal
+
+Las escrituras van siempre a la principal. Las exportaciones fijan la
+réplica explícitamente con ``alias_lectura()`` (services/exportaciones.py).
+"""
+from contextlib import ContextDecorator
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA = 'replica'
+
+_intencion_lectura = ContextVar('intencion_lectura', default=False)
+_hubo_escritura = ContextVar('hubo_escritura', default=False)
+
+
+def alias_lectura():
+    """Alias para lecturas pesadas: la réplica si existe, si no la principal"""
+    return REPLICA if REPLICA in settings.DATABASES else DEFAULT_DB_ALIAS
+
+
+class solo_lectura(ContextDecorator):
+    """
+    Marca el bloque (o la vista decorada) como de solo lectura::
+
+        with solo_lectura():
+            ...
+
+        @solo_lectura()
+        def vista(request): ...
+    """
+
+    def __init__(self):
+        self._tokens = []
+
+    def _recreate_cm(self):
+        # Como decorador, una instancia nueva por llamada (las vistas pueden ejecutarse en paralelo)
+        return solo_lectura()
+
+    def __enter__(self):
+        self._tokens.append((_intencion_lectura.set(True), _hubo_escritura.set(False)))
+        return self
+
+    def __exit__(self, *exc):
+        intencion, escritura = self._tokens.pop()
+        _hubo_escritura.reset(escritura)
+        _intencion_lectura.reset(intencion)
+        return False
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if not _intencion_lectura.get() or _hubo_escritura.get():
+            return None
+        alias = alias_lectura()
+        if alias == DEFAULT_DB_ALIAS or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        # Explícito: sin esto un objeto leído de la réplica se guardaría en la réplica
+        _hubo_escritura.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, REPLICA}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # La réplica recibe el esquema por replicación
+        return False if db == REPLICA else None
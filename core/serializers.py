@@ -328,8 +328,8 @@ class PacienteResumenSerializer(serializers.ModelSerializer):
     email = serializers.CharField(source='usuario.email', read_only=True)
     telefono = serializers.CharField(source='usuario.telefono', read_only=True)
     edad = serializers.SerializerMethodField()
-    tiene_alergias = serializers.SerializerMethodField()
-    tiene_enfermedades = serializers.SerializerMethodField()
+    tiene_alergias = serializers.BooleanField(read_only=True)
+    tiene_enfermedades = serializers.BooleanField(source='tiene_enfermedades_cronicas', read_only=True)
 
     class Meta:
         model = Paciente
@@ -345,12 +345,6 @@ class PacienteResumenSerializer(serializers.ModelSerializer):
             return today.year - born.year - ((today.month, today.day) < (born.month, born.day))
         return None
 
-    def get_tiene_alergias(self, obj):
-        return bool(obj.alergias and obj.alergias.strip())
-
-    def get_tiene_enfermedades(self, obj):
-        return bool(obj.enfermedades_cronicas and obj.enfermedades_cronicas.strip())
-
 class AdministradorSerializer(serializers.ModelSerializer):
     usuario = UsuarioSerializer()
     class Meta:
@@ -459,6 +453,34 @@ class PermisoComponenteSerializer(serializers.ModelSerializer):
             'accion_permitida', 'condiciones'
         ]
 
+class PermisosRolSerializer(serializers.Serializer):
+    """PUT /roles/<id>/permisos/: lista completa de permisos del rol"""
+    permisos = serializers.ListField(child=serializers.IntegerField(min_value=1), default=list)
+
+class AsignacionRolSerializer(serializers.Serializer):
+    """Elemento de asignar-matriz: permisos y/o matriz de componentes de un rol"""
+    rol = serializers.IntegerField(min_value=1)
+    permisos = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False)
+    componentes = serializers.DictField(
+        child=serializers.ListField(
+            child=serializers.ChoiceField(choices=PermisoComponente.ACCIONES_PERMITIDAS)
+        ),
+        required=False
+    )
+
+class AsignacionMatrizSerializer(serializers.Serializer):
+    roles = AsignacionRolSerializer(many=True, allow_empty=False)
+
+    def validate_roles(self, entradas):
+        # Todos los roles en una consulta; cada entrada queda con su instancia
+        roles = Rol.objects.in_bulk({entrada['rol'] for entrada in entradas})
+        faltantes = sorted({entrada['rol'] for entrada in entradas} - set(roles))
+        if faltantes:
+            raise ValidationError(f"Roles inexistentes: {faltantes}")
+        for entrada in entradas:
+            entrada['rol'] = roles[entrada['rol']]
+        return entradas
+
 class BitacoraSerializer(serializers.ModelSerializer):
     usuario_email = serializers.EmailField(source='usuario.email', read_only=True)
     usuario_nombre = serializers.CharField(source='usuario.nombre', read_only=True)
@@ -687,6 +709,26 @@ class RegistroBackupSerializer(serializers.ModelSerializer):
     def get_nombre_completo_responsable(self, obj):
         return f"{obj.usuario_responsable.nombre} {obj.usuario_responsable.apellido}"
 
+class ExportJobSerializer(serializers.ModelSerializer):
+    progreso = serializers.IntegerField(read_only=True)
+    url_descarga = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ExportJob
+        fields = [
+            'id', 'tipo', 'formato', 'estado', 'progreso', 'filas_totales', 'filas_procesadas',
+            'nombre_archivo', 'tamano_bytes', 'error', 'fecha_creacion', 'fecha_inicio',
+            'fecha_fin', 'expira_en', 'url_descarga'
+        ]
+        read_only_fields = fields
+
+    def get_url_descarga(self, obj):
+        if obj.estado != 'completado':
+            return None
+        url = f"/api/exports/{obj.id}/descargar/"
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
 # -------------------------------
 # EXÁMENES MÉDICOS 
 # -------------------------------
@@ -0,0 +1,281 @@
+"""
+Archivo en frío de la bitácora.
+
+Los meses que superan ``BITACORA_ARCHIVO_MESES`` se sacan de PostgreSQL y
+se guardan bajo ``BITACORA_ARCHIVO_DIR`` (dentro de backups/) como:
+
+    bitacora_AAAAMM.jsonl.gz   Segmentos gzip concatenados (un miembro gzip
+                               por bloque de filas) en orden (fecha_hora, id).
+    bitacora_AAAAMM.idx        Índice binario: cabecera + un registro fijo por
+                               segmento (desde_us, hasta_us, offset, longitud, filas).
+
+Cada mes se escribe una sola vez, completo, en archivos temporales que se
+renombran al terminar (primero los datos y al final el índice, que es el que
+hace visible el mes). Volver a archivar un mes que ya tiene índice no lo
+reescribe: solo elimina de la base de datos las filas que ya están en el
+archivo (corte entre la escritura y el borrado).
+
+Para consultar, el índice se mapea en memoria y solo se descomprimen los
+segmentos cuyo rango de fechas se cruza con el solicitado, de a uno y
+recorridos hacia atrás. Cada fila guarda también los datos del usuario, de
+modo que el registro sigue siendo legible aunque el usuario se elimine.
+"""
+import glob
+import gzip
+import json
+import mmap
+import os
+import re
+import struct
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+
+from ..models import Bitacora
+from .particiones_bitacora import (
+    _soporta_particiones, inicio_mes, listar_particiones, nombre_particion, separar_particion, sumar_meses,
+)
+
+CABECERA_INDICE = b'BITIDX01'
+REGISTRO_INDICE = struct.Struct('<qqQQQ')  # desde_us, hasta_us, offset, longitud, filas
+PATRON_ARCHIVO = re.compile(r'^bitacora_(\d{4})(\d{2})\.idx$')
+
+CAMPOS_ARCHIVO = [
+    'id', 'usuario_id', 'usuario__email', 'usuario__nombre', 'usuario__apellido',
+    'ip_address', 'accion_realizada', 'modulo_afectado', 'fecha_hora', 'detalles',
+]
+
+
+def directorio_archivo():
+    directorio = getattr(settings, 'BITACORA_ARCHIVO_DIR', None) or os.path.join(settings.BACKUP_DIR, 'bitacora_archivo')
+    os.makedirs(directorio, exist_ok=True)
+    return directorio
+
+
+def _rutas(mes):
+    base = os.path.join(directorio_archivo(), f"bitacora_{mes.year:04d}{mes.month:02d}")
+    return base + '.jsonl.gz', base + '.idx'
+
+
+def _a_microsegundos(fecha):
+    return int(fecha.timestamp() * 1_000_000)
+
+
+def _serializar(fila):
+    (id_, usuario_id, email, nombre, apellido, ip, accion, modulo, fecha_hora, detalles) = fila
+    return {
+        'id': id_,
+        'usuario': usuario_id,
+        'usuario_email': email,
+        'usuario_nombre': nombre,
+        'usuario_apellido': apellido,
+        'nombre_completo': f"{nombre} {apellido}",
+        'ip_address': ip,
+        'accion_realizada': accion,
+        'modulo_afectado': modulo,
+        'fecha_hora': fecha_hora.astimezone(dt_timezone.utc).isoformat(),
+        'detalles': detalles,
+    }
+
+
+# ----- Escritura -----
+
+def _escribir_mes(mes, filas, filas_por_segmento):
+    """
+    Escribe los segmentos del mes en archivos ``.parcial`` y los renombra al
+    terminar: los datos primero y después el índice. Si el proceso se corta
+    antes del último rename, el mes no queda visible y se vuelve a escribir
+    completo en la próxima corrida.
+    """
+    ruta_datos, ruta_indice = _rutas(mes)
+    registros = []
+    total = 0
+
+    with open(ruta_datos + '.parcial', 'wb') as datos:
+        bloque, desde, hasta = [], None, None
+
+        def volcar():
+            offset = datos.tell()
+            comprimido = gzip.compress(b''.join(bloque), compresslevel=6, mtime=0)
+            datos.write(comprimido)
+            registros.append(REGISTRO_INDICE.pack(desde, hasta, offset, len(comprimido), len(bloque)))
+
+        for fila in filas:
+            marca = _a_microsegundos(fila[8])
+            desde = marca if desde is None else min(desde, marca)
+            hasta = marca if hasta is None else max(hasta, marca)
+            bloque.append(json.dumps(_serializar(fila), ensure_ascii=False).encode('utf-8') + b'\n')
+            total += 1
+            if len(bloque) >= filas_por_segmento:
+                volcar()
+                bloque, desde, hasta = [], None, None
+
+        if bloque:
+            volcar()
+
+        datos.flush()
+        os.fsync(datos.fileno())
+
+    if not registros:
+        os.remove(ruta_datos + '.parcial')
+        return 0
+
+    with open(ruta_indice + '.parcial', 'wb') as indice:
+        indice.write(CABECERA_INDICE)
+        indice.write(b''.join(registros))
+        indice.flush()
+        os.fsync(indice.fileno())
+
+    os.replace(ruta_datos + '.parcial', ruta_datos)
+    os.replace(ruta_indice + '.parcial', ruta_indice)
+    return total
+
+
+def _borrar_archivados(rango, ids, lote=5000):
+    ids = sorted(ids)
+    for i in range(0, len(ids), lote):
+        rango.filter(id__in=ids[i:i + lote]).delete()
+
+
+def archivar_mes(mes, filas_por_segmento=None):
+    """
+    Archiva todas las filas del mes indicado y las elimina de la base de
+    datos. Si el mes tiene su propia partición se separa y elimina (operación
+    de metadatos); si no, se borra el rango.
+    Se asume que no llegan inserciones nuevas para meses pasados: si el mes
+    ya estaba archivado, las filas que no figuran en el archivo se dejan en
+    la base de datos. Retorna la cantidad de filas archivadas.
+    """
+    if filas_por_segmento is None:
+        filas_por_segmento = getattr(settings, 'BITACORA_ARCHIVO_FILAS_SEGMENTO', 5000)
+    desde = inicio_mes(mes)
+    hasta = sumar_meses(desde, 1)
+    rango = Bitacora.objects.filter(fecha_hora__gte=desde, fecha_hora__lt=hasta)
+
+    if os.path.exists(_rutas(desde)[1]):
+        # Reintento después de un corte entre la escritura y el borrado
+        en_base = set(rango.values_list('id', flat=True))
+        archivados = {fila['id'] for fila in _filas_mes(desde)}
+        sin_archivar = en_base - archivados
+        if sin_archivar:
+            print(f"Bitácora {desde:%Y-%m}: {len(sin_archivar)} filas posteriores al archivo quedan en la base de datos")
+            with transaction.atomic():
+                _borrar_archivados(rango, en_base & archivados)
+            return 0
+        total = 0
+    else:
+        filas = rango.order_by('fecha_hora', 'id').values_list(*CAMPOS_ARCHIVO).iterator(chunk_size=filas_por_segmento)
+        total = _escribir_mes(desde, filas, filas_por_segmento)
+
+    with transaction.atomic():
+        nombre = nombre_particion(desde)
+        if _soporta_particiones() and nombre in {p[0] for p in listar_particiones()}:
+            separar_particion(nombre, eliminar=True)
+        # Filas que hayan quedado en la partición DEFAULT (o tabla sin particionar)
+        rango.delete()
+
+    return total
+
+
+def meses_para_archivar(meses_calientes=None, referencia=None):
+    """Meses con filas en la base de datos anteriores a la ventana caliente"""
+    if meses_calientes is None:
+        meses_calientes = getattr(settings, 'BITACORA_ARCHIVO_MESES', 0)
+    if not meses_calientes:
+        return []
+
+    limite = sumar_meses(inicio_mes(referencia or datetime.now(dt_timezone.utc)), -meses_calientes)
+    return list(
+        Bitacora.objects.filter(fecha_hora__lt=limite)
+        .datetimes('fecha_hora', 'month', tzinfo=dt_timezone.utc)
+    )
+
+
+def archivar_bitacora(meses_calientes=None, referencia=None):
+    """Archiva los meses vencidos. Retorna [(AAAAMM, filas), ...]"""
+    archivados = []
+    for mes in meses_para_archivar(meses_calientes, referencia):
+        archivados.append((f"{mes.year:04d}{mes.month:02d}", archivar_mes(mes)))
+    return archivados
+
+
+# ----- Lectura -----
+
+def _segmentos(ruta_indice):
+    """Registros del índice leídos sobre un mapa de memoria"""
+    with open(ruta_indice, 'rb') as archivo:
+        if os.fstat(archivo.fileno()).st_size <= len(CABECERA_INDICE):
+            return []
+        with mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+            if mapa[:len(CABECERA_INDICE)] != CABECERA_INDICE:
+                raise ValueError(f"Índice de archivo inválido: {ruta_indice}")
+            # Un registro incompleto al final (escritura en curso) se ignora
+            largo = len(mapa) - len(CABECERA_INDICE)
+            fin = len(CABECERA_INDICE) + largo - largo % REGISTRO_INDICE.size
+            with memoryview(mapa)[len(CABECERA_INDICE):fin] as cuerpo:
+                return list(REGISTRO_INDICE.iter_unpack(cuerpo))
+
+
+def meses_archivados():
+    """[(mes, segmentos, filas), ...] ordenados por mes"""
+    resultado = []
+    for ruta in glob.glob(os.path.join(directorio_archivo(), 'bitacora_*.idx')):
+        coincidencia = PATRON_ARCHIVO.match(os.path.basename(ruta))
+        if not coincidencia:
+            continue
+        mes = datetime(int(coincidencia.group(1)), int(coincidencia.group(2)), 1, tzinfo=dt_timezone.utc)
+        segmentos = _segmentos(ruta)
+        resultado.append((mes, len(segmentos), sum(s[4] for s in segmentos)))
+    return sorted(resultado, key=lambda m: m[0])
+
+
+def _filas_mes(mes, desde_us=None, hasta_us=None, descendente=False):
+    """
+    Filas archivadas del mes dentro de [desde_us, hasta_us], descomprimiendo
+    un segmento a la vez. Los segmentos se escribieron en orden (fecha_hora,
+    id), así que para el orden descendente basta recorrerlos al revés.
+    """
+    ruta_datos, ruta_indice = _rutas(mes)
+    candidatos = [
+        s for s in _segmentos(ruta_indice)
+        if (desde_us is None or s[1] >= desde_us) and (hasta_us is None or s[0] <= hasta_us)
+    ]
+    if descendente:
+        candidatos.reverse()
+
+    with open(ruta_datos, 'rb') as datos:
+        for _desde, _hasta, offset, longitud, _n in candidatos:
+            datos.seek(offset)
+            lineas = gzip.decompress(datos.read(longitud)).splitlines()
+            if descendente:
+                lineas.reverse()
+            for linea in lineas:
+                fila = json.loads(linea)
+                marca = _a_microsegundos(datetime.fromisoformat(fila['fecha_hora']))
+                if desde_us is not None and marca < desde_us:
+                    continue
+                if hasta_us is not None and marca > hasta_us:
+                    continue
+                yield fila
+
+
+def consultar_archivo(desde=None, hasta=None, filtro=None):
+    """
+    Itera las filas archivadas con ``desde <= fecha_hora <= hasta``
+    (ambos opcionales, datetimes con zona) en orden descendente de fecha.
+    ``filtro`` es un callable opcional aplicado a cada fila (dict).
+    Es perezoso: solo se descomprimen los segmentos que se llegan a recorrer.
+    """
+    desde_us = _a_microsegundos(desde) if desde else None
+    hasta_us = _a_microsegundos(hasta) if hasta else None
+
+    for mes, _segs, _filas in reversed(meses_archivados()):
+        if desde and sumar_meses(mes, 1) <= desde:
+            continue
+        if hasta and mes > hasta:
+            continue
+
+        for fila in _filas_mes(mes, desde_us, hasta_us, descendente=True):
+            if filtro is None or filtro(fila):
+                yield fila
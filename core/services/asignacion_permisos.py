@@ -0,0 +1,118 @@
+"""
+Asignación masiva de permisos RBAC por diferencias.
+
+El estado deseado se compara en memoria con el actual y solo se aplican
+las diferencias: un ``bulk_create`` para lo nuevo y un único
+``DELETE ... WHERE id IN (...)`` para lo que sobra, todo dentro de la
+transacción del llamador.
+
+La matriz rol × componente × acción se guarda en un Permiso propio de cada
+rol (codigo ``rol_<id>``), que se crea y asocia al rol la primera vez. Los
+componentes que el rol recibe a través de otros permisos compartidos no se
+modifican aquí; para quitarlos se debe reemplazar la lista de permisos del
+rol.
+"""
+from django.db.models import Q
+
+from ..models import ComponenteUI, Permiso, PermisoComponente, Rol
+
+ACCIONES_VALIDAS = {codigo for codigo, _nombre in PermisoComponente.ACCIONES_PERMITIDAS}
+
+
+def codigo_permiso_propio(rol):
+    return f"rol_{rol.id}"
+
+
+def sincronizar_permisos_rol(rol, permiso_ids):
+    """
+    Deja a ``rol`` exactamente con ``permiso_ids`` (enteros, ya validados
+    por PermisosRolSerializer/AsignacionMatrizSerializer) más su permiso
+    propio. Retorna (agregados, removidos) como conjuntos de ids.
+    """
+    deseados = set(permiso_ids)
+    existentes = dict(
+        Permiso.objects.filter(Q(id__in=deseados) | Q(codigo=codigo_permiso_propio(rol))).values_list('id', 'codigo')
+    )
+    invalidos = deseados - set(existentes)
+    if invalidos:
+        raise ValueError(f"Permisos inexistentes: {sorted(invalidos)}")
+    # El permiso propio del rol lo administra la matriz de componentes
+    deseados.update(p for p, codigo in existentes.items() if codigo == codigo_permiso_propio(rol))
+
+    RolPermiso = Rol.permisos.through
+    actuales = dict(RolPermiso.objects.filter(rol=rol).values_list('permiso_id', 'id'))
+
+    agregados = deseados - set(actuales)
+    removidos = set(actuales) - deseados
+
+    if removidos:
+        RolPermiso.objects.filter(id__in=[actuales[p] for p in removidos]).delete()
+    if agregados:
+        RolPermiso.objects.bulk_create([RolPermiso(rol=rol, permiso_id=p) for p in agregados])
+
+    return agregados, removidos
+
+
+def permiso_propio_rol(rol):
+    """Permiso que agrupa los componentes asignados directamente al rol"""
+    permiso, _creado = Permiso.objects.get_or_create(
+        codigo=codigo_permiso_propio(rol),
+        defaults={
+            'nombre': f"Componentes del rol {rol.nombre_rol}"[:100],
+            'descripcion': 'Permisos de componentes asignados directamente al rol',
+        }
+    )
+    rol.permisos.add(permiso)
+    return permiso
+
+
+def sincronizar_matrices(matrices):
+    """
+    ``matrices``: {rol: {codigo_componente: iterable de acciones}}
+    Aplica todas las diferencias con una consulta de lectura por tabla, un
+    DELETE y un INSERT masivo. Retorna {rol_id: (agregados, removidos)}.
+    """
+    codigos = {codigo for matriz in matrices.values() for codigo in matriz}
+    componentes = dict(
+        ComponenteUI.objects.filter(codigo_componente__in=codigos).values_list('codigo_componente', 'id')
+    )
+    faltantes = codigos - set(componentes)
+    if faltantes:
+        raise ValueError(f"Componentes inexistentes: {sorted(faltantes)}")
+
+    deseado = set()
+    permiso_por_rol = {}
+    for rol, matriz in matrices.items():
+        permiso = permiso_propio_rol(rol)
+        permiso_por_rol[rol.id] = permiso.id
+        for codigo, acciones in matriz.items():
+            acciones = set(acciones)
+            invalidas = acciones - ACCIONES_VALIDAS
+            if invalidas:
+                raise ValueError(f"Acciones inválidas para {codigo}: {sorted(invalidas)}")
+            deseado.update((permiso.id, componentes[codigo], accion) for accion in acciones)
+
+    actual = {
+        (permiso_id, componente_id, accion): id_
+        for id_, permiso_id, componente_id, accion in PermisoComponente.objects.filter(
+            permiso_id__in=permiso_por_rol.values()
+        ).values_list('id', 'permiso_id', 'componente_id', 'accion_permitida')
+    }
+
+    nuevos = deseado - set(actual)
+    sobrantes = set(actual) - deseado
+
+    if sobrantes:
+        PermisoComponente.objects.filter(id__in=[actual[clave] for clave in sobrantes]).delete()
+    if nuevos:
+        PermisoComponente.objects.bulk_create([
+            PermisoComponente(permiso_id=p, componente_id=c, accion_permitida=a) for p, c, a in nuevos
+        ])
+
+    resumen = {}
+    for rol_id, permiso_id in permiso_por_rol.items():
+        resumen[rol_id] = (
+            sum(1 for clave in nuevos if clave[0] == permiso_id),
+            sum(1 for clave in sobrantes if clave[0] == permiso_id),
+        )
+    return resumen
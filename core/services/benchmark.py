@@ -0,0 +1,264 @@
+"""
+Benchmark de endpoints en proceso (cliente de pruebas de DRF).
+
+Cada escenario se ejecuta como un usuario del rol indicado contra la base de
+datos actual (pensado para los datos de ``seed_scale``) y se mide:
+
+    - latencia p50/p95 (ms) sobre --repeticiones, después del calentamiento;
+      con pocas repeticiones el p95 es casi el máximo y varía entre corridas,
+      por eso el valor por defecto es REPETICIONES
+    - cantidad de consultas SQL por request
+    - memoria pico (KiB, tracemalloc) de un request
+
+Cada escenario corre dentro de una transacción que se revierte, así las
+escrituras de los endpoints (bitácora) no se acumulan. El throttling de DRF
+se desactiva mientras se mide.
+
+Después del calentamiento las cachés (matriz y menú RBAC, estadísticas,
+índice typeahead) ya están llenas, así que los escenarios normales miden el
+acierto. Los de ESCENARIOS_CACHE_FRIA repiten un escenario vaciándolas
+antes de cada request: el primer request después de un cambio de datos o
+de iniciar el proceso. Vacían las versiones de la caché compartida
+configurada, por eso no deben correr contra la de producción.
+
+``comparar`` contrasta los resultados con la línea base en JSON
+(BENCHMARK_LINEA_BASE): una regresión es más consultas que la línea base, o
+latencia (p50 y p95) o memoria por encima del mismo umbral relativo (y de un
+mínimo absoluto para no reportar ruido).
+"""
+import gc
+import json
+import math
+import statistics
+import time
+import tracemalloc
+from contextlib import ExitStack
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework.views import APIView
+
+from ..models import Administrador, Medico, MedicoEspecialidad, Paciente
+from . import estadisticas_pacientes, typeahead
+from . import permisos as permisos_rbac
+
+# Diferencias absolutas por debajo de estas no cuentan como regresión
+MINIMO_LATENCIA_MS = 5
+MINIMO_MEMORIA_KIB = 256
+
+# Requests medidos por escenario: el p95 de 100 muestras deja 5 por encima
+REPETICIONES = 100
+
+
+def _hoy():
+    return timezone.localdate()
+
+
+# nombre -> (rol, función que arma la URL con el contexto)
+ESCENARIOS = {
+    'horarios_disponibles': ('paciente', lambda c: (
+        f"/api/horarios-disponibles/?medico_id={c['medico']}"
+        f"&fecha_inicio={_hoy()}&fecha_fin={_hoy() + timedelta(days=6)}"
+    )),
+    'horarios_disponibles_medico': ('medico', lambda c: '/api/horarios-disponibles/mi-horario/'),
+    'agenda_horas_disponibles': ('paciente', lambda c: (
+        f"/api/agenda-citas/horas-disponibles/?medico_especialidad={c['medico_especialidad']}"
+        f"&fecha={_hoy() + timedelta(days=1)}"
+    )),
+    'agenda_citas_lista': ('administrador', lambda c: '/api/agenda-citas/'),
+    'historial_medico': ('paciente', lambda c: f"/api/historial-medico/paciente/{c['paciente']}/"),
+    'dashboard_admin': ('administrador', lambda c: '/api/dashboard/'),
+    'dashboard_medico': ('medico', lambda c: '/api/dashboard/'),
+    'bitacora_lista': ('administrador', lambda c: '/api/bitacora/'),
+    'bitacora_busqueda': ('administrador', lambda c: '/api/bitacora/?search=cita'),
+    'pacientes_lista': ('administrador', lambda c: '/api/pacientes/?search=mar'),
+    'pacientes_estadisticas': ('administrador', lambda c: '/api/pacientes/estadisticas/'),
+    'select_pacientes': ('medico', lambda c: '/api/select/pacientes/?search=mar'),
+    'select_medicos': ('paciente', lambda c: '/api/select/medicos/?search=gar'),
+    'select_medico_especialidades': ('paciente', lambda c: '/api/select/medico-especialidades/'),
+    'notificaciones_no_leidas': ('paciente', lambda c: '/api/notificaciones/no-leidas/'),
+    'menu_rbac': ('medico', lambda c: '/api/componentes-ui/mi-menu/'),
+}
+
+# nombre -> escenario que se repite con las cachés vacías
+ESCENARIOS_CACHE_FRIA = {
+    'menu_rbac_frio': 'menu_rbac',
+    'pacientes_estadisticas_frio': 'pacientes_estadisticas',
+    'select_pacientes_frio': 'select_pacientes',
+    'select_medicos_frio': 'select_medicos',
+}
+
+NOMBRES_ESCENARIOS = (*ESCENARIOS, *ESCENARIOS_CACHE_FRIA)
+
+
+def contexto():
+    """Usuarios e ids sobre los que se ejecutan los escenarios (siempre los mismos para los mismos datos)"""
+    administrador = Administrador.objects.select_related('usuario').order_by('pk').first()
+    # El médico con más horarios y el paciente con más citas: los casos pesados
+    medico_especialidad = (
+        MedicoEspecialidad.objects.filter(medico__estado='Activo', medico__usuario__activo=True)
+        .annotate(horarios=Count('horariomedico')).order_by('-horarios', 'pk').first()
+    )
+    paciente = (
+        Paciente.objects.filter(usuario__activo=True)
+        .annotate(citas=Count('agendacita')).order_by('-citas', 'pk').select_related('usuario').first()
+    )
+    faltantes = [
+        nombre for nombre, valor in (
+            ('administrador', administrador), ('médico', medico_especialidad), ('paciente', paciente)
+        ) if valor is None
+    ]
+    if faltantes:
+        raise ValueError(f"Faltan datos para el benchmark: {', '.join(faltantes)} (ejecute seed_scale)")
+
+    medico = Medico.objects.select_related('usuario').get(pk=medico_especialidad.medico_id)
+    return {
+        'usuarios': {
+            'administrador': administrador.usuario,
+            'medico': medico.usuario,
+            'paciente': paciente.usuario,
+        },
+        'medico': medico.pk,
+        'medico_especialidad': medico_especialidad.pk,
+        'paciente': paciente.pk,
+    }
+
+
+def _host():
+    hosts = [host for host in settings.ALLOWED_HOSTS if host not in ('*', '') and ':' not in host]
+    return hosts[0] if hosts else 'localhost'
+
+
+def _percentil(valores, percentil):
+    # Rango más cercano
+    ordenados = sorted(valores)
+    return ordenados[max(0, math.ceil(percentil / 100 * len(ordenados)) - 1)]
+
+
+def _vaciar_caches():
+    """Como después de un cambio: versiones nuevas de RBAC y estadísticas"""
+    permisos_rbac.invalidar_todos()
+    estadisticas_pacientes.invalidar()
+
+
+def _sin_indices_typeahead():
+    """
+    Índices sin construir, como al iniciar el proceso: la reconstrucción
+    ocurre fuera del request, así que el request consulta la base de datos
+    """
+    return mock.patch.multiple(
+        typeahead,
+        _indices={tipo: typeahead.IndicePrefijos(tipo) for tipo in typeahead.TIPOS},
+        programar_reconstruccion=lambda tipo, version: None,
+    )
+
+
+def medir(nombre, ctx, repeticiones=REPETICIONES, calentamiento=2):
+    frio = nombre in ESCENARIOS_CACHE_FRIA
+    rol, url = ESCENARIOS[ESCENARIOS_CACHE_FRIA.get(nombre, nombre)]
+    url = url(ctx)
+    cliente = APIClient()
+    cliente.force_authenticate(ctx['usuarios'][rol])
+    host = _host()
+    preparar = _vaciar_caches if frio else (lambda: None)
+
+    def pedir():
+        respuesta = cliente.get(url, HTTP_HOST=host)
+        if getattr(respuesta, 'streaming', False):
+            b''.join(respuesta.streaming_content)
+        return respuesta
+
+    with ExitStack() as pila:
+        pila.enter_context(mock.patch.object(APIView, 'get_throttles', lambda self: []))
+        if frio:
+            pila.enter_context(_sin_indices_typeahead())
+        pila.enter_context(transaction.atomic())
+
+        for _ in range(calentamiento):
+            respuesta = pedir()
+
+        preparar()
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = pedir()
+
+        preparar()
+        tracemalloc.start()
+        try:
+            pedir()
+            _actual, pico = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        # Como timeit: sin pausas del recolector dentro de la medición
+        tiempos = []
+        gc.collect()
+        gc.disable()
+        try:
+            for _ in range(repeticiones):
+                preparar()
+                inicio = time.perf_counter()
+                pedir()
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+        finally:
+            gc.enable()
+
+        transaction.set_rollback(True)
+
+    return {
+        'url': url,
+        'rol': rol,
+        'estado_http': respuesta.status_code,
+        'p50_ms': round(statistics.median(tiempos), 2),
+        'p95_ms': round(_percentil(tiempos, 95), 2),
+        'consultas': len(consultas),
+        'memoria_pico_kib': round(pico / 1024, 1),
+    }
+
+
+def ejecutar(nombres=None, repeticiones=REPETICIONES, calentamiento=2):
+    ctx = contexto()
+    return {nombre: medir(nombre, ctx, repeticiones, calentamiento) for nombre in (nombres or NOMBRES_ESCENARIOS)}
+
+
+def comparar(resultados, linea_base, umbral):
+    """
+    Lista de regresiones [(escenario, métrica, línea base, actual)].
+    ``umbral`` es relativo (0.25 = 25% peor que la línea base).
+    """
+    regresiones = []
+    for nombre, actual in resultados.items():
+        base = linea_base.get(nombre)
+        if base is None:
+            continue
+        if actual['estado_http'] != base['estado_http']:
+            regresiones.append((nombre, 'estado_http', base['estado_http'], actual['estado_http']))
+        if actual['consultas'] > base['consultas']:
+            regresiones.append((nombre, 'consultas', base['consultas'], actual['consultas']))
+        for metrica, minimo in (('p50_ms', MINIMO_LATENCIA_MS), ('p95_ms', MINIMO_LATENCIA_MS),
+                                ('memoria_pico_kib', MINIMO_MEMORIA_KIB)):
+            limite = max(base[metrica] * (1 + umbral), base[metrica] + minimo)
+            if actual[metrica] > limite:
+                regresiones.append((nombre, metrica, base[metrica], actual[metrica]))
+    return regresiones
+
+
+def cargar_linea_base(ruta):
+    with open(ruta, encoding='utf-8') as archivo:
+        return json.load(archivo)['escenarios']
+
+
+def guardar_linea_base(ruta, resultados, descripcion=''):
+    contenido = {
+        'descripcion': descripcion,
+        'generada': timezone.now().isoformat(timespec='seconds'),
+        'escenarios': resultados,
+    }
+    with open(ruta, 'w', encoding='utf-8') as archivo:
+        json.dump(contenido, archivo, ensure_ascii=False, indent=2, sort_keys=True)
+        archivo.write('\n')
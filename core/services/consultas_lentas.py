@@ -0,0 +1,197 @@
+"""
+Registro de consultas lentas.
+
+Con SQL_LENTAS_ACTIVO se instala un ``execute_wrapper`` en cada conexión
+nueva (señal ``connection_created``). Toda consulta que tarde
+SQL_LENTAS_UMBRAL_MS o más se agrega como una línea JSON a
+``consultas_lentas_AAAAMMDD.jsonl`` en SQL_LENTAS_DIR (un archivo por día,
+escritura en modo append: varios procesos pueden escribir a la vez) y se
+informa en el logger 'core.consultas_lentas'.
+
+Cada línea guarda la huella normalizada (services/perfil_sql.huella), el SQL
+con sus placeholders (sin parámetros, para no registrar datos personales), la
+duración y el origen en el código. Con SQL_LENTAS_EXPLAIN, cuando una
+consulta SELECT supera el peor tiempo visto para su huella en el proceso se
+captura además ``EXPLAIN (ANALYZE, BUFFERS)``. Esto vuelve a ejecutar la
+consulta, por eso está desactivado por defecto.
+
+``reporte`` agrupa las líneas por huella (cantidad, tiempo total, peor tiempo
+y el plan de la peor muestra). Lo usa el comando ``consultas_lentas``.
+"""
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.utils import timezone
+
+from . import perfil_sql
+
+logger = logging.getLogger('core.consultas_lentas')
+
+_local = threading.local()
+_peores = {}  # huella -> peor duración (ms) vista en este proceso
+_bloqueo_archivo = threading.Lock()
+
+
+def directorio():
+    ruta = getattr(settings, 'SQL_LENTAS_DIR', None) or os.path.join(settings.BACKUP_DIR, 'consultas_lentas')
+    os.makedirs(ruta, exist_ok=True)
+    return ruta
+
+
+def _ruta_dia(fecha):
+    return os.path.join(directorio(), f"consultas_lentas_{fecha:%Y%m%d}.jsonl")
+
+
+def _explain(conexion, sql, params):
+    """Plan con ANALYZE/BUFFERS; se corre en un savepoint para no afectar la transacción en curso"""
+    _local.explicando = True
+    try:
+        if conexion.in_atomic_block:
+            with transaction.atomic(using=conexion.alias):
+                with conexion.cursor() as cursor:
+                    cursor.execute(f'EXPLAIN (ANALYZE, BUFFERS) {sql}', params)
+                    return '\n'.join(fila[0] for fila in cursor.fetchall())
+        with conexion.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (ANALYZE, BUFFERS) {sql}', params)
+            return '\n'.join(fila[0] for fila in cursor.fetchall())
+    except Exception as e:
+        return f'EXPLAIN no disponible: {str(e).splitlines()[0]}'
+    finally:
+        _local.explicando = False
+
+
+def _registrar(entrada):
+    linea = json.dumps(entrada, ensure_ascii=False, default=str) + '\n'
+    try:
+        with _bloqueo_archivo, open(_ruta_dia(timezone.localdate()), 'a', encoding='utf-8') as archivo:
+            archivo.write(linea)
+    except OSError as e:
+        print(f"Error escribiendo el registro de consultas lentas: {str(e)}")
+    logger.warning(json.dumps(
+        {clave: valor for clave, valor in entrada.items() if clave != 'plan'}, ensure_ascii=False, default=str
+    ))
+
+
+def _envoltorio(conexion):
+    def envoltorio(execute, sql, params, many, context):
+        if getattr(_local, 'explicando', False):
+            return execute(sql, params, many, context)
+
+        inicio = time.perf_counter()
+        exito = False
+        try:
+            resultado = execute(sql, params, many, context)
+            exito = True
+            return resultado
+        finally:
+            duracion_ms = (time.perf_counter() - inicio) * 1000
+            if duracion_ms >= getattr(settings, 'SQL_LENTAS_UMBRAL_MS', 200):
+                huella = perfil_sql.huella(sql)
+                entrada = {
+                    'fecha': timezone.now().isoformat(timespec='seconds'),
+                    'huella': huella,
+                    'sql': sql,
+                    'duracion_ms': round(duracion_ms, 2),
+                    'alias': conexion.alias,
+                    'pid': os.getpid(),
+                    'origen': perfil_sql.origen(),
+                }
+                peor = _peores.get(huella, 0)
+                _peores[huella] = max(peor, duracion_ms)
+                if not exito:
+                    entrada['error'] = True
+                elif (
+                    getattr(settings, 'SQL_LENTAS_EXPLAIN', False) and duracion_ms > peor and not many
+                    and sql.lstrip()[:6].upper() == 'SELECT' and conexion.vendor == 'postgresql'
+                ):
+                    entrada['plan'] = _explain(conexion, sql, params)
+                _registrar(entrada)
+    envoltorio.consultas_lentas = True
+    return envoltorio
+
+
+def _conexion_creada(sender, connection, **kwargs):
+    # La señal se repite en cada reconexión del mismo DatabaseWrapper. Se
+    # inserta al principio: connection.execute_wrapper() (Captura, Contador)
+    # saca siempre el último de la lista al salir.
+    if not any(getattr(envoltorio, 'consultas_lentas', False) for envoltorio in connection.execute_wrappers):
+        connection.execute_wrappers.insert(0, _envoltorio(connection))
+
+
+def activar():
+    """Instala el registro en las conexiones nuevas (llamado desde CoreConfig.ready)"""
+    connection_created.connect(_conexion_creada, dispatch_uid='core.consultas_lentas')
+
+
+# ----- Reporte -----
+
+def leer(dias=1):
+    """Entradas registradas en los últimos ``dias`` días (incluido hoy)"""
+    desde = f"consultas_lentas_{timezone.localdate() - timedelta(days=dias - 1):%Y%m%d}.jsonl"
+    for ruta in sorted(glob.glob(os.path.join(directorio(), 'consultas_lentas_*.jsonl'))):
+        if os.path.basename(ruta) < desde:
+            continue
+        with open(ruta, encoding='utf-8') as archivo:
+            for linea in archivo:
+                try:
+                    yield json.loads(linea)
+                except ValueError:
+                    continue  # Línea cortada por una escritura interrumpida
+
+
+def reporte(dias=1, top=20, orden='total'):
+    """
+    Huellas agrupadas, ordenadas por ``orden`` ('total', 'peor', 'cantidad' o
+    'promedio'), con el SQL, origen y plan de la peor muestra.
+    """
+    grupos = {}
+    for entrada in leer(dias):
+        grupo = grupos.setdefault(entrada['huella'], {
+            'huella': entrada['huella'],
+            'cantidad': 0,
+            'total_ms': 0.0,
+            'peor_ms': 0.0,
+            'peor': None,
+            'plan': None,
+            'ultima': None,
+        })
+        grupo['cantidad'] += 1
+        grupo['total_ms'] += entrada['duracion_ms']
+        grupo['ultima'] = max(grupo['ultima'] or entrada['fecha'], entrada['fecha'])
+        if entrada['duracion_ms'] >= grupo['peor_ms']:
+            grupo['peor_ms'] = entrada['duracion_ms']
+            grupo['peor'] = entrada
+        if entrada.get('plan') and (grupo['plan'] is None or entrada['duracion_ms'] >= grupo['plan'][0]):
+            grupo['plan'] = (entrada['duracion_ms'], entrada['plan'])
+
+    claves = {
+        'total': lambda g: g['total_ms'],
+        'peor': lambda g: g['peor_ms'],
+        'cantidad': lambda g: g['cantidad'],
+        'promedio': lambda g: g['total_ms'] / g['cantidad'],
+    }
+    resultado = sorted(grupos.values(), key=claves[orden], reverse=True)[:top]
+    for grupo in resultado:
+        grupo['total_ms'] = round(grupo['total_ms'], 2)
+        grupo['promedio_ms'] = round(grupo['total_ms'] / grupo['cantidad'], 2)
+        grupo['plan'] = grupo['plan'][1] if grupo['plan'] else None
+    return resultado
+
+
+def purgar(dias):
+    """Borra los archivos de más de ``dias`` días. Retorna la cantidad borrada"""
+    limite = f"consultas_lentas_{timezone.localdate() - timedelta(days=dias):%Y%m%d}.jsonl"
+    borrados = 0
+    for ruta in glob.glob(os.path.join(directorio(), 'consultas_lentas_*.jsonl')):
+        if os.path.basename(ruta) < limite:
+            os.remove(ruta)
+            borrados += 1
+    return borrados
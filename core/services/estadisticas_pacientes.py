@@ -0,0 +1,144 @@
+"""
+Estadísticas de pacientes en una sola pasada, cacheadas por versión.
+
+Los totales salen de una consulta con agregación condicional (COUNT ...
+FILTER) sobre las columnas generadas de Paciente, la distribución por tipo
+de sangre de una consulta agrupada y, si se pide ``agrupar``, otra más por
+esa dimensión.
+
+El resultado se guarda en la caché compartida bajo una versión que las
+señales de Paciente/Usuario incrementan (core/signals.py); ESTADISTICAS_CACHE_TTL
+acota la vigencia ante cambios masivos que no emiten señales.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, CharField, Count, Q, Value, When
+from django.utils import timezone
+
+from ..models import Paciente
+from . import metricas
+
+CLAVE_VERSION = 'estadisticas:pacientes:version'
+CLAVE_RESULTADO = 'estadisticas:pacientes:{version}:{agrupar}:{fecha}'
+
+# Límite inferior (años cumplidos) y etiqueta de cada tramo de edad
+TRAMOS_EDAD = ((60, '60+'), (45, '45-59'), (30, '30-44'), (18, '18-29'), (0, '0-17'))
+SIN_DATO = 'Sin dato'
+
+
+def hace_anios(hoy, anios):
+    """Misma fecha ``anios`` años antes (29/02 pasa a 28/02)"""
+    try:
+        return hoy.replace(year=hoy.year - anios)
+    except ValueError:
+        return hoy.replace(year=hoy.year - anios, day=28)
+
+
+def _tramo_edad(hoy):
+    return Case(
+        *[
+            When(usuario__fecha_nacimiento__lte=hace_anios(hoy, minimo), then=Value(etiqueta))
+            for minimo, etiqueta in TRAMOS_EDAD
+        ],
+        default=Value(SIN_DATO),
+        output_field=CharField(),
+    )
+
+
+# Dimensión de ?agrupar= -> expresión (recibe la fecha de hoy)
+DIMENSIONES = {
+    'genero': lambda hoy: Case(
+        When(usuario__genero='M', then=Value('Masculino')),
+        When(usuario__genero='F', then=Value('Femenino')),
+        default=Value(SIN_DATO),
+        output_field=CharField(),
+    ),
+    'edad': _tramo_edad,
+}
+
+
+def calcular(agrupar=None, hoy=None):
+    hoy = hoy or timezone.localdate()
+
+    totales = Paciente.objects.aggregate(
+        total_pacientes=Count('pk'),
+        pacientes_activos=Count('pk', filter=Q(estado='Activo')),
+        pacientes_inactivos=Count('pk', filter=Q(estado='Inactivo')),
+        pacientes_con_alergias=Count('pk', filter=Q(tiene_alergias=True)),
+        pacientes_con_enfermedades_cronicas=Count('pk', filter=Q(tiene_enfermedades_cronicas=True)),
+        pacientes_con_medicamentos_actuales=Count('pk', filter=Q(tiene_medicamentos_actuales=True)),
+        pacientes_con_contacto_emergencia=Count('pk', filter=Q(tiene_contacto_emergencia=True)),
+    )
+
+    tipos_sangre = (
+        Paciente.objects.exclude(Q(tipo_sangre__isnull=True) | Q(tipo_sangre__exact=''))
+        .values('tipo_sangre').annotate(total=Count('pk')).order_by('tipo_sangre')
+    )
+
+    total = totales['total_pacientes']
+    estadisticas = {
+        **totales,
+        'distribucion_tipos_sangre': list(tipos_sangre),
+        'porcentaje_activos': round((totales['pacientes_activos'] / total * 100) if total > 0 else 0, 2),
+    }
+
+    if agrupar:
+        grupos = (
+            Paciente.objects.annotate(grupo=DIMENSIONES[agrupar](hoy))
+            .values('grupo')
+            .annotate(
+                total=Count('pk'),
+                activos=Count('pk', filter=Q(estado='Activo')),
+                con_alergias=Count('pk', filter=Q(tiene_alergias=True)),
+                con_enfermedades_cronicas=Count('pk', filter=Q(tiene_enfermedades_cronicas=True)),
+            )
+            .order_by('grupo')
+        )
+        estadisticas['agrupar'] = agrupar
+        estadisticas['grupos'] = list(grupos)
+
+    return estadisticas
+
+
+def _version():
+    try:
+        cache.add(CLAVE_VERSION, time.time_ns() // 1000, None)
+        return cache.get(CLAVE_VERSION)
+    except Exception as e:
+        print(f"Error leyendo versión de estadísticas: {str(e)}")
+        return None
+
+
+def estadisticas(agrupar=None):
+    """Estadísticas cacheadas para la versión vigente (se calculan si faltan)"""
+    hoy = timezone.localdate()
+    version = _version()
+    if version is None:
+        return calcular(agrupar, hoy)
+
+    clave = CLAVE_RESULTADO.format(version=version, agrupar=agrupar or '-', fecha=hoy.isoformat())
+    try:
+        resultado = cache.get(clave)
+    except Exception:
+        resultado = None
+    metricas.registrar_cache('estadisticas_pacientes', resultado is not None)
+
+    if resultado is None:
+        resultado = calcular(agrupar, hoy)
+        try:
+            cache.set(clave, resultado, getattr(settings, 'ESTADISTICAS_CACHE_TTL', 300))
+        except Exception as e:
+            print(f"Error guardando estadísticas en caché: {str(e)}")
+    return resultado
+
+
+def invalidar():
+    """Llamar después de modificar pacientes (o el género/fecha de nacimiento de su usuario)"""
+    try:
+        cache.incr(CLAVE_VERSION)
+    except ValueError:
+        cache.set(CLAVE_VERSION, time.time_ns() // 1000, None)
+    except Exception as e:
+        print(f"Error invalidando estadísticas de pacientes: {str(e)}")
@@ -0,0 +1,433 @@
+"""
+Exportaciones en streaming (CSV, XLSX, HTML y PDF) con memoria constante.
+
+Las filas se leen con ``values_list(...).iterator(chunk_size=...)`` (cursor
+del lado del servidor en PostgreSQL) y cada formato se escribe fila por
+fila dentro de un ``StreamingHttpResponse``: el worker nunca arma el
+archivo completo en memoria y el cliente empieza a recibir bytes de
+inmediato.
+
+Uso típico desde un ViewSet::
+
+    filas = iterar_filas(queryset, ['fecha_hora', 'usuario__email', ...])
+    return respuesta_csv(filas, ['Fecha', 'Usuario', ...], 'Reporte')
+"""
+import csv
+import re
+import zipfile
+from datetime import date, datetime
+from html import escape
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from ..routers import alias_lectura
+
+FORMATO_FECHA_HORA = '%d/%m/%Y %H:%M:%S'
+FORMATO_FECHA = '%d/%m/%Y'
+
+
+def _chunk_size():
+    return getattr(settings, 'EXPORTACION_CHUNK_SIZE', 2000)
+
+
+def iterar_filas(queryset, campos, chunk_size=None):
+    """Tuplas con los ``campos`` indicados, leídas por bloques (de la réplica si hay una)"""
+    return queryset.using(alias_lectura()).values_list(*campos).iterator(chunk_size=chunk_size or _chunk_size())
+
+
+def texto(valor):
+    """Representación legible de un valor de celda"""
+    if valor is None:
+        return ''
+    if isinstance(valor, datetime):
+        if timezone.is_aware(valor):
+            valor = timezone.localtime(valor)
+        return valor.strftime(FORMATO_FECHA_HORA)
+    if isinstance(valor, date):
+        return valor.strftime(FORMATO_FECHA)
+    if isinstance(valor, bool):
+        return 'Sí' if valor else 'No'
+    return str(valor)
+
+
+def _respuesta(contenido, content_type, nombre_archivo, extension):
+    response = StreamingHttpResponse(contenido, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{nombre_archivo}.{extension}"'
+    # Evita que un proxy (nginx) acumule la respuesta completa antes de enviarla
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+# ----- CSV -----
+
+class _Eco:
+    """Pseudo-archivo: csv.writer escribe y el valor se devuelve tal cual"""
+
+    def write(self, valor):
+        return valor
+
+
+def generar_csv(filas, encabezados, filas_por_bloque=500):
+    escritor = csv.writer(_Eco())
+    # BOM para que Excel detecte UTF-8 (tildes y ñ)
+    yield '\ufeff' + escritor.writerow(encabezados)
+
+    bloque = []
+    for fila in filas:
+        bloque.append(escritor.writerow([texto(valor) for valor in fila]))
+        if len(bloque) >= filas_por_bloque:
+            yield ''.join(bloque)
+            bloque = []
+
+    if bloque:
+        yield ''.join(bloque)
+
+
+def respuesta_csv(filas, encabezados, nombre_archivo):
+    return _respuesta(generar_csv(filas, encabezados), 'text/csv; charset=utf-8', nombre_archivo, 'csv')
+
+
+# ----- XLSX -----
+
+class _BufferZip:
+    """
+    Destino no posicionable para ZipFile: acumula lo escrito hasta que el
+    generador lo entrega. Al no tener tell()/seek() zipfile usa descriptores
+    de datos y nunca necesita volver atrás.
+    """
+
+    def __init__(self):
+        self.partes = []
+
+    def write(self, datos):
+        self.partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b''.join(self.partes)
+        self.partes = []
+        return datos
+
+
+XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+
+XLSX_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{hoja}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+
+XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/>'
+    '</Relationships>'
+)
+
+# Estilo 1 = encabezado en negrita
+XLSX_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="1"><fill><patternFill patternType="none"/></fill></fills>'
+    '<borders count="1"><border/></borders>'
+    '<cellStyleXfs count="1"><xf/></cellStyleXfs>'
+    '<cellXfs count="2"><xf fontId="0"/><xf fontId="1" applyFont="1"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+XLSX_HOJA_INICIO = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<sheetViews><sheetView workbookViewId="0">'
+    '<pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/>'
+    '</sheetView></sheetViews>'
+    '<sheetData>'
+)
+
+XLSX_HOJA_FIN = '</sheetData></worksheet>'
+
+
+# Caracteres que XML 1.0 no admite ni escapados: Excel rechaza el libro entero
+XML_INVALIDOS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]')
+
+
+def _texto_xml(valor):
+    return escape(XML_INVALIDOS.sub('', texto(valor)), quote=False)
+
+
+def _celda_xlsx(valor, estilo=''):
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return f'<c t="n"{estilo}><v>{valor}</v></c>'
+    contenido = _texto_xml(valor)
+    return f'<c t="inlineStr"{estilo}><is><t xml:space="preserve">{contenido}</t></is></c>'
+
+
+def generar_xlsx(filas, encabezados, hoja='Datos', filas_por_bloque=500):
+    """
+    Libro XLSX mínimo (una hoja, cadenas en línea) escrito como zip
+    incremental: se entrega un bloque comprimido cada ``filas_por_bloque``.
+    """
+    salida = _BufferZip()
+    with zipfile.ZipFile(salida, 'w', compression=zipfile.ZIP_DEFLATED) as libro:
+        libro.writestr('[Content_Types].xml', XLSX_CONTENT_TYPES)
+        libro.writestr('_rels/.rels', XLSX_RELS)
+        libro.writestr('xl/workbook.xml', XLSX_WORKBOOK.format(hoja=escape(XML_INVALIDOS.sub('', hoja)[:31])))
+        libro.writestr('xl/_rels/workbook.xml.rels', XLSX_WORKBOOK_RELS)
+        libro.writestr('xl/styles.xml', XLSX_STYLES)
+        yield salida.vaciar()
+
+        with libro.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as hoja_xml:
+            encabezado = ''.join(_celda_xlsx(titulo, ' s="1"') for titulo in encabezados)
+            hoja_xml.write((XLSX_HOJA_INICIO + f'<row>{encabezado}</row>').encode('utf-8'))
+
+            bloque = []
+            for fila in filas:
+                bloque.append('<row>' + ''.join(_celda_xlsx(valor) for valor in fila) + '</row>')
+                if len(bloque) >= filas_por_bloque:
+                    hoja_xml.write(''.join(bloque).encode('utf-8'))
+                    bloque = []
+                    datos = salida.vaciar()
+                    if datos:
+                        yield datos
+
+            hoja_xml.write((''.join(bloque) + XLSX_HOJA_FIN).encode('utf-8'))
+
+    yield salida.vaciar()
+
+
+def respuesta_xlsx(filas, encabezados, nombre_archivo, hoja='Datos'):
+    return _respuesta(
+        generar_xlsx(filas, encabezados, hoja),
+        'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        nombre_archivo,
+        'xlsx'
+    )
+
+
+# ----- HTML -----
+
+HTML_INICIO = """<!DOCTYPE html>
+<html lang="es">
+<head>
+<meta charset="utf-8">
+<title>{titulo}</title>
+<style>
+body {{ font-family: Arial, sans-serif; font-size: 12px; margin: 20px; }}
+h1 {{ font-size: 18px; }}
+table {{ border-collapse: collapse; width: 100%; }}
+th, td {{ border: 1px solid #ccc; padding: 4px 6px; text-align: left; vertical-align: top; }}
+th {{ background: #f0f0f0; position: sticky; top: 0; }}
+tr:nth-child(even) td {{ background: #fafafa; }}
+</style>
+</head>
+<body>
+<h1>{titulo}</h1>
+<p>Generado: {generado}</p>
+<table>
+<thead><tr>{encabezados}</tr></thead>
+<tbody>
+"""
+
+HTML_FIN = """</tbody>
+</table>
+<p>Total de registros: {total}</p>
+</body>
+</html>
+"""
+
+
+def generar_html(filas, encabezados, titulo, filas_por_bloque=500):
+    yield HTML_INICIO.format(
+        titulo=escape(titulo),
+        generado=texto(timezone.now()),
+        encabezados=''.join(f'<th>{escape(e)}</th>' for e in encabezados),
+    )
+
+    total = 0
+    bloque = []
+    for fila in filas:
+        total += 1
+        bloque.append('<tr>' + ''.join(f'<td>{escape(texto(valor))}</td>' for valor in fila) + '</tr>\n')
+        if len(bloque) >= filas_por_bloque:
+            yield ''.join(bloque)
+            bloque = []
+
+    yield ''.join(bloque) + HTML_FIN.format(total=total)
+
+
+def respuesta_html(filas, encabezados, nombre_archivo, titulo):
+    return _respuesta(generar_html(filas, encabezados, titulo), 'text/html; charset=utf-8', nombre_archivo, 'html')
+
+
+# ----- PDF -----
+
+PDF_ANCHO, PDF_ALTO = 842, 595  # A4 horizontal (puntos)
+PDF_MARGEN = 30
+PDF_FUENTE = 7
+PDF_INTERLINEA = 10
+
+
+def _texto_pdf(valor):
+    """Cadena PDF literal en WinAnsi (Helvetica estándar)"""
+    crudo = texto(valor).replace('\r', ' ').replace('\n', ' ')
+    crudo = crudo.encode('cp1252', errors='replace')
+    return crudo.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+def _truncar(valor, ancho_puntos, tamano):
+    # Ancho medio de Helvetica ~ 0.5 em
+    maximo = max(int(ancho_puntos / (tamano * 0.5)) - 1, 1)
+    cadena = texto(valor)
+    return cadena if len(cadena) <= maximo else cadena[:maximo - 1] + '…'
+
+
+def generar_pdf(filas, encabezados, titulo, anchos=None):
+    """
+    PDF escrito a mano objeto por objeto: cada página se emite en cuanto se
+    completa y solo se guardan los desplazamientos de la tabla xref.
+    ``anchos`` son proporciones relativas de cada columna.
+    """
+    anchos = anchos or [1] * len(encabezados)
+    util = PDF_ANCHO - 2 * PDF_MARGEN
+    anchos = [util * a / sum(anchos) for a in anchos]
+    posiciones = [PDF_MARGEN + sum(anchos[:i]) for i in range(len(anchos))]
+    filas_por_pagina = int((PDF_ALTO - 2 * PDF_MARGEN - 40) / PDF_INTERLINEA)
+
+    desplazamientos = {}
+    escrito = 0
+    paginas = []
+    # 1 = catálogo, 2 = árbol de páginas (se escribe al final), 3 y 4 = fuentes
+    siguiente = [5]
+
+    def objeto(numero, cuerpo):
+        nonlocal escrito
+        desplazamientos[numero] = escrito
+        datos = f'{numero} 0 obj\n'.encode('ascii') + cuerpo + b'\nendobj\n'
+        escrito += len(datos)
+        return datos
+
+    def linea(x, y, valor, tamano=PDF_FUENTE, fuente='F1'):
+        return b'BT /%s %d Tf %.1f %.1f Td (%s) Tj ET\n' % (
+            fuente.encode('ascii'), tamano, x, y, _texto_pdf(valor)
+        )
+
+    def pagina(contenido):
+        contenido_num, pagina_num = siguiente[0], siguiente[0] + 1
+        siguiente[0] += 2
+        paginas.append(pagina_num)
+        flujo = b''.join(contenido)
+        datos = objeto(contenido_num, b'<< /Length %d >>\nstream\n' % len(flujo) + flujo + b'\nendstream')
+        datos += objeto(pagina_num, (
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PDF_ANCHO} {PDF_ALTO}] '
+            f'/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents {contenido_num} 0 R >>'
+        ).encode('ascii'))
+        return datos
+
+    def cabecera_pagina(numero):
+        y = PDF_ALTO - PDF_MARGEN
+        partes = [
+            linea(PDF_MARGEN, y - 10, titulo, 12, 'F2'),
+            linea(PDF_ANCHO - PDF_MARGEN - 120, y - 10, f'Página {numero} - {texto(timezone.now())}'),
+        ]
+        y -= 30
+        for x, ancho, encabezado in zip(posiciones, anchos, encabezados):
+            partes.append(linea(x, y, _truncar(encabezado, ancho, PDF_FUENTE), PDF_FUENTE, 'F2'))
+        partes.append(b'%.1f %.1f m %.1f %.1f l S\n' % (PDF_MARGEN, y - 3, PDF_ANCHO - PDF_MARGEN, y - 3))
+        return partes, y - PDF_INTERLINEA - 2
+
+    cabecera = b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n'
+    escrito = len(cabecera)
+    yield cabecera
+    yield objeto(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+    yield objeto(3, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>')
+    yield objeto(4, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>')
+
+    contenido, y = cabecera_pagina(1)
+    en_pagina = 0
+    for fila in filas:
+        if en_pagina >= filas_por_pagina:
+            yield pagina(contenido)
+            contenido, y = cabecera_pagina(len(paginas) + 1)
+            en_pagina = 0
+        for x, ancho, valor in zip(posiciones, anchos, fila):
+            contenido.append(linea(x, y, _truncar(valor, ancho, PDF_FUENTE)))
+        y -= PDF_INTERLINEA
+        en_pagina += 1
+    yield pagina(contenido)
+
+    kids = ' '.join(f'{n} 0 R' for n in paginas)
+    yield objeto(2, f'<< /Type /Pages /Kids [{kids}] /Count {len(paginas)} >>'.encode('ascii'))
+
+    total_objetos = siguiente[0]
+    xref = [b'xref\n0 %d\n' % total_objetos, b'0000000000 65535 f \n']
+    for numero in range(1, total_objetos):
+        xref.append(b'%010d 00000 n \n' % desplazamientos[numero])
+    yield b''.join(xref) + (
+        b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (total_objetos, escrito)
+    )
+
+
+def respuesta_pdf(filas, encabezados, nombre_archivo, titulo, anchos=None):
+    return _respuesta(generar_pdf(filas, encabezados, titulo, anchos), 'application/pdf', nombre_archivo, 'pdf')
+
+
+# ----- Por formato (exportaciones en segundo plano) -----
+
+# formato -> (extensión, content type)
+FORMATOS = {
+    'pdf': ('pdf', 'application/pdf'),
+    'excel': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'html': ('html', 'text/html; charset=utf-8'),
+    'csv': ('csv', 'text/csv; charset=utf-8'),
+}
+
+
+def generar(formato, filas, encabezados, titulo='', hoja='Datos', anchos=None):
+    """Bytes del archivo en el formato indicado, por partes"""
+    if formato == 'excel':
+        partes = generar_xlsx(filas, encabezados, hoja)
+    elif formato == 'html':
+        partes = generar_html(filas, encabezados, titulo)
+    elif formato == 'csv':
+        partes = generar_csv(filas, encabezados)
+    else:
+        partes = generar_pdf(filas, encabezados, titulo, anchos)
+
+    for parte in partes:
+        yield parte.encode('utf-8') if isinstance(parte, str) else parte
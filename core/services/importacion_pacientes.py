@@ -0,0 +1,341 @@
+"""
+Importación masiva de pacientes desde CSV.
+
+Flujo por archivo:
+
+    1. Se leen y validan todas las filas en memoria (campos obligatorios,
+       formatos, longitudes, emails repetidos en el archivo) y los emails ya
+       registrados se buscan con una consulta por lote. Los emails se
+       comparan sin distinguir mayúsculas, en el archivo y contra la base.
+    2. Las contraseñas de las filas válidas se hashean en paralelo en un
+       ProcessPoolExecutor (PBKDF2 es CPU puro). Las filas sin contraseña
+       quedan con contraseña inutilizable y se informan (id y email) en
+       ``restablecer_password``: no se envían correos ni enlaces, un
+       administrador asigna la contraseña con POST
+       /usuarios/<id>/cambiar-password/.
+    3. Usuario, Paciente y HistoriaClínica se insertan con ``bulk_create``
+       por lotes de IMPORTACION_LOTE, cada lote en su transacción. Si un
+       lote falla (p. ej. un email creado entre la validación y el INSERT,
+       o un valor que PostgreSQL rechaza) se reintenta fila por fila para
+       aislar el error.
+
+Los errores se informan por número de fila del CSV sin detener el resto.
+``bulk_create`` no emite señales: al final se publican los cambios al
+índice typeahead y se invalidan las estadísticas de pacientes.
+
+El endpoint /pacientes/importar/ corre dentro del request: acepta hasta
+IMPORTACION_API_MAX_FILAS filas y IMPORTACION_API_MAX_PASSWORDS contraseñas
+(cada hash cuesta ~0,3 s) y hashea sin procesos auxiliares. Los archivos
+más grandes se importan con ``manage.py importar_pacientes``.
+"""
+import csv
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import DataError, IntegrityError, transaction
+from django.db.models.functions import Lower
+
+from ..models import HistoriaClinica, Paciente, Rol, Usuario
+from . import estadisticas_pacientes, typeahead
+
+CAMPOS_USUARIO = ['email', 'nombre', 'apellido', 'telefono', 'direccion', 'fecha_nacimiento', 'genero']
+CAMPOS_PACIENTE = [
+    'tipo_sangre', 'alergias', 'enfermedades_cronicas', 'medicamentos_actuales',
+    'contacto_emergencia_nombre', 'contacto_emergencia_telefono', 'contacto_emergencia_parentesco', 'estado',
+]
+COLUMNAS = CAMPOS_USUARIO + ['password'] + CAMPOS_PACIENTE
+OBLIGATORIAS = ('email', 'nombre', 'apellido')
+
+FORMATOS_FECHA = ('%Y-%m-%d', '%d/%m/%Y')
+GENEROS = {codigo for codigo, _nombre in Usuario.GENERO_CHOICES}
+ESTADOS = {codigo for codigo, _nombre in Paciente.ESTADO_CHOICES}
+PASSWORD_MINIMO = 6
+
+# Por debajo de esta cantidad no compensa levantar procesos
+MINIMO_HASHES_PARALELO = 32
+
+
+class ArchivoDemasiadoGrande(ValueError):
+    """El archivo supera los límites de la importación en el request"""
+
+
+def _lote():
+    return getattr(settings, 'IMPORTACION_LOTE', 1000)
+
+
+def _procesos():
+    return getattr(settings, 'IMPORTACION_PROCESOS', None) or os.cpu_count() or 1
+
+
+def _longitudes():
+    longitudes = {}
+    for modelo, campos in ((Usuario, CAMPOS_USUARIO), (Paciente, CAMPOS_PACIENTE)):
+        for campo in campos:
+            maximo = modelo._meta.get_field(campo).max_length
+            if maximo:
+                longitudes[campo] = maximo
+    return longitudes
+
+
+# ----- Lectura y validación -----
+
+def leer_csv(archivo):
+    """Filas del CSV como dicts con las columnas en minúsculas (acepta bytes o texto)"""
+    contenido = archivo.read()
+    if isinstance(contenido, bytes):
+        contenido = contenido.decode('utf-8-sig')
+    muestra = contenido[:4096]
+    try:
+        dialecto = csv.Sniffer().sniff(muestra, delimiters=',;\t')
+    except csv.Error:
+        dialecto = csv.excel
+    lector = csv.DictReader(io.StringIO(contenido), dialect=dialecto)
+    lector.fieldnames = [(nombre or '').strip().lower() for nombre in lector.fieldnames or []]
+    return lector
+
+
+def _fecha(valor):
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(valor, formato).date()
+        except ValueError:
+            continue
+    raise ValueError('fecha_nacimiento inválida (use AAAA-MM-DD o DD/MM/AAAA)')
+
+
+def _validar_fila(fila, longitudes):
+    """Retorna (datos limpios, lista de errores)"""
+    datos = {columna: (fila.get(columna) or '').strip() for columna in COLUMNAS}
+    errores = []
+
+    for columna in OBLIGATORIAS:
+        if not datos[columna]:
+            errores.append(f'{columna} es obligatorio')
+
+    if datos['email']:
+        datos['email'] = Usuario.objects.normalize_email(datos['email'])
+        try:
+            validate_email(datos['email'])
+        except ValidationError:
+            errores.append('email inválido')
+
+    for columna, maximo in longitudes.items():
+        if len(datos[columna]) > maximo:
+            errores.append(f'{columna} supera {maximo} caracteres')
+
+    if datos['fecha_nacimiento']:
+        try:
+            datos['fecha_nacimiento'] = _fecha(datos['fecha_nacimiento'])
+        except ValueError as e:
+            errores.append(str(e))
+    else:
+        datos['fecha_nacimiento'] = None
+
+    datos['genero'] = datos['genero'].upper() or None
+    if datos['genero'] and datos['genero'] not in GENEROS:
+        errores.append(f"genero debe ser uno de: {', '.join(sorted(GENEROS))}")
+
+    datos['estado'] = datos['estado'].capitalize() or 'Activo'
+    if datos['estado'] not in ESTADOS:
+        errores.append(f"estado debe ser uno de: {', '.join(sorted(ESTADOS))}")
+
+    if datos['password'] and len(datos['password']) < PASSWORD_MINIMO:
+        errores.append(f'password debe tener al menos {PASSWORD_MINIMO} caracteres')
+
+    # Los opcionales vacíos se guardan como NULL, igual que en los formularios
+    for columna in CAMPOS_USUARIO + CAMPOS_PACIENTE:
+        if datos[columna] == '':
+            datos[columna] = None
+    return datos, errores
+
+
+def _clave_email(email):
+    return email.lower()
+
+
+def validar(filas):
+    """
+    Valida todas las filas. Retorna (válidas, errores) donde ``válidas`` es
+    una lista de (número de fila, datos) y ``errores`` una lista de dicts.
+    """
+    longitudes = _longitudes()
+    validas, errores = [], []
+    vistos = {}
+
+    # La fila 1 del archivo es el encabezado
+    for numero, fila in enumerate(filas, start=2):
+        datos, errores_fila = _validar_fila(fila, longitudes)
+        email = datos['email']
+        if email and not errores_fila:
+            clave = _clave_email(email)
+            if clave in vistos:
+                errores_fila.append(f'email repetido en el archivo (fila {vistos[clave]})')
+            else:
+                vistos[clave] = numero
+        if errores_fila:
+            errores.append({'fila': numero, 'email': email, 'errores': errores_fila})
+        else:
+            validas.append((numero, datos))
+
+    # Emails ya registrados (misma regla que en el archivo): una consulta por lote
+    lote = _lote()
+    registrados = set()
+    claves = [_clave_email(datos['email']) for _numero, datos in validas]
+    for inicio in range(0, len(claves), lote):
+        registrados.update(
+            Usuario.objects.annotate(clave_email=Lower('email'))
+            .filter(clave_email__in=claves[inicio:inicio + lote])
+            .values_list('clave_email', flat=True)
+        )
+
+    if registrados:
+        nuevas = []
+        for numero, datos in validas:
+            if _clave_email(datos['email']) in registrados:
+                errores.append({'fila': numero, 'email': datos['email'], 'errores': ['email ya registrado']})
+            else:
+                nuevas.append((numero, datos))
+        validas = nuevas
+
+    errores.sort(key=lambda error: error['fila'])
+    return validas, errores
+
+
+# ----- Contraseñas -----
+
+def _inicializar_worker():
+    # Con 'spawn' (Windows/macOS) el proceso hijo no hereda Django configurado
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def _hashear(password):
+    return make_password(password)
+
+
+def hashear_passwords(passwords, paralelo=True):
+    """Hashes en el mismo orden; None -> contraseña inutilizable"""
+    pendientes = [(i, p) for i, p in enumerate(passwords) if p]
+    hashes = [make_password(None) for _ in passwords]
+    if not pendientes:
+        return hashes
+
+    procesos = _procesos()
+    if not paralelo or procesos <= 1 or len(pendientes) < MINIMO_HASHES_PARALELO:
+        for i, password in pendientes:
+            hashes[i] = make_password(password)
+        return hashes
+
+    with ProcessPoolExecutor(max_workers=procesos, initializer=_inicializar_worker) as executor:
+        resultados = executor.map(
+            _hashear, [p for _i, p in pendientes], chunksize=max(1, len(pendientes) // (procesos * 4))
+        )
+        for (i, _password), hash_ in zip(pendientes, resultados):
+            hashes[i] = hash_
+    return hashes
+
+
+# ----- Inserción -----
+
+def _insertar(filas, rol, crear_historia):
+    """Inserta un lote de (número, datos, hash). Retorna [(número, id creado)]"""
+    usuarios = Usuario.objects.bulk_create([
+        Usuario(
+            password=hash_, id_rol=rol,
+            **{campo: datos[campo] for campo in CAMPOS_USUARIO}
+        )
+        for _numero, datos, hash_ in filas
+    ])
+    Paciente.objects.bulk_create([
+        Paciente(usuario_id=usuario.pk, **{campo: datos[campo] for campo in CAMPOS_PACIENTE})
+        for usuario, (_numero, datos, _hash) in zip(usuarios, filas)
+    ])
+    if crear_historia:
+        HistoriaClinica.objects.bulk_create([HistoriaClinica(paciente_id=usuario.pk) for usuario in usuarios])
+    return [(numero, usuario.pk) for usuario, (numero, _datos, _hash) in zip(usuarios, filas)]
+
+
+def _insertar_lote(filas, rol, crear_historia, errores):
+    try:
+        with transaction.atomic():
+            return _insertar(filas, rol, crear_historia)
+    except (IntegrityError, DataError):
+        pass
+
+    # Aislar la fila conflictiva
+    ids = []
+    for fila in filas:
+        try:
+            with transaction.atomic():
+                ids.extend(_insertar([fila], rol, crear_historia))
+        except (IntegrityError, DataError) as e:
+            numero, datos, _hash = fila
+            errores.append({'fila': numero, 'email': datos['email'], 'errores': [f'error al guardar: {str(e).splitlines()[0]}']})
+    return ids
+
+
+def _verificar_limites(filas, max_filas, max_passwords):
+    if max_filas is not None and len(filas) > max_filas:
+        raise ArchivoDemasiadoGrande(f"El archivo tiene {len(filas)} filas (máximo {max_filas})")
+    if max_passwords is not None:
+        con_password = sum(1 for fila in filas if (fila.get('password') or '').strip())
+        if con_password > max_passwords:
+            raise ArchivoDemasiadoGrande(f"El archivo tiene {con_password} contraseñas (máximo {max_passwords})")
+
+
+def importar(archivo, crear_historia=True, max_filas=None, max_passwords=None, paralelo=True):
+    """
+    Importa pacientes desde ``archivo`` (CSV). Retorna el resumen:
+    totales, ids creados, errores por fila y los pacientes creados sin
+    password ({'id', 'email'}), a los que un administrador debe asignarla.
+
+    ``max_filas``/``max_passwords`` rechazan el archivo con
+    ArchivoDemasiadoGrande antes de validar; ``paralelo=False`` hashea en
+    el proceso actual.
+    """
+    lector = leer_csv(archivo)
+    faltantes = [columna for columna in OBLIGATORIAS if columna not in lector.fieldnames]
+    if faltantes:
+        raise ValueError(f"Faltan columnas obligatorias: {', '.join(faltantes)}")
+
+    filas = list(lector)
+    _verificar_limites(filas, max_filas, max_passwords)
+
+    validas, errores = validar(filas)
+    total_filas = len(validas) + len(errores)
+
+    hashes = hashear_passwords([datos['password'] for _numero, datos in validas], paralelo)
+
+    rol = Rol.objects.get(nombre_rol='Paciente')
+    filas = [(numero, datos, hash_) for (numero, datos), hash_ in zip(validas, hashes)]
+    creados_por_fila = {}
+    lote = _lote()
+    for inicio in range(0, len(filas), lote):
+        creados_por_fila.update(_insertar_lote(filas[inicio:inicio + lote], rol, crear_historia, errores))
+    creados = list(creados_por_fila.values())
+
+    if creados:
+        transaction.on_commit(lambda: typeahead.registrar_cambio('pacientes', creados))
+        transaction.on_commit(estadisticas_pacientes.invalidar)
+
+    errores.sort(key=lambda error: error['fila'])
+    return {
+        'total_filas': total_filas,
+        'creados': len(creados),
+        'con_errores': len(errores),
+        'ids_creados': creados,
+        'errores': errores,
+        'restablecer_password': [
+            {'id': creados_por_fila[numero], 'email': datos['email']}
+            for numero, datos in validas
+            if not datos['password'] and numero in creados_por_fila
+        ],
+    }
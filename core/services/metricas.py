@@ -0,0 +1,121 @@
+"""
+Métricas en formato Prometheus (expuestas en /metrics con METRICAS_ACTIVAS).
+
+    http_request_duracion_segundos      histograma por método, ruta y estado
+    http_request_consultas_sql          histograma de consultas SQL por request
+    http_request_sql_segundos           histograma del tiempo en la base de datos por request
+    cache_lecturas_total                lecturas de la caché compartida por cache y resultado (acierto/fallo)
+    celery_tarea_duracion_segundos      histograma por tarea y estado (SUCCESS, FAILURE, ...)
+    celery_tarea_fallos_total           fallos por tarea
+    notificacion_envio_segundos         histograma de envíos (fcm, correo) por resultado
+
+La ruta es el nombre de la vista (p. ej. 'paciente-list'), no la URL, para
+no crear una serie por id.
+
+Multiproceso (gunicorn con varios workers, Celery prefork): definir
+PROMETHEUS_MULTIPROC_DIR con un directorio vacío al arrancar, el mismo para
+todos los procesos. Cada proceso escribe sus valores ahí y /metrics los
+agrega. Solo se usan contadores e histogramas, que no necesitan
+``mark_process_dead`` al terminar un worker.
+"""
+import os
+import time
+from functools import wraps
+
+from celery.signals import task_failure, task_postrun, task_prerun
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess,
+)
+
+BUCKETS_CONSULTAS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+BUCKETS_TAREAS = (0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 1800, 3600)
+
+duracion_request = Histogram(
+    'http_request_duracion_segundos', 'Latencia de los requests HTTP',
+    ['metodo', 'ruta', 'estado'],
+)
+consultas_request = Histogram(
+    'http_request_consultas_sql', 'Consultas SQL por request',
+    ['ruta'], buckets=BUCKETS_CONSULTAS,
+)
+sql_request = Histogram(
+    'http_request_sql_segundos', 'Tiempo en la base de datos por request',
+    ['ruta'],
+)
+lecturas_cache = Counter(
+    'cache_lecturas_total', 'Lecturas de la caché compartida',
+    ['cache', 'resultado'],
+)
+duracion_tarea = Histogram(
+    'celery_tarea_duracion_segundos', 'Duración de las tareas de Celery',
+    ['tarea', 'estado'], buckets=BUCKETS_TAREAS,
+)
+fallos_tarea = Counter(
+    'celery_tarea_fallos_total', 'Tareas de Celery que terminaron con excepción',
+    ['tarea'],
+)
+envio_notificacion = Histogram(
+    'notificacion_envio_segundos', 'Duración de los envíos de notificaciones',
+    ['canal', 'resultado'],
+)
+
+
+def registrar_request(metodo, ruta, estado, segundos, consultas, segundos_sql):
+    duracion_request.labels(metodo, ruta, str(estado)).observe(segundos)
+    consultas_request.labels(ruta).observe(consultas)
+    sql_request.labels(ruta).observe(segundos_sql)
+
+
+def registrar_cache(cache, acierto):
+    lecturas_cache.labels(cache, 'acierto' if acierto else 'fallo').inc()
+
+
+def medir_envio(canal):
+    """Decorador para los envíos de ServicioNotificaciones (retornan True/False)"""
+    def decorador(funcion):
+        @wraps(funcion)
+        def envoltorio(*args, **kwargs):
+            inicio = time.perf_counter()
+            resultado = 'error'
+            try:
+                respuesta = funcion(*args, **kwargs)
+                resultado = 'ok' if respuesta else 'error'
+                return respuesta
+            finally:
+                envio_notificacion.labels(canal, resultado).observe(time.perf_counter() - inicio)
+        return envoltorio
+    return decorador
+
+
+# ----- Celery -----
+
+_inicios_tareas = {}
+
+
+@task_prerun.connect
+def _tarea_iniciada(task_id=None, **kwargs):
+    _inicios_tareas[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def _tarea_terminada(task_id=None, task=None, state=None, **kwargs):
+    inicio = _inicios_tareas.pop(task_id, None)
+    if inicio is not None and task is not None:
+        duracion_tarea.labels(task.name, state or 'desconocido').observe(time.perf_counter() - inicio)
+
+
+@task_failure.connect
+def _tarea_fallida(sender=None, **kwargs):
+    fallos_tarea.labels(getattr(sender, 'name', 'desconocida')).inc()
+
+
+# ----- Exposición -----
+
+def exponer():
+    """(contenido, content type) con todas las métricas, agregadas entre procesos si corresponde"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registro = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registro)
+    else:
+        registro = REGISTRY
+    return generate_latest(registro), CONTENT_TYPE_LATEST
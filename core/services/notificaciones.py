@@ -7,6 +7,7 @@ from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from django.utils import timezone
 from ..models import Notificacion, Dispositivo
+from . import metricas
 
 # Inicializar Firebase Admin SDK
 def inicializar_firebase():
@@ -35,6 +36,7 @@ class ServicioNotificaciones:
     """
     
     @staticmethod
+    @metricas.medir_envio('fcm')
     def enviar_notificacion_fcm(tokens, titulo, mensaje, datos_adicionales=None):
         """
         Enviar notificación push mediante Firebase Cloud Messaging
@@ -92,6 +94,7 @@ class ServicioNotificaciones:
             return False
     
     @staticmethod
+    @metricas.medir_envio('fcm')
     def enviar_notificacion_individual_fcm(token, titulo, mensaje, datos_adicionales=None):
         """
         Enviar notificación a un solo dispositivo
@@ -133,6 +136,7 @@ class ServicioNotificaciones:
             return False
     
     @staticmethod
+    @metricas.medir_envio('correo')
     def enviar_correo(destinatario, asunto, mensaje_html, mensaje_texto=None):
         """
         Enviar correo electrónico mediante Gmail
@@ -0,0 +1,186 @@
+"""
+Mantenimiento de las particiones mensuales de la tabla de bitácora.
+
+La tabla ``core_bitacora`` está particionada por rango de ``fecha_hora``
+(una partición por mes, ver migración 0006). Este módulo crea las
+particiones futuras por adelantado y separa (o elimina) las que superan
+la retención configurada, de modo que purgar un mes sea una operación de
+metadatos en lugar de un ``DELETE`` masivo.
+"""
+import re
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from ..models import Bitacora
+
+TABLA_BITACORA = 'core_bitacora'
+PARTICION_DEFAULT = 'core_bitacora_default'
+PATRON_PARTICION = re.compile(r'^core_bitacora_p(\d{4})(\d{2})$')
+
+
+def _soporta_particiones():
+    return connection.vendor == 'postgresql'
+
+
+def inicio_mes(fecha):
+    """Primer instante (UTC) del mes de la fecha indicada"""
+    return datetime(fecha.year, fecha.month, 1, tzinfo=dt_timezone.utc)
+
+
+def sumar_meses(fecha, meses):
+    """Primer instante (UTC) del mes desplazado ``meses`` posiciones"""
+    indice = fecha.year * 12 + (fecha.month - 1) + meses
+    return datetime(indice // 12, indice % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+def nombre_particion(mes):
+    return f"{TABLA_BITACORA}_p{mes.year:04d}{mes.month:02d}"
+
+
+def _columnas_insertables():
+    """Columnas físicas de la bitácora (sin columnas generadas)"""
+    return [
+        connection.ops.quote_name(f.column)
+        for f in Bitacora._meta.concrete_fields
+        if not getattr(f, 'generated', False)
+    ]
+
+
+def listar_particiones():
+    """
+    Retorna las particiones mensuales adjuntas a la bitácora,
+    ordenadas por mes: [(nombre, inicio_mes), ...]
+    """
+    if not _soporta_particiones():
+        return []
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT hija.relname
+            FROM pg_inherits
+            JOIN pg_class padre ON padre.oid = pg_inherits.inhparent
+            JOIN pg_class hija ON hija.oid = pg_inherits.inhrelid
+            WHERE padre.relname = %s
+            """,
+            [TABLA_BITACORA]
+        )
+        nombres = [fila[0] for fila in cursor.fetchall()]
+
+    particiones = []
+    for nombre in nombres:
+        coincidencia = PATRON_PARTICION.match(nombre)
+        if coincidencia:
+            mes = datetime(int(coincidencia.group(1)), int(coincidencia.group(2)), 1, tzinfo=dt_timezone.utc)
+            particiones.append((nombre, mes))
+    return sorted(particiones, key=lambda p: p[1])
+
+
+def crear_particion(mes):
+    """
+    Crea la partición del mes indicado si no existe.
+    Si la partición DEFAULT contiene filas de ese rango, se trasladan a la
+    nueva partición dentro de la misma transacción.
+    Retorna True si la partición fue creada.
+    """
+    if not _soporta_particiones():
+        return False
+
+    desde = inicio_mes(mes)
+    hasta = sumar_meses(desde, 1)
+    nombre = nombre_particion(desde)
+    qn = connection.ops.quote_name
+
+    if nombre in {p[0] for p in listar_particiones()}:
+        return False
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT EXISTS (SELECT 1 FROM {qn(PARTICION_DEFAULT)} WHERE fecha_hora >= %s AND fecha_hora < %s)",
+            [desde, hasta]
+        )
+        filas_en_default = cursor.fetchone()[0]
+
+        if filas_en_default:
+            cursor.execute(f"ALTER TABLE {qn(TABLA_BITACORA)} DETACH PARTITION {qn(PARTICION_DEFAULT)}")
+
+        cursor.execute(
+            f"CREATE TABLE {qn(nombre)} PARTITION OF {qn(TABLA_BITACORA)} FOR VALUES FROM (%s) TO (%s)",
+            [desde, hasta]
+        )
+
+        if filas_en_default:
+            columnas = ', '.join(_columnas_insertables())
+            cursor.execute(
+                f"""
+                WITH movidas AS (
+                    DELETE FROM {qn(PARTICION_DEFAULT)}
+                    WHERE fecha_hora >= %s AND fecha_hora < %s
+                    RETURNING {columnas}
+                )
+                INSERT INTO {qn(TABLA_BITACORA)} ({columnas}) SELECT {columnas} FROM movidas
+                """,
+                [desde, hasta]
+            )
+            cursor.execute(f"ALTER TABLE {qn(TABLA_BITACORA)} ATTACH PARTITION {qn(PARTICION_DEFAULT)} DEFAULT")
+
+    return True
+
+
+def asegurar_particiones_futuras(meses_adelante=None, referencia=None):
+    """Crea las particiones del mes actual y de los ``meses_adelante`` siguientes"""
+    if meses_adelante is None:
+        meses_adelante = getattr(settings, 'BITACORA_PARTICIONES_FUTURAS', 3)
+    actual = inicio_mes(referencia or datetime.now(dt_timezone.utc))
+
+    creadas = []
+    for desplazamiento in range(meses_adelante + 1):
+        mes = sumar_meses(actual, desplazamiento)
+        if crear_particion(mes):
+            creadas.append(nombre_particion(mes))
+    return creadas
+
+
+def particiones_vencidas(retencion_meses=None, referencia=None):
+    """Particiones cuyo mes completo quedó fuera de la ventana de retención"""
+    if retencion_meses is None:
+        retencion_meses = getattr(settings, 'BITACORA_RETENCION_MESES', None)
+    if not retencion_meses:
+        return []
+
+    limite = sumar_meses(inicio_mes(referencia or datetime.now(dt_timezone.utc)), -retencion_meses)
+    return [(nombre, mes) for nombre, mes in listar_particiones() if sumar_meses(mes, 1) <= limite]
+
+
+def separar_particion(nombre, eliminar=False):
+    """
+    Separa la partición de la bitácora (queda como tabla independiente)
+    y opcionalmente la elimina. Ambas operaciones son de metadatos.
+    """
+    qn = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {qn(TABLA_BITACORA)} DETACH PARTITION {qn(nombre)}")
+        if eliminar:
+            cursor.execute(f"DROP TABLE {qn(nombre)}")
+
+
+def purgar_particiones_vencidas(retencion_meses=None, accion=None, referencia=None):
+    """
+    Aplica la retención configurada.
+    accion: 'detach' (por defecto) deja la tabla separada para archivarla
+    o eliminarla manualmente; 'drop' la elimina directamente.
+    """
+    if not _soporta_particiones():
+        return []
+    if accion is None:
+        accion = getattr(settings, 'BITACORA_RETENCION_ACCION', 'detach')
+    if accion not in ('detach', 'drop'):
+        raise ValueError(f"Acción de retención inválida: {accion}")
+
+    procesadas = []
+    for nombre, _mes in particiones_vencidas(retencion_meses, referencia):
+        separar_particion(nombre, eliminar=(accion == 'drop'))
+        procesadas.append(nombre)
+    return procesadas
@@ -0,0 +1,184 @@
+"""
+Captura y análisis de las consultas SQL de un bloque de código.
+
+``Captura`` instala un ``execute_wrapper`` en todas las conexiones y registra
+por consulta: SQL, huella normalizada, duración y el punto del código que
+la originó (ver ``origen``).
+
+La huella reemplaza literales (cadenas, números, parámetros) por ``?`` y
+colapsa las listas de ``IN (...)``, así la misma consulta con otros valores
+cuenta como repetida. Una huella que se repite ``umbral`` veces o más en un
+request es un patrón N+1.
+"""
+import os
+import re
+import sys
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+_CADENAS = re.compile(r"'(?:[^']|'')*'")
+_NUMEROS = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PARAMETROS = re.compile(r'%s|%\(\w+\)s|\$\d+')
+_LISTAS = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_ESPACIOS = re.compile(r'\s+')
+
+
+def huella(sql):
+    sql = _CADENAS.sub('?', sql)
+    sql = _PARAMETROS.sub('?', sql)
+    sql = _NUMEROS.sub('?', sql)
+    sql = _LISTAS.sub('(...)', sql)
+    return _ESPACIOS.sub(' ', sql).strip()
+
+
+# Frames que nunca son el origen: el ORM y los envoltorios de la captura
+_IGNORADOS = (
+    os.path.join('django', 'db') + os.sep,
+    os.path.abspath(__file__),
+    os.path.join('core', 'middleware.py'),
+    os.path.join('core', 'services', 'consultas_lentas.py'),
+)
+
+
+def _ignorado(archivo):
+    return any(ignorado in archivo for ignorado in _IGNORADOS)
+
+
+def _es_del_proyecto(archivo):
+    return (
+        archivo.startswith(str(settings.BASE_DIR))
+        and 'site-packages' not in archivo
+        and f'{os.sep}venv{os.sep}' not in archivo
+    )
+
+
+def _nombre(archivo):
+    if _es_del_proyecto(archivo):
+        return os.path.relpath(archivo, settings.BASE_DIR)
+    partes = archivo.split(f'site-packages{os.sep}', 1)
+    return partes[-1]
+
+
+def origen(profundidad=3):
+    """
+    Dónde se originó la consulta, del frame más cercano hacia afuera
+    ('core/views.py:2201 en funcion'): el primer frame fuera del ORM (aunque
+    sea de una librería, p. ej. un serializer de DRF) y después solo frames
+    del proyecto.
+    """
+    frames = []
+    frame = sys._getframe(1)
+    while frame is not None and len(frames) < profundidad:
+        archivo = os.path.abspath(frame.f_code.co_filename)
+        if not _ignorado(archivo) and (not frames or _es_del_proyecto(archivo)):
+            frames.append(f'{_nombre(archivo)}:{frame.f_lineno} en {frame.f_code.co_name}')
+        frame = frame.f_back
+    return frames
+
+
+class Captura:
+    """
+    Uso::
+
+        with Captura() as captura:
+            ...
+        captura.consultas  # [{'sql', 'huella', 'duracion_ms', 'origen', 'alias'}]
+    """
+
+    def __init__(self, profundidad=3):
+        self.profundidad = profundidad
+        self.consultas = []
+        self._pila = None
+
+    def _envoltorio(self, alias):
+        def envoltorio(execute, sql, params, many, context):
+            inicio = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                self.consultas.append({
+                    'sql': sql,
+                    'huella': huella(sql),
+                    'duracion_ms': (time.perf_counter() - inicio) * 1000,
+                    'origen': origen(self.profundidad),
+                    'alias': alias,
+                })
+        return envoltorio
+
+    def __enter__(self):
+        self._pila = ExitStack()
+        for conexion in connections.all():
+            self._pila.enter_context(conexion.execute_wrapper(self._envoltorio(conexion.alias)))
+        return self
+
+    def __exit__(self, *exc):
+        self._pila.close()
+        return False
+
+    @property
+    def tiempo_ms(self):
+        return sum(consulta['duracion_ms'] for consulta in self.consultas)
+
+
+class Contador:
+    """Como ``Captura`` pero solo cuenta consultas y tiempo (sin guardar SQL ni pila), para usar siempre"""
+
+    def __init__(self):
+        self.consultas = 0
+        self.segundos = 0.0
+        self._pila = None
+
+    def _envoltorio(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.consultas += 1
+            self.segundos += time.perf_counter() - inicio
+
+    def __enter__(self):
+        self._pila = ExitStack()
+        for conexion in connections.all():
+            self._pila.enter_context(conexion.execute_wrapper(self._envoltorio))
+        return self
+
+    def __exit__(self, *exc):
+        self._pila.close()
+        return False
+
+
+def repetidas(consultas, umbral):
+    """
+    Huellas ejecutadas ``umbral`` veces o más, de la más repetida a la menos.
+    Cada una con la cantidad, el tiempo total, un SQL de ejemplo y los
+    puntos de origen distintos (el más frecuente primero).
+    """
+    grupos = {}
+    for consulta in consultas:
+        grupo = grupos.setdefault(consulta['huella'], {
+            'huella': consulta['huella'],
+            'repeticiones': 0,
+            'tiempo_ms': 0.0,
+            'sql': consulta['sql'],
+            'origenes': {},
+        })
+        grupo['repeticiones'] += 1
+        grupo['tiempo_ms'] += consulta['duracion_ms']
+        clave = ' <- '.join(consulta['origen']) or 'desconocido'
+        grupo['origenes'][clave] = grupo['origenes'].get(clave, 0) + 1
+
+    resultado = []
+    for grupo in grupos.values():
+        if grupo['repeticiones'] < umbral:
+            continue
+        grupo['tiempo_ms'] = round(grupo['tiempo_ms'], 2)
+        grupo['origenes'] = [
+            {'origen': clave, 'repeticiones': cantidad}
+            for clave, cantidad in sorted(grupo['origenes'].items(), key=lambda item: -item[1])
+        ]
+        resultado.append(grupo)
+    resultado.sort(key=lambda grupo: (-grupo['repeticiones'], -grupo['tiempo_ms']))
+    return resultado
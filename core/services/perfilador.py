@@ -0,0 +1,139 @@
+"""
+Perfilado bajo demanda de requests (``?__profile=1``, solo administradores).
+
+Dos modos:
+
+    cprofile  (por defecto)  volcado de cProfile (.prof), para abrir con
+                             pstats, snakeviz o ``python -m pstats``
+    muestreo                 muestreador de pila en un hilo aparte cada
+                             PERFILADOR_INTERVALO_MS; genera un archivo de
+                             pilas colapsadas (.txt, "f1;f2;f3 N") para
+                             flamegraph.pl o speedscope. Overhead bajo y
+                             constante, apto para producción.
+
+Los archivos quedan en PERFILADOR_DIR (se conservan los últimos
+PERFILADOR_MAXIMO) y se descargan desde /api/perfiles/.
+"""
+import cProfile
+import os
+import re
+import sys
+import threading
+import uuid
+from collections import Counter
+from datetime import datetime
+
+from django.conf import settings
+from django.utils import timezone
+
+EXTENSIONES = {'cprofile': 'prof', 'muestreo': 'txt'}
+_NOMBRE_VALIDO = re.compile(r'^[\w.-]+\.(prof|txt)$')
+
+
+def directorio():
+    ruta = getattr(settings, 'PERFILADOR_DIR', os.path.join(settings.BACKUP_DIR, 'perfiles'))
+    os.makedirs(ruta, exist_ok=True)
+    return ruta
+
+
+def modo_solicitado(valor):
+    """Modo pedido en ?__profile= (1/true/si -> cprofile), o None si no se pidió perfilado"""
+    valor = (valor or '').lower()
+    if valor in ('1', 'true', 'si', 'sí', 'cprofile'):
+        return 'cprofile'
+    if valor in ('muestreo', 'sampling', 'flamegraph'):
+        return 'muestreo'
+    return None
+
+
+class Muestreador:
+    """Toma la pila del hilo actual cada ``intervalo`` segundos desde otro hilo"""
+
+    def __init__(self, intervalo):
+        self.intervalo = intervalo
+        self.pilas = Counter()
+        self._hilo_objetivo = threading.get_ident()
+        self._detener = threading.Event()
+        self._hilo = threading.Thread(target=self._muestrear, name='perfilador-muestreo', daemon=True)
+
+    def _muestrear(self):
+        while not self._detener.wait(self.intervalo):
+            frame = sys._current_frames().get(self._hilo_objetivo)
+            pila = []
+            while frame is not None:
+                codigo = frame.f_code
+                # Carpeta y archivo: 'db/utils.py' se distingue de 'core/utils.py'
+                archivo = os.path.join(*codigo.co_filename.split(os.sep)[-2:])
+                pila.append(f'{archivo}:{codigo.co_name}')
+                frame = frame.f_back
+            if pila:
+                self.pilas[';'.join(reversed(pila))] += 1
+
+    def __enter__(self):
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._detener.set()
+        self._hilo.join()
+        return False
+
+    def colapsadas(self):
+        return ''.join(f'{pila} {cantidad}\n' for pila, cantidad in self.pilas.most_common())
+
+
+def perfilar(modo, funcion, etiqueta=''):
+    """Ejecuta ``funcion()`` perfilada. Retorna (resultado, ruta del archivo)"""
+    etiqueta = re.sub(r'[^\w-]+', '-', etiqueta).strip('-')[:60]
+    partes = [f"{timezone.now():%Y%m%d-%H%M%S}", etiqueta, uuid.uuid4().hex[:8]]
+    ruta = os.path.join(directorio(), f"{'_'.join(p for p in partes if p)}.{EXTENSIONES[modo]}")
+    if modo == 'cprofile':
+        perfil = cProfile.Profile()
+        try:
+            resultado = perfil.runcall(funcion)
+        finally:
+            perfil.dump_stats(ruta)
+    else:
+        intervalo = getattr(settings, 'PERFILADOR_INTERVALO_MS', 5) / 1000
+        with Muestreador(intervalo) as muestreador:
+            resultado = funcion()
+        with open(ruta, 'w', encoding='utf-8') as archivo:
+            archivo.write(muestreador.colapsadas())
+    depurar()
+    return resultado, ruta
+
+
+def depurar():
+    """Deja solo los PERFILADOR_MAXIMO perfiles más recientes"""
+    maximo = getattr(settings, 'PERFILADOR_MAXIMO', 50)
+    for entrada in listar()[maximo:]:
+        try:
+            os.remove(os.path.join(directorio(), entrada['nombre']))
+        except OSError:
+            pass
+
+
+def listar():
+    """Perfiles guardados, del más reciente al más antiguo"""
+    ruta = directorio()
+    entradas = []
+    for nombre in os.listdir(ruta):
+        if not _NOMBRE_VALIDO.match(nombre):
+            continue
+        estado = os.stat(os.path.join(ruta, nombre))
+        entradas.append({
+            'nombre': nombre,
+            'modo': 'cprofile' if nombre.endswith('.prof') else 'muestreo',
+            'tamano': estado.st_size,
+            'creado': datetime.fromtimestamp(estado.st_mtime, tz=timezone.get_current_timezone()),
+        })
+    entradas.sort(key=lambda entrada: entrada['nombre'], reverse=True)
+    return entradas
+
+
+def ruta_archivo(nombre):
+    """Ruta de un perfil guardado, o None si el nombre no es válido o no existe"""
+    if not _NOMBRE_VALIDO.match(nombre):
+        return None
+    ruta = os.path.join(directorio(), nombre)
+    return ruta if os.path.exists(ruta) else None
@@ -0,0 +1,234 @@
+"""
+Matriz de permisos RBAC compilada por rol.
+
+Para cada rol se compila una única vez el mapeo inmutable
+``codigo_componente -> frozenset(acciones)`` a partir de Rol.permisos y
+PermisoComponente (solo componentes activos; 'todos' se expande a todas
+las acciones). La matriz se guarda:
+
+    - en memoria del proceso (diccionario por rol), y
+    - en la caché compartida (Redis) bajo la versión del rol.
+
+La versión de un rol combina un contador global (cambios en componentes o
+en PermisoComponente) y uno propio del rol (cambios en Rol.permisos). Al
+incrementarla, las matrices anteriores dejan de usarse en todos los
+procesos. Verificar un permiso queda en una búsqueda en diccionario.
+
+Con la misma versión se cachea el árbol de menú del rol (módulo ->
+componentes visibles) junto con su ETag.
+"""
+import hashlib
+import json
+import time
+from types import MappingProxyType
+
+from django.conf import settings
+from django.core.cache import cache
+
+from ..models import ComponenteUI, PermisoComponente
+from . import metricas
+
+CLAVE_VERSION_GLOBAL = 'rbac:version'
+CLAVE_VERSION_ROL = 'rbac:rol:{rol_id}:version'
+CLAVE_MATRIZ = 'rbac:matriz:{rol_id}:{version}'
+CLAVE_MENU = 'rbac:menu:{rol_id}:{version}'
+
+ACCIONES = tuple(codigo for codigo, _nombre in PermisoComponente.ACCIONES_PERMITIDAS if codigo != 'todos')
+MATRIZ_VACIA = MappingProxyType({})
+
+# rol_id -> (version, matriz)
+_matrices_locales = {}
+# rol_id -> (version, {'etag': ..., 'arbol': [...]})
+_menus_locales = {}
+# rol_id -> (version, instante de lectura)
+_versiones_leidas = {}
+
+
+def _ttl_matriz():
+    return getattr(settings, 'RBAC_MATRIZ_TTL', 3600)
+
+
+def _revalidar_segundos():
+    return getattr(settings, 'RBAC_VERSION_REVALIDAR_SEGUNDOS', 5)
+
+
+def version_inicial():
+    # Basada en el reloj para no repetir una versión anterior si Redis pierde la clave
+    return time.time_ns() // 1000
+
+
+def _leer_version(rol_id):
+    claves = [CLAVE_VERSION_GLOBAL, CLAVE_VERSION_ROL.format(rol_id=rol_id)]
+    try:
+        valores = cache.get_many(claves)
+        for clave in claves:
+            if clave not in valores:
+                cache.add(clave, version_inicial(), None)
+                valores[clave] = cache.get(clave)
+    except Exception as e:
+        print(f"Error leyendo versión RBAC de la caché: {str(e)}")
+        return None
+    return f"{valores[claves[0]]}.{valores[claves[1]]}"
+
+
+def incrementar_version(clave):
+    try:
+        cache.incr(clave)
+    except ValueError:
+        cache.set(clave, version_inicial(), None)
+    except Exception as e:
+        print(f"Error incrementando versión {clave}: {str(e)}")
+
+
+def version_rol(rol_id):
+    """
+    Versión vigente del rol. Se consulta en la caché compartida como máximo
+    cada RBAC_VERSION_REVALIDAR_SEGUNDOS por proceso.
+    """
+    ahora = time.monotonic()
+    leida = _versiones_leidas.get(rol_id)
+    if leida and ahora - leida[1] < _revalidar_segundos():
+        return leida[0]
+
+    version = _leer_version(rol_id)
+    if version is not None:
+        _versiones_leidas[rol_id] = (version, ahora)
+    return version
+
+
+def compilar_matriz(rol_id):
+    """Construye la matriz del rol desde la base de datos"""
+    matriz = {}
+    filas = PermisoComponente.objects.filter(
+        permiso__roles=rol_id,
+        componente__activo=True
+    ).values_list('componente__codigo_componente', 'accion_permitida').distinct()
+
+    for codigo, accion in filas:
+        acciones = matriz.setdefault(codigo, set())
+        if accion == 'todos':
+            acciones.update(ACCIONES)
+        else:
+            acciones.add(accion)
+
+    return MappingProxyType({codigo: frozenset(acciones) for codigo, acciones in matriz.items()})
+
+
+def matriz_permisos(rol_id):
+    """Matriz inmutable codigo_componente -> frozenset(acciones) del rol"""
+    if not rol_id:
+        return MATRIZ_VACIA
+
+    version = version_rol(rol_id)
+    if version is None:
+        # Caché compartida no disponible: se compila sin guardar
+        return compilar_matriz(rol_id)
+
+    local = _matrices_locales.get(rol_id)
+    if local and local[0] == version:
+        return local[1]
+
+    clave = CLAVE_MATRIZ.format(rol_id=rol_id, version=version)
+    try:
+        guardada = cache.get(clave)
+    except Exception:
+        guardada = None
+    metricas.registrar_cache('rbac_matriz', guardada is not None)
+
+    if guardada is not None:
+        matriz = MappingProxyType({codigo: frozenset(acciones) for codigo, acciones in guardada.items()})
+    else:
+        matriz = compilar_matriz(rol_id)
+        try:
+            cache.set(clave, {codigo: list(acciones) for codigo, acciones in matriz.items()}, _ttl_matriz())
+        except Exception as e:
+            print(f"Error guardando matriz RBAC en caché: {str(e)}")
+
+    _matrices_locales[rol_id] = (version, matriz)
+    return matriz
+
+
+def tiene_permiso(rol_id, codigo_componente, accion='ver'):
+    acciones = matriz_permisos(rol_id).get(codigo_componente)
+    return bool(acciones) and (accion in acciones or (accion == 'todos' and acciones >= set(ACCIONES)))
+
+
+def construir_menu(rol_id):
+    """
+    Árbol de navegación del rol: módulos con sus componentes visibles
+    (acción 'ver') ordenados por ``orden``. Retorna {'etag', 'arbol'}.
+    """
+    matriz = matriz_permisos(rol_id)
+    componentes = (
+        ComponenteUI.objects.filter(activo=True, codigo_componente__in=list(matriz))
+        .select_related('tipo_componente')
+        .order_by('orden', 'nombre_componente')
+    )
+
+    modulos = {}
+    for componente in componentes:
+        acciones = matriz[componente.codigo_componente]
+        if 'ver' not in acciones:
+            continue
+        modulos.setdefault(componente.modulo, []).append({
+            'id': componente.id,
+            'codigo_componente': componente.codigo_componente,
+            'nombre_componente': componente.nombre_componente,
+            'tipo_componente': componente.tipo_componente.nombre,
+            'ruta': componente.ruta,
+            'icono': componente.icono,
+            'orden': componente.orden,
+            'acciones': sorted(acciones),
+        })
+
+    # Los módulos conservan el orden de su primer componente
+    arbol = [{'modulo': modulo, 'componentes': items} for modulo, items in modulos.items()]
+    contenido = json.dumps(arbol, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return {'etag': hashlib.sha1(contenido).hexdigest(), 'arbol': arbol}
+
+
+def menu_rol(rol_id):
+    """Menú del rol cacheado por versión (en proceso y en la caché compartida)"""
+    if not rol_id:
+        return construir_menu(None)
+
+    version = version_rol(rol_id)
+    if version is None:
+        return construir_menu(rol_id)
+
+    local = _menus_locales.get(rol_id)
+    if local and local[0] == version:
+        return local[1]
+
+    clave = CLAVE_MENU.format(rol_id=rol_id, version=version)
+    try:
+        menu = cache.get(clave)
+    except Exception:
+        menu = None
+    metricas.registrar_cache('rbac_menu', menu is not None)
+
+    if menu is None:
+        menu = construir_menu(rol_id)
+        try:
+            cache.set(clave, menu, _ttl_matriz())
+        except Exception as e:
+            print(f"Error guardando menú RBAC en caché: {str(e)}")
+
+    _menus_locales[rol_id] = (version, menu)
+    return menu
+
+
+def invalidar_rol(rol_id):
+    """Llamar después de modificar Rol.permisos"""
+    incrementar_version(CLAVE_VERSION_ROL.format(rol_id=rol_id))
+    _versiones_leidas.pop(rol_id, None)
+    _matrices_locales.pop(rol_id, None)
+    _menus_locales.pop(rol_id, None)
+
+
+def invalidar_todos():
+    """Llamar después de modificar ComponenteUI o PermisoComponente"""
+    incrementar_version(CLAVE_VERSION_GLOBAL)
+    _versiones_leidas.clear()
+    _matrices_locales.clear()
+    _menus_locales.clear()
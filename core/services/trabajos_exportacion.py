@@ -0,0 +1,262 @@
+"""
+Exportaciones en segundo plano.
+
+``crear_trabajo`` guarda en el ExportJob el tipo de exportación, la acción
+y los parámetros de la solicitud (solo datos, nada ejecutable). La tarea
+Celery ``generar_exportacion`` vuelve a armar el queryset con el ViewSet
+del tipo (TIPOS), como el usuario del trabajo y con los mismos filtros,
+búsqueda y orden (``ExportacionMixin.queryset_exportacion``); recorre las
+filas con ``values_list().iterator()`` y escribe el archivo con los
+generadores de services/exportaciones.py en EXPORTACION_TRABAJOS_DIR,
+actualizando el progreso por bloques.
+
+Dos solicitudes idénticas (mismo usuario, tipo, formato y parámetros de
+filtrado) comparten el trabajo mientras está en curso. Un trabajo
+completado no se reutiliza: una nueva solicitud genera un archivo con los
+datos actuales. Un trabajo que sigue pendiente o procesando después de
+EXPORTACION_TRABAJOS_ESTANCADO_MINUTOS (worker caído, tarea perdida) se marca
+como fallido y deja de reutilizarse. Los trabajos vencidos
+(EXPORTACION_TRABAJOS_TTL_HORAS) se eliminan junto con su archivo en la tarea
+``limpiar_exportaciones_vencidas``, que también marca los estancados.
+"""
+import hashlib
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.http import HttpRequest, QueryDict
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from django.utils.text import get_valid_filename
+from rest_framework.request import Request
+
+from ..models import ExportJob
+from . import exportaciones
+
+
+def directorio_trabajos():
+    directorio = getattr(settings, 'EXPORTACION_TRABAJOS_DIR', None) or os.path.join(settings.BACKUP_DIR, 'exportaciones')
+    os.makedirs(directorio, exist_ok=True)
+    return directorio
+
+
+def _ttl():
+    return timedelta(hours=getattr(settings, 'EXPORTACION_TRABAJOS_TTL_HORAS', 24))
+
+
+def _bloque_progreso():
+    return getattr(settings, 'EXPORTACION_CHUNK_SIZE', 2000)
+
+
+def _limite_estancado(ahora=None):
+    minutos = getattr(settings, 'EXPORTACION_TRABAJOS_ESTANCADO_MINUTOS', 60)
+    return (ahora or timezone.now()) - timedelta(minutes=minutos)
+
+
+# Parámetros de la URL que no cambian las filas exportadas
+PARAMETROS_IGNORADOS = ('asincrono',)
+
+# tipo -> ViewSet (con ExportacionMixin) que arma el queryset del trabajo
+TIPOS = {
+    'pacientes': 'core.views.PacienteViewSet',
+    'bitacora': 'core.views.BitacoraViewSet',
+    'horarios': 'core.views.HorarioMedicoViewSet',
+    'examenes': 'core.views.SolicitudExamenViewSet',
+}
+
+
+def _filtros(parametros):
+    """Parámetros de la solicitud como {clave: [valores]} ordenado"""
+    return {
+        clave: sorted(valores) for clave, valores in sorted(parametros.lists())
+        if clave not in PARAMETROS_IGNORADOS
+    }
+
+
+def huella(usuario, tipo, formato, parametros):
+    """
+    sha256 de usuario + tipo + formato + parámetros de filtrado de la
+    solicitud (``request.query_params``), sin importar su orden
+    """
+    contenido = repr((usuario.pk, tipo, formato, sorted(_filtros(parametros).items())))
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+
+def marcar_estancados(huella_trabajo=None, ahora=None):
+    """
+    Marca como fallidos los trabajos pendientes o procesando desde antes de
+    EXPORTACION_TRABAJOS_ESTANCADO_MINUTOS. Retorna la cantidad marcada
+    """
+    ahora = ahora or timezone.now()
+    limite = _limite_estancado(ahora)
+    estancados = ExportJob.objects.filter(
+        Q(estado='pendiente', fecha_creacion__lt=limite) | Q(estado='procesando', fecha_inicio__lt=limite)
+    )
+    if huella_trabajo is not None:
+        estancados = estancados.filter(huella=huella_trabajo)
+    return estancados.update(
+        estado='fallido', error='La exportación no terminó a tiempo', fecha_fin=ahora
+    )
+
+
+def _reutilizable(huella_trabajo):
+    """Trabajo en curso (no estancado) con la misma huella"""
+    marcar_estancados(huella_trabajo)
+    return ExportJob.objects.filter(huella=huella_trabajo, estado__in=ExportJob.ESTADOS_ACTIVOS).first()
+
+
+def crear_trabajo(usuario, tipo, formato, parametros_solicitud, accion, campos, encabezados,
+                  nombre_archivo, titulo='', hoja='Datos', anchos=None, intentos=3):
+    """
+    Registra la exportación y la encola después del commit.
+    Retorna (trabajo, creado); ``creado`` es False si se reutilizó uno en curso.
+    """
+    if tipo not in TIPOS:
+        raise ValueError(f"Tipo de exportación desconocido: {tipo}")
+    huella_trabajo = huella(usuario, tipo, formato, parametros_solicitud)
+    for intento in range(intentos):
+        existente = _reutilizable(huella_trabajo)
+        if existente is not None:
+            return existente, False
+
+        try:
+            with transaction.atomic():
+                trabajo = ExportJob.objects.create(
+                    usuario=usuario,
+                    tipo=tipo,
+                    formato=formato,
+                    huella=huella_trabajo,
+                    parametros={
+                        'accion': accion,
+                        'filtros': _filtros(parametros_solicitud),
+                        'campos': list(campos),
+                        'encabezados': list(encabezados),
+                        'titulo': titulo,
+                        'hoja': hoja,
+                        'anchos': list(anchos) if anchos else None,
+                    },
+                    nombre_archivo=nombre_archivo,
+                    expira_en=timezone.now() + _ttl(),
+                )
+            break
+        except IntegrityError:
+            # Otra solicitud idéntica creó el trabajo al mismo tiempo; si ya
+            # terminó o falló antes de leerlo, se vuelve a intentar
+            if intento == intentos - 1:
+                raise
+
+    from ..tasks import generar_exportacion
+    transaction.on_commit(lambda: _encolar(generar_exportacion, trabajo.pk))
+    return trabajo, True
+
+
+def _encolar(tarea, trabajo_id):
+    try:
+        tarea.delay(trabajo_id)
+    except Exception as e:
+        print(f"Error encolando exportación {trabajo_id}: {str(e)}")
+        ExportJob.objects.filter(pk=trabajo_id).update(
+            estado='fallido', error='No se pudo encolar la exportación', fecha_fin=timezone.now()
+        )
+
+
+def _contar(filas, trabajo_id):
+    """Pasa las filas y guarda el avance cada EXPORTACION_CHUNK_SIZE filas"""
+    bloque = _bloque_progreso()
+    pendientes = 0
+    for fila in filas:
+        yield fila
+        pendientes += 1
+        if pendientes >= bloque:
+            ExportJob.objects.filter(pk=trabajo_id).update(filas_procesadas=F('filas_procesadas') + pendientes)
+            pendientes = 0
+    if pendientes:
+        ExportJob.objects.filter(pk=trabajo_id).update(filas_procesadas=F('filas_procesadas') + pendientes)
+
+
+def construir_queryset(trabajo):
+    """
+    Queryset del trabajo armado por el ViewSet de su tipo, con el usuario y
+    los parámetros guardados, igual que en la solicitud original
+    """
+    parametros = trabajo.parametros
+    filtros = QueryDict(mutable=True)
+    for clave, valores in parametros.get('filtros', {}).items():
+        filtros.setlist(clave, valores)
+
+    http = HttpRequest()
+    http.method = 'GET'
+    http.GET = filtros
+    request = Request(http)
+    request.user = trabajo.usuario
+
+    vista = import_string(TIPOS[trabajo.tipo])(
+        request=request, args=(), kwargs={}, format_kwarg=None, action=parametros.get('accion')
+    )
+    return vista.queryset_exportacion()
+
+
+def ejecutar_trabajo(trabajo_id):
+    """Genera el archivo del trabajo. Retorna el trabajo actualizado"""
+    actualizados = ExportJob.objects.filter(pk=trabajo_id, estado='pendiente').update(
+        estado='procesando', fecha_inicio=timezone.now(), filas_procesadas=0
+    )
+    trabajo = ExportJob.objects.get(pk=trabajo_id)
+    if not actualizados:
+        # Ya lo tomó otro worker (reintento o entrega duplicada)
+        return trabajo
+
+    parametros = trabajo.parametros
+    extension, _content_type = exportaciones.FORMATOS[trabajo.formato]
+    ruta = os.path.join(
+        directorio_trabajos(), f"{trabajo.pk}_{get_valid_filename(trabajo.nombre_archivo)}.{extension}"
+    )
+
+    try:
+        queryset = construir_queryset(trabajo)
+
+        ExportJob.objects.filter(pk=trabajo.pk).update(filas_totales=queryset.count())
+
+        filas = _contar(exportaciones.iterar_filas(queryset, parametros['campos']), trabajo.pk)
+        partes = exportaciones.generar(
+            trabajo.formato, filas, parametros['encabezados'],
+            titulo=parametros.get('titulo', ''), hoja=parametros.get('hoja', 'Datos'), anchos=parametros.get('anchos')
+        )
+        with open(ruta + '.parcial', 'wb') as archivo:
+            for parte in partes:
+                archivo.write(parte)
+        os.replace(ruta + '.parcial', ruta)
+
+        ExportJob.objects.filter(pk=trabajo.pk).update(
+            estado='completado',
+            ruta_archivo=ruta,
+            tamano_bytes=os.path.getsize(ruta),
+            fecha_fin=timezone.now(),
+            # El TTL corre desde que el archivo está disponible
+            expira_en=timezone.now() + _ttl(),
+        )
+    except Exception as e:
+        print(f"Error generando exportación {trabajo.pk}: {str(e)}")
+        if os.path.exists(ruta + '.parcial'):
+            os.remove(ruta + '.parcial')
+        ExportJob.objects.filter(pk=trabajo.pk).update(estado='fallido', error=str(e), fecha_fin=timezone.now())
+
+    trabajo.refresh_from_db()
+    return trabajo
+
+
+def limpiar_vencidos(ahora=None):
+    """Elimina los trabajos vencidos y sus archivos. Retorna la cantidad eliminada"""
+    ahora = ahora or timezone.now()
+    marcar_estancados(ahora=ahora)
+    vencidos = ExportJob.objects.filter(expira_en__lte=ahora).exclude(
+        estado__in=ExportJob.ESTADOS_ACTIVOS
+    )
+    eliminados = 0
+    for trabajo_id, ruta in vencidos.values_list('id', 'ruta_archivo'):
+        if ruta and os.path.exists(ruta):
+            os.remove(ruta)
+        eliminados += ExportJob.objects.filter(pk=trabajo_id).delete()[0]
+    return eliminados
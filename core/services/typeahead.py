@@ -0,0 +1,366 @@
+"""
+Índice de prefijos en memoria para los selects de pacientes y médicos.
+
+Cada proceso guarda, por tipo ('pacientes', 'medicos'):
+
+    - ``claves``: palabras normalizadas (sin acentos, en minúsculas) de
+      nombre, apellido y email, ordenadas; se buscan con ``bisect``.
+    - ``ids``: array paralelo con el id del usuario de cada clave.
+    - ``entradas``: id -> (datos compactos para responder, palabras, orden).
+
+Solo se indexan los registros que el select mostraría (usuario activo y
+estado 'Activo'). Las señales de Usuario/Paciente/Medico registran los ids
+modificados en la caché compartida bajo un contador de versión; cada
+proceso aplica esos cambios incrementalmente al revalidar (como máximo cada
+TYPEAHEAD_REVALIDAR_SEGUNDOS) y reconstruye todo solo si le faltan cambios.
+
+Las reconstrucciones completas cargan el índice nuevo fuera del lock (en un
+hilo aparte si TYPEAHEAD_RECONSTRUIR_EN_SEGUNDO_PLANO) y lo reemplazan de
+una vez; mientras tanto se sigue respondiendo con el anterior. ``calentar``
+lo construye al iniciar el proceso (gestion_documental_backend/wsgi.py).
+
+``buscar`` retorna None si el índice no se puede usar (caché compartida no
+disponible o índice todavía sin construir); la vista debe entonces consultar
+la base de datos con ``filtrar_por_prefijos`` (core/filters.py), que aplica
+la misma coincidencia por prefijo de palabra y el mismo límite.
+"""
+import heapq
+import re
+import sys
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from ..models import Medico, MedicoEspecialidad, Paciente
+
+TIPOS = ('pacientes', 'medicos')
+TODOS = '*'
+
+CLAVE_VERSION = 'typeahead:{tipo}:version'
+CLAVE_CAMBIO = 'typeahead:{tipo}:cambio:{version}'
+
+# Con más cambios pendientes que estos conviene reconstruir
+MAXIMO_CAMBIOS_INCREMENTALES = 500
+
+SEPARADORES = re.compile(r'[\s@._\-+]+')
+
+
+def normalizar(texto):
+    """Minúsculas y sin acentos: 'José Núñez' -> 'jose nunez'"""
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).casefold()
+
+
+def palabras_busqueda(termino):
+    """Palabras normalizadas del término; cada una debe ser prefijo de alguna palabra indexada"""
+    return [p for p in SEPARADORES.split(normalizar(termino)) if p]
+
+
+def _palabras(*textos):
+    palabras = set()
+    for texto in textos:
+        normalizado = normalizar(texto)
+        palabras.update(p for p in SEPARADORES.split(normalizado) if p)
+        if '@' in normalizado:
+            # El email completo también se busca como prefijo
+            palabras.add(normalizado)
+    return tuple(sys.intern(p) for p in palabras)
+
+
+# ----- Carga desde la base de datos -----
+
+def _cargar_pacientes(ids=None):
+    queryset = Paciente.objects.filter(usuario__activo=True, estado='Activo')
+    if ids is not None:
+        queryset = queryset.filter(usuario_id__in=ids)
+    filas = queryset.values_list(
+        'usuario_id', 'usuario__email', 'usuario__nombre', 'usuario__apellido', 'tipo_sangre'
+    ).iterator(chunk_size=getattr(settings, 'EXPORTACION_CHUNK_SIZE', 2000))
+    for id_, email, nombre, apellido, tipo_sangre in filas:
+        yield id_, (email, nombre, apellido, tipo_sangre), _palabras(nombre, apellido, email)
+
+
+def _cargar_medicos(ids=None):
+    queryset = Medico.objects.filter(usuario__activo=True, estado='Activo')
+    if ids is not None:
+        queryset = queryset.filter(usuario_id__in=ids)
+    filas = list(queryset.values_list(
+        'usuario_id', 'usuario__email', 'usuario__nombre', 'usuario__apellido', 'numero_licencia'
+    ))
+
+    especialidades = {}
+    for medico_id, *especialidad in MedicoEspecialidad.objects.filter(
+        medico_id__in=[fila[0] for fila in filas]
+    ).order_by('especialidad_id').values_list(
+        'medico_id', 'especialidad_id', 'especialidad__codigo', 'especialidad__nombre', 'especialidad__descripcion'
+    ):
+        especialidades.setdefault(medico_id, []).append(tuple(especialidad))
+
+    for id_, email, nombre, apellido, licencia in filas:
+        datos = (email, nombre, apellido, licencia, tuple(especialidades.get(id_, ())))
+        yield id_, datos, _palabras(nombre, apellido, email, licencia)
+
+
+CARGADORES = {'pacientes': _cargar_pacientes, 'medicos': _cargar_medicos}
+
+
+def _orden(id_, datos):
+    return (datos[1], datos[2], id_)
+
+
+# ----- Índice -----
+
+class IndicePrefijos:
+
+    def __init__(self, tipo):
+        self.tipo = tipo
+        self.claves = []
+        self.ids = array('q')
+        self.entradas = {}
+        self.version = None
+        self.revisado = 0.0
+        self.lock = threading.RLock()
+        # Una sola reconstrucción completa a la vez por proceso
+        self.reconstruyendo = threading.Lock()
+
+    def _agregar(self, id_, datos, palabras):
+        self.entradas[id_] = (datos, palabras, _orden(id_, datos))
+        for palabra in palabras:
+            # Al final del rango de la misma clave
+            posicion = bisect_left(self.claves, palabra + '\x00')
+            self.claves.insert(posicion, palabra)
+            self.ids.insert(posicion, id_)
+
+    def _quitar(self, id_):
+        entrada = self.entradas.pop(id_, None)
+        if entrada is None:
+            return
+        for palabra in entrada[1]:
+            inicio = bisect_left(self.claves, palabra)
+            fin = bisect_left(self.claves, palabra + '\x00', inicio)
+            posicion = self.ids.index(id_, inicio, fin)
+            del self.claves[posicion]
+            del self.ids[posicion]
+
+    def reconstruir(self, version):
+        """Carga el índice completo sin tomar el lock y lo reemplaza de una vez"""
+        pares, entradas = [], {}
+        for id_, datos, palabras in CARGADORES[self.tipo]():
+            entradas[id_] = (datos, palabras, _orden(id_, datos))
+            pares.extend((palabra, id_) for palabra in palabras)
+        pares.sort()
+        claves = [par[0] for par in pares]
+        ids = array('q', (par[1] for par in pares))
+        with self.lock:
+            self.claves, self.ids, self.entradas, self.version = claves, ids, entradas, version
+
+    def refrescar(self, ids, desde_version, version):
+        """
+        Vuelve a leer ``ids`` (se actualizan, agregan o quitan según la base de
+        datos) y los aplica solo si el índice sigue en ``desde_version``
+        """
+        nuevos = list(CARGADORES[self.tipo](ids))
+        with self.lock:
+            if self.version != desde_version:
+                return False
+            for id_ in ids:
+                self._quitar(id_)
+            for id_, datos, palabras in nuevos:
+                self._agregar(id_, datos, palabras)
+            self.version = version
+            return True
+
+    def candidatos(self, prefijo):
+        """Ids (sin repetir) con alguna palabra que empieza con ``prefijo``"""
+        inicio = bisect_left(self.claves, prefijo)
+        fin = bisect_left(self.claves, prefijo + '\U0010ffff', inicio)
+        return set(self.ids[inicio:fin])
+
+    def buscar(self, termino, limite, filtro=None):
+        palabras = palabras_busqueda(termino)
+        if not palabras:
+            return []
+        # La palabra más larga es la más selectiva
+        palabras.sort(key=len, reverse=True)
+        with self.lock:
+            ids = None
+            for palabra in palabras:
+                ids = self.candidatos(palabra) if ids is None else ids & self.candidatos(palabra)
+                if not ids:
+                    return []
+            entradas = self.entradas
+            if filtro is not None:
+                ids = [id_ for id_ in ids if filtro(entradas[id_][0])]
+            # Mismo orden que la consulta original: nombre, apellido
+            mejores = heapq.nsmallest(limite, ids, key=lambda id_: entradas[id_][2])
+            return [(id_, entradas[id_][0]) for id_ in mejores]
+
+
+_indices = {tipo: IndicePrefijos(tipo) for tipo in TIPOS}
+
+
+def _revalidar_segundos():
+    return getattr(settings, 'TYPEAHEAD_REVALIDAR_SEGUNDOS', 2)
+
+
+def _version_global(tipo):
+    clave = CLAVE_VERSION.format(tipo=tipo)
+    cache.add(clave, 0, None)
+    return cache.get(clave)
+
+
+def _reconstruir(tipo, version):
+    indice = _indices[tipo]
+    if not indice.reconstruyendo.acquire(blocking=False):
+        return
+    try:
+        indice.reconstruir(version)
+    except Exception as e:
+        print(f"Error reconstruyendo índice typeahead de {tipo}: {str(e)}")
+    finally:
+        indice.reconstruyendo.release()
+
+
+def _reconstruir_en_hilo(tipo, version):
+    try:
+        _reconstruir(tipo, version)
+    finally:
+        # Conexiones propias del hilo
+        connections.close_all()
+
+
+def programar_reconstruccion(tipo, version):
+    """Reconstruye el índice sin bloquear las búsquedas (que siguen usando el anterior)"""
+    if not getattr(settings, 'TYPEAHEAD_RECONSTRUIR_EN_SEGUNDO_PLANO', True):
+        _reconstruir(tipo, version)
+        return
+    if _indices[tipo].reconstruyendo.locked():
+        return
+    threading.Thread(
+        target=_reconstruir_en_hilo, args=(tipo, version), name=f'typeahead-{tipo}', daemon=True
+    ).start()
+
+
+def sincronizar(tipo):
+    """
+    Deja el índice del proceso al día con la versión compartida. Retorna
+    False si no se puede usar: caché compartida no disponible o índice
+    todavía sin construir.
+    """
+    indice = _indices[tipo]
+    ahora = time.monotonic()
+    if indice.version is not None and ahora - indice.revisado < _revalidar_segundos():
+        return True
+
+    try:
+        version = _version_global(tipo)
+        actual = indice.version
+        pendientes = []
+        if actual is not None and 0 <= version - actual <= MAXIMO_CAMBIOS_INCREMENTALES:
+            claves = [CLAVE_CAMBIO.format(tipo=tipo, version=v) for v in range(actual + 1, version + 1)]
+            cambios = cache.get_many(claves)
+            pendientes = [cambios.get(clave) for clave in claves]
+    except Exception as e:
+        print(f"Error sincronizando índice typeahead de {tipo}: {str(e)}")
+        return False
+
+    indice.revisado = ahora
+    if actual == version:
+        return True
+    if (actual is None or version - actual != len(pendientes)
+            or any(ids is None or ids == TODOS for ids in pendientes)):
+        programar_reconstruccion(tipo, version)
+    else:
+        indice.refrescar({id_ for ids in pendientes for id_ in ids}, actual, version)
+    return indice.version is not None
+
+
+def calentar(tipos=TIPOS):
+    """Construye los índices al iniciar el proceso, antes del primer request"""
+    for tipo in tipos:
+        try:
+            version = _version_global(tipo)
+        except Exception as e:
+            print(f"Error precargando índice typeahead de {tipo}: {str(e)}")
+            continue
+        programar_reconstruccion(tipo, version)
+
+
+def registrar_cambio(tipo, ids=TODOS):
+    """
+    Publica que cambiaron ``ids`` (o todo el tipo) y los aplica en el
+    proceso actual. Llamar después del commit (ver core/signals.py).
+    """
+    clave_version = CLAVE_VERSION.format(tipo=tipo)
+    try:
+        cache.add(clave_version, 0, None)
+        version = cache.incr(clave_version)
+        cache.set(
+            CLAVE_CAMBIO.format(tipo=tipo, version=version),
+            ids if ids == TODOS else sorted(ids),
+            getattr(settings, 'TYPEAHEAD_CAMBIOS_TTL', 3600)
+        )
+    except Exception as e:
+        print(f"Error registrando cambio typeahead de {tipo}: {str(e)}")
+        return
+
+    indice = _indices[tipo]
+    if indice.version == version - 1:
+        if ids == TODOS:
+            programar_reconstruccion(tipo, version)
+        else:
+            indice.refrescar(ids, version - 1, version)
+
+
+def limite_resultados(limite=None):
+    """Top-K de los selects, el mismo para el índice y para la base de datos"""
+    maximo = getattr(settings, 'TYPEAHEAD_MAX_RESULTADOS', 50)
+    return maximo if limite is None else max(1, min(limite, maximo))
+
+
+def buscar_pacientes(termino, limite=None):
+    """Mismo formato que PacienteSelectSerializer; None si hay que ir a la base de datos"""
+    if not sincronizar('pacientes'):
+        return None
+    resultados = []
+    for id_, (email, nombre, apellido, tipo_sangre) in _indices['pacientes'].buscar(termino, limite_resultados(limite)):
+        completo = f"{nombre} {apellido}"
+        resultados.append({
+            'usuario': {'id': id_, 'email': email, 'nombre': nombre, 'apellido': apellido, 'nombre_completo': completo},
+            'nombre_completo': completo,
+            'email': email,
+            'estado': 'Activo',
+            'tipo_sangre': tipo_sangre,
+        })
+    return resultados
+
+
+def buscar_medicos(termino, limite=None, especialidad_id=None):
+    """Mismo formato que MedicoSelectSerializer; None si hay que ir a la base de datos"""
+    if not sincronizar('medicos'):
+        return None
+    filtro = None
+    if especialidad_id is not None:
+        filtro = lambda datos: any(especialidad[0] == especialidad_id for especialidad in datos[4])
+
+    resultados = []
+    for id_, (email, nombre, apellido, licencia, especialidades) in _indices['medicos'].buscar(
+        termino, limite_resultados(limite), filtro
+    ):
+        completo = f"{nombre} {apellido}"
+        resultados.append({
+            'usuario': {'id': id_, 'email': email, 'nombre': nombre, 'apellido': apellido, 'nombre_completo': completo},
+            'nombre_completo': completo,
+            'numero_licencia': licencia,
+            'estado': 'Activo',
+            'especialidades': [
+                {'id': e[0], 'codigo': e[1], 'nombre': e[2], 'descripcion': e[3]} for e in especialidades
+            ],
+        })
+    return resultados
@@ -0,0 +1,83 @@
+"""
+Señales que mantienen al día los datos derivados en memoria/caché:
+
+    - índice typeahead de los selects (services/typeahead.py)
+    - estadísticas de pacientes (services/estadisticas_pacientes.py)
+
+Los cambios se publican después del commit. Las operaciones masivas
+(``QuerySet.update``, ``bulk_create``) no emiten señales: quien las use
+sobre estos modelos debe llamar a ``typeahead.registrar_cambio`` /
+``estadisticas_pacientes.invalidar``.
+"""
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Especialidad, Medico, MedicoEspecialidad, Paciente, Usuario
+from .services import estadisticas_pacientes, typeahead
+
+# Campos de Usuario que se muestran o filtran en los selects
+CAMPOS_USUARIO_TYPEAHEAD = {'email', 'nombre', 'apellido', 'activo'}
+# Campos de Usuario que usan las estadísticas agrupadas
+CAMPOS_USUARIO_ESTADISTICAS = {'genero', 'fecha_nacimiento'}
+
+
+def _publicar(tipos, ids=typeahead.TODOS):
+    def publicar():
+        for tipo in tipos:
+            typeahead.registrar_cambio(tipo, ids)
+    transaction.on_commit(publicar)
+
+
+@receiver([post_save, post_delete], sender=Usuario)
+def usuario_typeahead(sender, instance, update_fields=None, **kwargs):
+    # El login guarda solo last_login
+    if update_fields is not None and not CAMPOS_USUARIO_TYPEAHEAD.intersection(update_fields):
+        return
+    _publicar(typeahead.TIPOS, [instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Paciente)
+def paciente_typeahead(sender, instance, **kwargs):
+    _publicar(['pacientes'], [instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Medico)
+def medico_typeahead(sender, instance, **kwargs):
+    _publicar(['medicos'], [instance.pk])
+
+
+@receiver([post_save, post_delete], sender=MedicoEspecialidad)
+def medico_especialidad_typeahead(sender, instance, **kwargs):
+    _publicar(['medicos'], [instance.medico_id])
+
+
+@receiver(m2m_changed, sender=Medico.especialidades.through)
+def especialidades_medico_typeahead(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        _publicar(['medicos'], [instance.pk])
+    elif pk_set:
+        _publicar(['medicos'], list(pk_set))
+    else:
+        _publicar(['medicos'])
+
+
+@receiver([post_save, post_delete], sender=Especialidad)
+def especialidad_typeahead(sender, instance, **kwargs):
+    _publicar(['medicos'])
+
+
+@receiver([post_save, post_delete], sender=Paciente)
+def paciente_estadisticas(sender, instance, **kwargs):
+    transaction.on_commit(estadisticas_pacientes.invalidar)
+
+
+@receiver(post_save, sender=Usuario)
+def usuario_estadisticas(sender, instance, update_fields=None, **kwargs):
+    # Al eliminar el usuario se elimina en cascada su Paciente (y su señal)
+    if update_fields is not None and not CAMPOS_USUARIO_ESTADISTICAS.intersection(update_fields):
+        return
+    if Paciente.objects.filter(pk=instance.pk).exists():
+        transaction.on_commit(estadisticas_pacientes.invalidar)
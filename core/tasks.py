@@ -200,4 +200,70 @@ def realizar_limpieza_backups():
         
     except Exception as e:
         print(f"Error en limpieza de backups: {str(e)}")
-        return f"Error en limpieza: {str(e)}"
\ No newline at end of file
+        return f"Error en limpieza: {str(e)}"
+
+@shared_task
+def mantener_particiones_bitacora():
+    """
+    Crear las particiones mensuales futuras de la bitácora y aplicar la
+    retención configurada (BITACORA_RETENCION_MESES / BITACORA_RETENCION_ACCION)
+    """
+    from .services.particiones_bitacora import asegurar_particiones_futuras, purgar_particiones_vencidas
+
+    try:
+        creadas = asegurar_particiones_futuras()
+        purgadas = purgar_particiones_vencidas()
+        return f'Particiones creadas: {len(creadas)} - Particiones purgadas: {len(purgadas)}'
+
+    except Exception as e:
+        print(f"Error en mantenimiento de particiones de bitácora: {str(e)}")
+        raise e
+
+@shared_task
+def archivar_bitacora_antigua():
+    """
+    Mover a archivo en frío (backups/) los meses de bitácora que superan
+    BITACORA_ARCHIVO_MESES
+    """
+    from .services.archivo_bitacora import archivar_bitacora
+
+    try:
+        archivados = archivar_bitacora()
+        filas = sum(total for _mes, total in archivados)
+        return f'Meses archivados: {len(archivados)} - Filas archivadas: {filas}'
+
+    except Exception as e:
+        print(f"Error archivando bitácora: {str(e)}")
+        raise e
+
+@shared_task
+def generar_exportacion(trabajo_id):
+    """
+    Generar el archivo de un ExportJob (services/trabajos_exportacion.py)
+    """
+    from .services.trabajos_exportacion import ejecutar_trabajo
+
+    try:
+        trabajo = ejecutar_trabajo(trabajo_id)
+        return f'Exportación {trabajo.pk}: {trabajo.estado} - Filas: {trabajo.filas_procesadas}'
+
+    except Exception as e:
+        print(f"Error generando exportación {trabajo_id}: {str(e)}")
+        raise e
+
+@shared_task
+def limpiar_exportaciones_vencidas():
+    """
+    Eliminar los trabajos de exportación vencidos y sus archivos
+    (EXPORTACION_TRABAJOS_TTL_HORAS) y marcar como fallidos los estancados
+    (EXPORTACION_TRABAJOS_ESTANCADO_MINUTOS)
+    """
+    from .services.trabajos_exportacion import limpiar_vencidos
+
+    try:
+        eliminados = limpiar_vencidos()
+        return f'Exportaciones vencidas eliminadas: {eliminados}'
+
+    except Exception as e:
+        print(f"Error limpiando exportaciones vencidas: {str(e)}")
+        raise e
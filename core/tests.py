@@ -1,3 +1,1005 @@
-from django.test import TestCase
+import csv
+import importlib
+import io
+import shutil
+import tempfile
+import zipfile
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+from xml.etree import ElementTree
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import Q
+from django.http import QueryDict
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import routers
+from .pagination import AgendaCitaPagination, KeysetCursorPagination
+from .authentication import (
+    CachedUserJWTAuthentication, ClaimsJWTAuthentication, ClaimsTokenRefreshSerializer,
+    invalidar_usuario, tokens_para_usuario,
+)
+from .models import (
+    Administrador, Bitacora, ComponenteUI, ExportJob, Paciente, Permiso, PermisoComponente, Rol,
+    TipoComponente, Usuario,
+)
+from .services import (
+    archivo_bitacora, estadisticas_pacientes, exportaciones, importacion_pacientes, particiones_bitacora,
+)
+from .services import permisos as permisos_rbac
+from .services import trabajos_exportacion, typeahead
+from .views import metricas_prometheus
+
+
+def crear_usuario(email='usuario@test.com', rol=None, nombre='Ana', apellido='Pérez', **extra):
+    rol = rol or Rol.objects.get_or_create(nombre_rol='Administrador')[0]
+    return Usuario.objects.create_user(email=email, password='clave-segura', nombre=nombre, apellido=apellido,
+                                       id_rol=rol, **extra)
+
+
+class TrabajosExportacionTests(TestCase):
+    def setUp(self):
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio)
+        parche = override_settings(EXPORTACION_TRABAJOS_DIR=directorio)
+        parche.enable()
+        self.addCleanup(parche.disable)
+
+        self.usuario = crear_usuario()
+
+    def _crear(self, parametros='search=ana'):
+        return trabajos_exportacion.crear_trabajo(
+            self.usuario, 'pacientes', 'csv', QueryDict(parametros), 'exportar_pacientes',
+            ['usuario__email', 'estado'], ['Email', 'Estado'], 'Reporte_Pacientes'
+        )
+
+    def test_solicitudes_identicas_comparten_trabajo(self):
+        trabajo, creado = self._crear('search=ana&ordering=email')
+        repetido, creado_repetido = self._crear('ordering=email&search=ana&asincrono=true')
+
+        self.assertTrue(creado)
+        self.assertFalse(creado_repetido)
+        self.assertEqual(trabajo.pk, repetido.pk)
+
+    def test_filtros_distintos_crean_otro_trabajo(self):
+        trabajo, _ = self._crear('search=ana')
+        otro, creado = self._crear('search=luis')
+
+        self.assertTrue(creado)
+        self.assertNotEqual(trabajo.pk, otro.pk)
+
+    def test_trabajo_estancado_no_se_reutiliza(self):
+        trabajo, _ = self._crear()
+        hace_dos_horas = timezone.now() - timedelta(hours=2)
+        ExportJob.objects.filter(pk=trabajo.pk).update(estado='procesando', fecha_inicio=hace_dos_horas)
+
+        nuevo, creado = self._crear()
+
+        self.assertTrue(creado)
+        self.assertNotEqual(nuevo.pk, trabajo.pk)
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, 'fallido')
+
+    def test_trabajo_completado_no_se_reutiliza(self):
+        trabajo, _ = self._crear()
+        ExportJob.objects.filter(pk=trabajo.pk).update(
+            estado='completado', expira_en=timezone.now() + timedelta(hours=1)
+        )
+
+        nuevo, creado = self._crear()
+
+        self.assertTrue(creado)
+        self.assertNotEqual(nuevo.pk, trabajo.pk)
+
+    def test_trabajo_guarda_solo_datos_de_la_solicitud(self):
+        trabajo, _ = self._crear('estado=Inactivo&asincrono=true')
+
+        self.assertEqual(trabajo.parametros['accion'], 'exportar_pacientes')
+        self.assertEqual(trabajo.parametros['filtros'], {'estado': ['Inactivo']})
+
+    def test_tipo_desconocido(self):
+        with self.assertRaises(ValueError):
+            trabajos_exportacion.crear_trabajo(
+                self.usuario, 'usuarios', 'csv', QueryDict(''), 'list', ['email'], ['Email'], 'Reporte'
+            )
+
+    def test_tarea_arma_el_queryset_con_los_filtros(self):
+        for email, nombre, estado in [('a@test.com', 'Ana', 'Activo'), ('b@test.com', 'Berta', 'Inactivo'),
+                                      ('c@test.com', 'Carla', 'Inactivo')]:
+            Paciente.objects.create(usuario=crear_usuario(email=email, nombre=nombre), estado=estado)
+        trabajo, _ = self._crear('estado=Inactivo&ordering=-usuario__nombre')
+
+        trabajo = trabajos_exportacion.ejecutar_trabajo(trabajo.pk)
+
+        self.assertEqual(trabajo.estado, 'completado', trabajo.error)
+        self.assertEqual(trabajo.filas_totales, 2)
+        with open(trabajo.ruta_archivo, encoding='utf-8-sig') as archivo:
+            filas = list(csv.reader(archivo))
+        self.assertEqual(filas, [['Email', 'Estado'], ['c@test.com', 'Inactivo'], ['b@test.com', 'Inactivo']])
+
+    def test_listado_de_trabajos_del_usuario(self):
+        trabajo, _ = self._crear()
+        cliente = APIClient(HTTP_HOST='localhost')
+        cliente.force_authenticate(self.usuario)
+
+        respuesta = cliente.get(f'/api/exports/{trabajo.pk}/')
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.data['estado'], 'pendiente')
+
+    def test_limpieza_marca_estancados(self):
+        trabajo, _ = self._crear()
+        ExportJob.objects.filter(pk=trabajo.pk).update(fecha_creacion=timezone.now() - timedelta(hours=2))
+
+        trabajos_exportacion.limpiar_vencidos()
+
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, 'fallido')
+
+
+class ExportacionesTests(SimpleTestCase):
+    ENCABEZADOS = ['Nombre', 'Fecha', 'Edad', 'Activo']
+    FILAS = [
+        ('José "Pepe", Ñandú', date(2024, 2, 29), 41, True),
+        ('Línea\nnueva (paréntesis) \\ barra', None, 7, False),
+        ('Control\x01 <b>&</b>', date(2000, 1, 1), 3.5, None),
+    ]
+
+    def _contenido(self, respuesta):
+        return b''.join(respuesta.streaming_content)
+
+    def test_csv(self):
+        respuesta = exportaciones.respuesta_csv(iter(self.FILAS), self.ENCABEZADOS, 'Reporte')
+        contenido = self._contenido(respuesta)
+
+        self.assertEqual(respuesta['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(respuesta['Content-Disposition'], 'attachment; filename="Reporte.csv"')
+        self.assertTrue(contenido.startswith(b'\xef\xbb\xbf'))
+        filas = list(csv.reader(io.StringIO(contenido.decode('utf-8-sig'), newline='')))
+        self.assertEqual(filas, [
+            self.ENCABEZADOS,
+            ['José "Pepe", Ñandú', '29/02/2024', '41', 'Sí'],
+            ['Línea\nnueva (paréntesis) \\ barra', '', '7', 'No'],
+            ['Control\x01 <b>&</b>', '01/01/2000', '3.5', ''],
+        ])
+
+    def test_xlsx(self):
+        respuesta = exportaciones.respuesta_xlsx(iter(self.FILAS), self.ENCABEZADOS, 'Reporte', hoja='Pacientes')
+        libro = zipfile.ZipFile(io.BytesIO(self._contenido(respuesta)))
+
+        self.assertIsNone(libro.testzip())
+        self.assertIn('Pacientes', libro.read('xl/workbook.xml').decode('utf-8'))
+        hoja = ElementTree.fromstring(libro.read('xl/worksheets/sheet1.xml'))
+        ns = {'x': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        filas = [
+            [celda.findtext('x:is/x:t' if celda.get('t') == 'inlineStr' else 'x:v', namespaces=ns)
+             for celda in fila.findall('x:c', ns)]
+            for fila in hoja.findall('x:sheetData/x:row', ns)
+        ]
+        self.assertEqual(filas, [
+            self.ENCABEZADOS,
+            ['José "Pepe", Ñandú', '29/02/2024', '41', 'Sí'],
+            ['Línea\nnueva (paréntesis) \\ barra', '', '7', 'No'],
+            ['Control <b>&</b>', '01/01/2000', '3.5', ''],
+        ])
+
+    def test_xlsx_en_varios_bloques(self):
+        filas = [(f'Paciente {i}', i) for i in range(1200)]
+        partes = list(exportaciones.generar_xlsx(iter(filas), ['Nombre', 'N'], filas_por_bloque=100))
+        libro = zipfile.ZipFile(io.BytesIO(b''.join(partes)))
+
+        self.assertGreaterEqual(len(partes), 3)
+        hoja = ElementTree.fromstring(libro.read('xl/worksheets/sheet1.xml'))
+        self.assertEqual(len(hoja.findall('.//{*}row')), 1201)
+
+    def test_html(self):
+        respuesta = exportaciones.respuesta_html(iter(self.FILAS), self.ENCABEZADOS, 'Reporte', titulo='Pacientes <1>')
+        contenido = self._contenido(respuesta).decode('utf-8')
+
+        self.assertEqual(respuesta['Content-Type'], 'text/html; charset=utf-8')
+        self.assertIn('<h1>Pacientes &lt;1&gt;</h1>', contenido)
+        self.assertIn('<tr><td>José &quot;Pepe&quot;, Ñandú</td><td>29/02/2024</td><td>41</td><td>Sí</td></tr>', contenido)
+        self.assertIn('&lt;b&gt;&amp;&lt;/b&gt;', contenido)
+        self.assertIn('Total de registros: 3', contenido)
+
+    def test_pdf_xref(self):
+        filas = [(f'Paciente ({i})', date(2024, 1, 1), i, True) for i in range(120)]
+        respuesta = exportaciones.respuesta_pdf(iter(filas), self.ENCABEZADOS, 'Reporte', titulo='Pacientes')
+        contenido = self._contenido(respuesta)
+
+        self.assertEqual(respuesta['Content-Type'], 'application/pdf')
+        self.assertTrue(contenido.startswith(b'%PDF-1.4'))
+        self.assertTrue(contenido.endswith(b'%%EOF\n'))
+        inicio_xref = int(contenido.rsplit(b'startxref\n', 1)[1].split(b'\n')[0])
+        self.assertTrue(contenido[inicio_xref:].startswith(b'xref\n'))
+
+        lineas = contenido[inicio_xref:].split(b'\n')
+        total = int(lineas[1].split()[1])
+        for numero, entrada in enumerate(lineas[3:2 + total], start=1):
+            desplazamiento = int(entrada[:10])
+            self.assertTrue(contenido[desplazamiento:].startswith(b'%d 0 obj\n' % numero), numero)
+        self.assertIn(b'/Count 3', contenido)
+        self.assertIn(b'(Paciente \\(0\\))', contenido)
+
+
+class ExportarPacientesTests(TestCase):
+    def setUp(self):
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio)
+        parche = override_settings(EXPORTACION_TRABAJOS_DIR=directorio)
+        parche.enable()
+        self.addCleanup(parche.disable)
+
+        self.admin = crear_usuario()
+        for email, nombre, estado in [('carla@test.com', 'Carla', 'Activo'), ('berta@test.com', 'Berta', 'Inactivo'),
+                                      ('ana@test.com', 'Ana', 'Activo')]:
+            Paciente.objects.create(
+                usuario=crear_usuario(email=email, nombre=nombre, apellido='Rojas'), estado=estado, tipo_sangre='O+'
+            )
+        self.cliente = APIClient(HTTP_HOST='localhost')
+        self.cliente.force_authenticate(self.admin)
+
+    def _exportar(self, formato, **parametros):
+        return self.cliente.get(
+            '/api/pacientes/exportar-pacientes/', {'formato': formato, 'estado': 'Activo', **parametros}
+        )
+
+    def _contenido(self, respuesta):
+        return b''.join(respuesta.streaming_content)
+
+    def test_csv(self):
+        respuesta = self._exportar('csv')
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta['Content-Type'], 'text/csv; charset=utf-8')
+        filas = list(csv.reader(io.StringIO(self._contenido(respuesta).decode('utf-8-sig'), newline='')))
+        self.assertEqual(filas[0][:3], ['Nombre', 'Apellido', 'Email'])
+        self.assertEqual([fila[:3] for fila in filas[1:]], [['Ana', 'Rojas', 'ana@test.com'], ['Carla', 'Rojas', 'carla@test.com']])
+
+    def test_excel(self):
+        respuesta = self._exportar('excel', ordering='-usuario__nombre')
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta['Content-Type'], 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        libro = zipfile.ZipFile(io.BytesIO(self._contenido(respuesta)))
+        hoja = ElementTree.fromstring(libro.read('xl/worksheets/sheet1.xml'))
+        primeras = [fila.findtext('{*}c/{*}is/{*}t') for fila in hoja.findall('.//{*}row')]
+        self.assertEqual(primeras, ['Nombre', 'Carla', 'Ana'])
+
+    def test_html(self):
+        respuesta = self._exportar('html', search='carla')
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta['Content-Type'], 'text/html; charset=utf-8')
+        contenido = self._contenido(respuesta).decode('utf-8')
+        self.assertIn('<h1>Reporte de Pacientes</h1>', contenido)
+        self.assertIn('<tr><td>Carla</td><td>Rojas</td><td>carla@test.com</td>', contenido)
+        self.assertNotIn('ana@test.com', contenido)
+        self.assertIn('Total de registros: 1', contenido)
+
+    def test_pdf_por_defecto(self):
+        respuesta = self.cliente.get('/api/pacientes/exportar-pacientes/')
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta['Content-Type'], 'application/pdf')
+        contenido = self._contenido(respuesta)
+        self.assertTrue(contenido.startswith(b'%PDF-1.4'))
+        for nombre in (b'(Ana)', b'(Berta)', b'(Carla)'):
+            self.assertIn(nombre, contenido)
+
+    def test_asincrono_genera_el_mismo_archivo(self):
+        with mock.patch('core.tasks.generar_exportacion.delay', side_effect=trabajos_exportacion.ejecutar_trabajo):
+            with self.captureOnCommitCallbacks(execute=True):
+                respuesta = self._exportar('csv', asincrono='true')
+
+        self.assertEqual(respuesta.status_code, 202)
+        self.assertEqual(respuesta.data['formato'], 'csv')
+        trabajo = self.cliente.get(f"/api/exports/{respuesta.data['id']}/")
+        self.assertEqual(trabajo.data['estado'], 'completado', trabajo.data['error'])
+        self.assertEqual(trabajo.data['filas_totales'], 2)
+
+        descarga = self.cliente.get(f"/api/exports/{respuesta.data['id']}/descargar/")
+        self.assertEqual(descarga.status_code, 200)
+        self.assertEqual(descarga['Content-Type'], 'text/csv; charset=utf-8')
+        filas = list(csv.reader(io.StringIO(self._contenido(descarga).decode('utf-8-sig'), newline='')))
+        self.assertEqual([fila[2] for fila in filas[1:]], ['ana@test.com', 'carla@test.com'])
+
+    def test_asincrono_con_formato_desconocido_usa_pdf(self):
+        respuesta = self._exportar('docx', asincrono='1')
+
+        self.assertEqual(respuesta.status_code, 202)
+        self.assertEqual(ExportJob.objects.get(pk=respuesta.data['id']).formato, 'pdf')
+
+
+class ClaimsJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.usuario = crear_usuario()
+        Administrador.objects.create(usuario=self.usuario)
+        self.refresh = tokens_para_usuario(Usuario.objects.get(pk=self.usuario.pk))
+        self.autenticacion = ClaimsJWTAuthentication()
+
+    def _usuario(self, token=None):
+        token = token or AccessToken(str(self.refresh.access_token))
+        return self.autenticacion.get_user(token)
+
+    def test_usuario_desde_claims_sin_consultas(self):
+        with self.assertNumQueries(0):
+            usuario = self._usuario()
+            self.assertEqual(usuario.pk, self.usuario.pk)
+            self.assertEqual(usuario.id_rol_id, self.usuario.id_rol_id)
+            self.assertEqual(usuario.email, self.usuario.email)
+            self.assertTrue(hasattr(usuario, 'administrador'))
+            self.assertFalse(hasattr(usuario, 'paciente'))
+
+    def test_cambio_de_permisos_del_rol_invalida_el_token(self):
+        permisos_rbac.invalidar_rol(self.usuario.id_rol_id)
+
+        with self.assertRaises(InvalidToken):
+            self._usuario()
+
+    def test_invalidar_usuario_rechaza_claims_anteriores(self):
+        Usuario.objects.filter(pk=self.usuario.pk).update(is_active=False)
+        invalidar_usuario(self.usuario.pk)
+
+        with self.assertRaises(InvalidToken):
+            self._usuario()
+
+    @override_settings(RBAC_VERSION_REVALIDAR_SEGUNDOS=0)
+    def test_sin_cache_el_usuario_se_valida_en_la_base(self):
+        token = AccessToken(str(self.refresh.access_token))
+        Usuario.objects.filter(pk=self.usuario.pk).update(is_active=False)
+
+        with mock.patch.object(cache, 'get', side_effect=ConnectionError), \
+                mock.patch.object(cache, 'get_many', side_effect=ConnectionError):
+            with self.assertRaises(AuthenticationFailed):
+                self._usuario(token)
+
+            Usuario.objects.filter(pk=self.usuario.pk).update(is_active=True)
+            usuario = self._usuario(token)
+
+        self.assertEqual(usuario.pk, self.usuario.pk)
+        self.assertEqual(usuario.get_deferred_fields(), set())
+
+    def test_refresco_vuelve_a_leer_los_claims(self):
+        otro_rol = Rol.objects.create(nombre_rol='Médico')
+        Usuario.objects.filter(pk=self.usuario.pk).update(id_rol=otro_rol)
+        invalidar_usuario(self.usuario.pk)
+
+        serializer = ClaimsTokenRefreshSerializer(data={'refresh': str(self.refresh)})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        usuario = self._usuario(AccessToken(serializer.validated_data['access']))
+
+        self.assertEqual(usuario.id_rol_id, otro_rol.pk)
+
+
+class CachedUserJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.usuario = crear_usuario()
+        self.token = AccessToken.for_user(self.usuario)
+        self.autenticacion = CachedUserJWTAuthentication()
+
+    def test_segunda_lectura_sale_de_la_cache(self):
+        with self.assertNumQueries(1):
+            self.autenticacion.get_user(self.token)
+        with self.assertNumQueries(0):
+            usuario = self.autenticacion.get_user(self.token)
+            self.assertEqual(usuario.id_rol.nombre_rol, 'Administrador')
+
+    def test_invalidar_usuario_recarga_los_cambios(self):
+        self.autenticacion.get_user(self.token)
+        Usuario.objects.filter(pk=self.usuario.pk).update(nombre='Beatriz')
+        invalidar_usuario(self.usuario.pk)
+
+        self.assertEqual(self.autenticacion.get_user(self.token).nombre, 'Beatriz')
+
+    def test_usuario_inactivo_se_rechaza(self):
+        Usuario.objects.filter(pk=self.usuario.pk).update(is_active=False)
+        invalidar_usuario(self.usuario.pk)
+
+        with self.assertRaises(AuthenticationFailed):
+            self.autenticacion.get_user(self.token)
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = routers.ReplicaRouter()
+        parches = [
+            mock.patch.object(routers, 'alias_lectura', return_value=routers.REPLICA),
+            mock.patch.object(connections[DEFAULT_DB_ALIAS], 'in_atomic_block', False),
+        ]
+        for parche in parches:
+            parche.start()
+            self.addCleanup(parche.stop)
+
+    def test_sin_intencion_de_lectura_usa_la_principal(self):
+        self.assertIsNone(self.router.db_for_read(Usuario))
+
+    def test_solo_lectura_usa_la_replica(self):
+        with routers.solo_lectura():
+            self.assertEqual(self.router.db_for_read(Usuario), routers.REPLICA)
+
+    def test_lectura_despues_de_escritura_vuelve_a_la_principal(self):
+        with routers.solo_lectura():
+            self.assertEqual(self.router.db_for_write(Usuario), DEFAULT_DB_ALIAS)
+            self.assertIsNone(self.router.db_for_read(Usuario))
+
+        with routers.solo_lectura():
+            self.assertEqual(self.router.db_for_read(Usuario), routers.REPLICA)
+
+    def test_transaccion_abierta_usa_la_principal(self):
+        with mock.patch.object(connections[DEFAULT_DB_ALIAS], 'in_atomic_block', True):
+            with routers.solo_lectura():
+                self.assertIsNone(self.router.db_for_read(Usuario))
+
+    def test_escrituras_van_a_la_principal(self):
+        with routers.solo_lectura():
+            self.assertEqual(self.router.db_for_write(Usuario), DEFAULT_DB_ALIAS)
+
+
+class BusquedaBitacoraTests(TestCase):
+    def setUp(self):
+        usuario = crear_usuario()
+        recepcion = crear_usuario(email='recepcion@clinica.com')
+        for autor, accion, detalles in [
+            (usuario, 'Exportó reporte de pacientes', 'Formato PDF'),
+            (usuario, 'Eliminó paciente', 'Paciente dado de baja por duplicado de pacientes'),
+            (usuario, 'Creó médico', 'Especialidad cardiología'),
+            (recepcion, 'Inició sesión', ''),
+        ]:
+            Bitacora.objects.create(
+                usuario=autor, ip_address='127.0.0.1', accion_realizada=accion,
+                modulo_afectado='pruebas', detalles=detalles
+            )
+        self.cliente = APIClient(HTTP_HOST='localhost')
+        self.cliente.force_authenticate(usuario)
+
+    def _acciones(self, **parametros):
+        respuesta = self.cliente.get('/api/bitacora/', parametros)
+        self.assertEqual(respuesta.status_code, 200, respuesta.data)
+        return [fila['accion_realizada'] for fila in respuesta.data['results']]
+
+    def test_busqueda_web(self):
+        self.assertCountEqual(self._acciones(search='pacientes'), ['Exportó reporte de pacientes', 'Eliminó paciente'])
+        self.assertEqual(self._acciones(search='pacientes -reporte'), ['Eliminó paciente'])
+        self.assertCountEqual(
+            self._acciones(search='cardiología or exportó'), ['Creó médico', 'Exportó reporte de pacientes']
+        )
+
+    def test_busqueda_por_frase(self):
+        self.assertEqual(self._acciones(search='"reporte de pacientes"'), ['Exportó reporte de pacientes'])
+        self.assertEqual(self._acciones(search='"pacientes reporte"'), [])
+
+    def test_busqueda_por_email_del_usuario(self):
+        self.assertEqual(self._acciones(search='recepcion@clinica'), ['Inició sesión'])
+
+    def test_orden_por_relevancia(self):
+        Bitacora.objects.filter(accion_realizada='Eliminó paciente').update(fecha_hora=timezone.now() - timedelta(days=1))
+
+        self.assertEqual(self._acciones(search='pacientes')[0], 'Exportó reporte de pacientes')
+        self.assertEqual(
+            self._acciones(search='pacientes', ordering='relevancia'),
+            ['Eliminó paciente', 'Exportó reporte de pacientes']
+        )
+
+
+class ParticionesBitacoraTests(TestCase):
+    MES = datetime(2001, 3, 1, tzinfo=dt_timezone.utc)
+
+    def setUp(self):
+        self.usuario = crear_usuario()
+
+    def _registrar(self, fecha_hora, accion='Acción'):
+        registro = Bitacora.objects.create(
+            usuario=self.usuario, ip_address='127.0.0.1', accion_realizada=accion, modulo_afectado='pruebas'
+        )
+        Bitacora.objects.filter(pk=registro.pk).update(fecha_hora=fecha_hora)
+        return registro.pk
+
+    def _ids_en(self, tabla):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT id FROM {connection.ops.quote_name(tabla)} ORDER BY id")
+            return [fila[0] for fila in cursor.fetchall()]
+
+    def _existe(self, tabla):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [tabla])
+            return cursor.fetchone()[0]
+
+    def _es_particion(self, tabla):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT relispartition FROM pg_class WHERE relname = %s", [tabla])
+            return cursor.fetchone()[0]
+
+    def test_crear_particion(self):
+        nombre = particiones_bitacora.nombre_particion(self.MES)
+
+        self.assertTrue(particiones_bitacora.crear_particion(self.MES.replace(day=15)))
+        self.assertFalse(particiones_bitacora.crear_particion(self.MES))
+
+        self.assertIn((nombre, self.MES), particiones_bitacora.listar_particiones())
+        registro = self._registrar(self.MES.replace(day=20))
+        self.assertEqual(self._ids_en(nombre), [registro])
+
+    def test_crear_particion_traslada_las_filas_de_default(self):
+        ids = [self._registrar(self.MES.replace(day=dia)) for dia in (1, 15, 31)]
+        otro_mes = self._registrar(self.MES.replace(month=5))
+        self.assertEqual(self._ids_en(particiones_bitacora.PARTICION_DEFAULT), sorted(ids + [otro_mes]))
+
+        self.assertTrue(particiones_bitacora.crear_particion(self.MES))
+
+        self.assertEqual(self._ids_en(particiones_bitacora.nombre_particion(self.MES)), ids)
+        self.assertEqual(self._ids_en(particiones_bitacora.PARTICION_DEFAULT), [otro_mes])
+        self.assertTrue(self._es_particion(particiones_bitacora.PARTICION_DEFAULT))
+        self.assertEqual(Bitacora.objects.filter(pk__in=ids + [otro_mes]).count(), 4)
+        # DEFAULT vuelve a recibir los meses sin partición
+        nuevo = self._registrar(self.MES.replace(month=6))
+        self.assertIn(nuevo, self._ids_en(particiones_bitacora.PARTICION_DEFAULT))
+
+    def test_retencion_separa_o_elimina(self):
+        for desplazamiento in range(3):
+            particiones_bitacora.crear_particion(particiones_bitacora.sumar_meses(self.MES, desplazamiento))
+        registro = self._registrar(self.MES.replace(day=10))
+        referencia = particiones_bitacora.sumar_meses(self.MES, 5)
+
+        separadas = particiones_bitacora.purgar_particiones_vencidas(3, 'detach', referencia)
+
+        self.assertEqual(separadas, [particiones_bitacora.nombre_particion(self.MES), particiones_bitacora.nombre_particion(particiones_bitacora.sumar_meses(self.MES, 1))])
+        self.assertIn(particiones_bitacora.nombre_particion(particiones_bitacora.sumar_meses(self.MES, 2)), {p[0] for p in particiones_bitacora.listar_particiones()})
+        self.assertFalse(self._es_particion(particiones_bitacora.nombre_particion(self.MES)))
+        self.assertEqual(self._ids_en(particiones_bitacora.nombre_particion(self.MES)), [registro])
+        self.assertFalse(Bitacora.objects.filter(pk=registro).exists())
+
+        eliminadas = particiones_bitacora.purgar_particiones_vencidas(2, 'drop', referencia)
+
+        self.assertEqual(eliminadas, [particiones_bitacora.nombre_particion(particiones_bitacora.sumar_meses(self.MES, 2))])
+        self.assertFalse(self._existe(particiones_bitacora.nombre_particion(particiones_bitacora.sumar_meses(self.MES, 2))))
+        # Las ya separadas no se tocan
+        self.assertTrue(self._existe(particiones_bitacora.nombre_particion(self.MES)))
+
+    def test_retencion_invalida(self):
+        with self.assertRaises(ValueError):
+            particiones_bitacora.purgar_particiones_vencidas(3, 'truncate')
+
+    def test_migracion_copia_filas_e_ids(self):
+        migracion = importlib.import_module('core.migrations.0006_bitacora_particionada')
+        filas = [
+            (3, datetime(2023, 1, 31, 23, 59, tzinfo=dt_timezone.utc)),
+            (7, datetime(2023, 2, 1, tzinfo=dt_timezone.utc)),
+            (42, timezone.now()),
+        ]
+        # Tabla sin particionar como antes de 0006, en un esquema aparte
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE SCHEMA prueba_particionado")
+            cursor.execute("SET LOCAL search_path TO prueba_particionado")
+            try:
+                cursor.execute("CREATE TABLE core_usuario (id bigint PRIMARY KEY)")
+                cursor.execute("INSERT INTO core_usuario VALUES (1)")
+                cursor.execute("""
+                    CREATE TABLE core_bitacora (
+                        id bigint GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+                        ip_address inet NOT NULL,
+                        accion_realizada varchar(200) NOT NULL,
+                        modulo_afectado varchar(50) NOT NULL,
+                        fecha_hora timestamp with time zone NOT NULL,
+                        detalles text NULL,
+                        usuario_id bigint NOT NULL REFERENCES core_usuario (id)
+                    )
+                """)
+                for id_, fecha_hora in filas:
+                    cursor.execute(
+                        "INSERT INTO core_bitacora VALUES (%s, '127.0.0.1', 'Acción', 'pruebas', %s, NULL, 1)",
+                        [id_, fecha_hora]
+                    )
+
+                cursor.execute(migracion.PARTICIONAR_SQL)
+
+                cursor.execute("SELECT id, fecha_hora FROM core_bitacora ORDER BY id")
+                self.assertEqual(cursor.fetchall(), filas)
+                cursor.execute("SELECT relkind FROM pg_class WHERE oid = 'core_bitacora'::regclass")
+                self.assertEqual(cursor.fetchone()[0], 'p')
+                cursor.execute("SELECT count(*) FROM core_bitacora_p202301")
+                self.assertEqual(cursor.fetchone()[0], 1)
+                cursor.execute("SELECT count(*) FROM core_bitacora_default")
+                self.assertEqual(cursor.fetchone()[0], 0)
+                cursor.execute(
+                    "INSERT INTO core_bitacora (ip_address, accion_realizada, modulo_afectado, fecha_hora, usuario_id) "
+                    "VALUES ('127.0.0.1', 'Nueva', 'pruebas', now(), 1) RETURNING id"
+                )
+                self.assertEqual(cursor.fetchone()[0], 43)
+            finally:
+                cursor.execute("SET LOCAL search_path TO DEFAULT")
+
+
+class ArchivoBitacoraTests(TestCase):
+    MES = datetime(2020, 3, 1, tzinfo=dt_timezone.utc)
+
+    def setUp(self):
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio)
+        parche = override_settings(BITACORA_ARCHIVO_DIR=directorio)
+        parche.enable()
+        self.addCleanup(parche.disable)
+
+        usuario = crear_usuario()
+        for dia in range(1, 13):
+            registro = Bitacora.objects.create(
+                usuario=usuario, ip_address='127.0.0.1', accion_realizada=f'Acción {dia}', modulo_afectado='pruebas'
+            )
+            Bitacora.objects.filter(pk=registro.pk).update(fecha_hora=self.MES.replace(day=dia))
+
+    def _archivadas(self):
+        return list(archivo_bitacora.consultar_archivo())
+
+    def test_archivar_mueve_las_filas_al_archivo(self):
+        total = archivo_bitacora.archivar_mes(self.MES, filas_por_segmento=5)
+
+        self.assertEqual(total, 12)
+        self.assertFalse(Bitacora.objects.filter(fecha_hora__lt=self.MES.replace(month=4)).exists())
+        filas = self._archivadas()
+        self.assertEqual(len(filas), 12)
+        # Orden descendente, como el listado de la bitácora
+        self.assertEqual([f['accion_realizada'] for f in filas[:2]], ['Acción 12', 'Acción 11'])
+
+    def test_reintento_no_duplica_el_mes(self):
+        # Corte después de escribir el archivo y antes de borrar las filas
+        with mock.patch.object(archivo_bitacora, 'nombre_particion', side_effect=RuntimeError('corte')):
+            with self.assertRaises(RuntimeError):
+                archivo_bitacora.archivar_mes(self.MES, filas_por_segmento=5)
+        self.assertEqual(Bitacora.objects.filter(modulo_afectado='pruebas').count(), 12)
+
+        archivo_bitacora.archivar_mes(self.MES, filas_por_segmento=5)
+        archivo_bitacora.archivar_mes(self.MES, filas_por_segmento=5)
+
+        self.assertEqual(len(self._archivadas()), 12)
+        self.assertFalse(Bitacora.objects.filter(modulo_afectado='pruebas').exists())
+
+    def test_consulta_por_rango(self):
+        archivo_bitacora.archivar_mes(self.MES, filas_por_segmento=5)
+
+        filas = list(archivo_bitacora.consultar_archivo(self.MES.replace(day=3), self.MES.replace(day=6)))
+
+        self.assertEqual([f['accion_realizada'] for f in filas], ['Acción 6', 'Acción 5', 'Acción 4', 'Acción 3'])
+
+
+@override_settings(TYPEAHEAD_RECONSTRUIR_EN_SEGUNDO_PLANO=False)
+class TypeaheadSelectTests(TestCase):
+    PACIENTES = [
+        ('jose.nunez@test.com', 'José', 'Núñez', 'Activo'),
+        ('josefina@test.com', 'Josefina', 'Álvarez', 'Activo'),
+        ('maria@test.com', 'María José', 'Pérez', 'Activo'),
+        ('marijose@test.com', 'Marijose', 'Gómez', 'Activo'),
+        ('jose.inactivo@test.com', 'José', 'Ruiz', 'Inactivo'),
+    ]
+
+    def setUp(self):
+        cache.clear()
+        parche = mock.patch.dict(typeahead._indices, {tipo: typeahead.IndicePrefijos(tipo) for tipo in typeahead.TIPOS})
+        parche.start()
+        self.addCleanup(parche.stop)
+
+        for email, nombre, apellido, estado in self.PACIENTES:
+            Paciente.objects.create(usuario=crear_usuario(email, nombre=nombre, apellido=apellido), estado=estado)
+        self.cliente = APIClient(HTTP_HOST='localhost')
+        self.cliente.force_authenticate(crear_usuario())
+
+    def _buscar(self, parametros):
+        respuesta = self.cliente.get('/api/select/pacientes/', parametros)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.json()
+
+    def _buscar_en_base_de_datos(self, parametros):
+        with mock.patch.object(typeahead, 'sincronizar', return_value=False):
+            return self._buscar(parametros)
+
+    def test_indice_y_base_de_datos_coinciden(self):
+        for termino in ('jose', 'JOSÉ nu', 'alv', 'mari', 'nunez@test', 'ose'):
+            with self.subTest(termino=termino):
+                self.assertEqual(self._buscar({'search': termino}), self._buscar_en_base_de_datos({'search': termino}))
+
+    def test_prefijo_de_palabra_sin_acentos(self):
+        nombres = [fila['nombre_completo'] for fila in self._buscar_en_base_de_datos({'search': 'jose'})]
+
+        # Orden por código de carácter, como el índice ('f' < 'é')
+        self.assertEqual(nombres, ['Josefina Álvarez', 'José Núñez', 'María José Pérez'])
+
+    def test_mismo_limite_en_ambos_caminos(self):
+        parametros = {'search': 'jose', 'limite': 2}
+
+        self.assertEqual(len(self._buscar(parametros)), 2)
+        self.assertEqual(self._buscar(parametros), self._buscar_en_base_de_datos(parametros))
+
+
+class MetricasPrometheusTests(SimpleTestCase):
+    def _estado(self, **cabeceras):
+        return metricas_prometheus(RequestFactory().get('/metrics', **cabeceras)).status_code
+
+    @override_settings(METRICAS_TOKEN='', METRICAS_PUBLICAS=False)
+    def test_sin_token_no_se_exponen(self):
+        self.assertEqual(self._estado(), 401)
+
+    @override_settings(METRICAS_TOKEN='secreto', METRICAS_PUBLICAS=False)
+    def test_token_requerido(self):
+        self.assertEqual(self._estado(), 401)
+        self.assertEqual(self._estado(HTTP_AUTHORIZATION='Bearer otro'), 401)
+        self.assertEqual(self._estado(HTTP_AUTHORIZATION='Bearer secreto'), 200)
+
+    @override_settings(METRICAS_TOKEN='', METRICAS_PUBLICAS=True)
+    def test_publicas_por_configuracion_explicita(self):
+        self.assertEqual(self._estado(), 200)
+
+
+class KeysetCursorPaginationTests(TestCase):
+    def setUp(self):
+        for numero in range(5):
+            Rol.objects.create(nombre_rol=f'Rol {numero}')
+
+    def _pagina(self, url, paginador=None, queryset=None):
+        paginador = paginador or KeysetCursorPagination()
+        paginador.page_size = 2
+        queryset = Rol.objects.order_by('id') if queryset is None else queryset
+        pagina = paginador.paginate_queryset(queryset, Request(APIRequestFactory().get(url)))
+        return paginador.get_paginated_response([rol.nombre_rol for rol in pagina]).data
+
+    def test_count_en_todas_las_formas(self):
+        primera = self._pagina('/roles/')
+        siguiente = self._pagina(primera['next'])
+        legado = self._pagina('/roles/?page=2')
+
+        for respuesta in (primera, siguiente, legado):
+            self.assertEqual(respuesta['count'], 5)
+
+    def test_sin_conteo_a_pedido(self):
+        self.assertNotIn('count', self._pagina('/roles/?conteo=ninguno'))
+
+    def test_busqueda_de_agenda_conserva_el_orden_del_queryset(self):
+        # Como el orden por similitud: distinto del orden del cursor
+        queryset = Rol.objects.order_by('nombre_rol')
+
+        respuesta = self._pagina('/agenda-citas/?search=rol', AgendaCitaPagination(), queryset)
+
+        self.assertEqual(respuesta['results'], ['Rol 0', 'Rol 1'])
+
+
+class AsignacionPermisosTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.rol = Rol.objects.create(nombre_rol='Recepción')
+        self.permiso = Permiso.objects.create(nombre='Agenda', codigo='agenda')
+        self.cliente = APIClient(HTTP_HOST='localhost')
+        self.cliente.force_authenticate(crear_usuario())
+
+    def _asignar(self, roles):
+        return self.cliente.post('/api/roles/asignar-matriz/', {'roles': roles}, format='json')
+
+    def test_ids_como_texto(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            respuesta = self._asignar([{'rol': str(self.rol.pk), 'permisos': [str(self.permiso.pk)]}])
+
+        self.assertEqual(respuesta.status_code, 200, respuesta.data)
+        self.assertIn(self.permiso, self.rol.permisos.all())
+
+    def test_rol_invalido_es_error_de_validacion(self):
+        for rol in ([self.rol.pk], {'id': self.rol.pk}, 'abc', self.rol.pk + 1000):
+            with self.subTest(rol=rol):
+                self.assertEqual(self._asignar([{'rol': rol, 'permisos': []}]).status_code, 400)
+
+    def test_permiso_inexistente(self):
+        respuesta = self._asignar([{'rol': self.rol.pk, 'permisos': [self.permiso.pk + 1000]}])
+
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertFalse(self.rol.permisos.exists())
+
+    def test_put_permisos_del_rol(self):
+        respuesta = self.cliente.put(
+            f'/api/roles/{self.rol.pk}/permisos/', {'permisos': [str(self.permiso.pk)]}, format='json'
+        )
+
+        self.assertEqual(respuesta.status_code, 200, respuesta.data)
+        self.assertIn(self.permiso, self.rol.permisos.all())
+
+    def test_eliminar_permiso_invalida_la_matriz(self):
+        tipo = TipoComponente.objects.create(nombre='Pantalla')
+        componente = ComponenteUI.objects.create(
+            tipo_componente=tipo, codigo_componente='agenda', nombre_componente='Agenda', modulo='citas'
+        )
+        PermisoComponente.objects.create(permiso=self.permiso, componente=componente, accion_permitida='ver')
+        self.rol.permisos.add(self.permiso)
+        permisos_rbac.invalidar_todos()
+        self.assertTrue(permisos_rbac.tiene_permiso(self.rol.pk, 'agenda'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            respuesta = self.cliente.delete(f'/api/permisos/{self.permiso.pk}/')
+
+        self.assertEqual(respuesta.status_code, 204)
+        self.assertFalse(permisos_rbac.tiene_permiso(self.rol.pk, 'agenda'))
+
+
+class ImportacionPacientesTests(TestCase):
+    def setUp(self):
+        Rol.objects.create(nombre_rol='Paciente')
+        self.administrador = crear_usuario('admin@test.com')
+        Administrador.objects.create(usuario=self.administrador)
+
+    def _csv(self, *filas):
+        return io.BytesIO(('email,nombre,apellido,password\n' + '\n'.join(filas)).encode('utf-8'))
+
+    def test_email_registrado_sin_distinguir_mayusculas(self):
+        resultado = importacion_pacientes.importar(self._csv('ADMIN@test.com,Ana,Pérez,', 'nuevo@test.com,Luis,Soto,'))
+
+        self.assertEqual(resultado['creados'], 1)
+        self.assertEqual(resultado['errores'][0]['errores'], ['email ya registrado'])
+
+    def test_email_repetido_en_el_archivo(self):
+        resultado = importacion_pacientes.importar(self._csv('ana@test.com,Ana,Pérez,', 'Ana@test.com,Ana,Pérez,'))
+
+        self.assertEqual(resultado['creados'], 1)
+        self.assertIn('email repetido en el archivo (fila 2)', resultado['errores'][0]['errores'])
+
+    def test_error_de_datos_se_informa_por_fila(self):
+        # PostgreSQL rechaza el carácter NUL en columnas de texto (DataError)
+        resultado = importacion_pacientes.importar(
+            self._csv('a@test.com,Ana,Pérez,', 'b@test.com,Be\x00a,Soto,', 'c@test.com,Ciro,Ruiz,')
+        )
+
+        self.assertEqual(resultado['creados'], 2)
+        self.assertEqual([(error['fila'], error['email']) for error in resultado['errores']], [(3, 'b@test.com')])
+        self.assertTrue(resultado['errores'][0]['errores'][0].startswith('error al guardar'))
+        self.assertEqual(
+            set(Usuario.objects.filter(pk__in=resultado['ids_creados']).values_list('email', flat=True)),
+            {'a@test.com', 'c@test.com'}
+        )
+
+    def test_sin_password_se_informa_para_asignarla(self):
+        resultado = importacion_pacientes.importar(self._csv('a@test.com,Ana,Pérez,secreto1', 'b@test.com,Bea,Soto,'))
+
+        usuario = Usuario.objects.get(email='b@test.com')
+        self.assertEqual(resultado['restablecer_password'], [{'id': usuario.pk, 'email': 'b@test.com'}])
+        self.assertFalse(usuario.has_usable_password())
+        self.assertTrue(Usuario.objects.get(email='a@test.com').check_password('secreto1'))
+
+    @override_settings(IMPORTACION_API_MAX_FILAS=2)
+    def test_archivo_grande_va_al_comando(self):
+        cliente = APIClient(HTTP_HOST='localhost')
+        cliente.force_authenticate(self.administrador)
+        archivo = SimpleUploadedFile('pacientes.csv', self._csv(
+            'a@test.com,Ana,Pérez,', 'b@test.com,Bea,Soto,', 'c@test.com,Ciro,Ruiz,'
+        ).getvalue())
+
+        respuesta = cliente.post('/api/pacientes/importar/', {'archivo': archivo}, format='multipart')
+
+        self.assertEqual(respuesta.status_code, 413)
+        self.assertIn('importar_pacientes', respuesta.data['detail'])
+        self.assertFalse(Paciente.objects.exists())
+
+
+class EstadisticasPacientesTests(TestCase):
+    HOY = date(2026, 10, 19)
+
+    def setUp(self):
+        cache.clear()
+        datos = [
+            # email, genero, fecha_nacimiento, estado, tipo_sangre, alergias, enfermedades, medicamentos, contacto
+            ('p1@test.com', 'F', date(1950, 1, 1), 'Activo', 'O+', 'Penicilina', '', None, ('Luis', '70000000')),
+            ('p2@test.com', 'M', date(2008, 10, 19), 'Activo', 'A-', None, 'Asma', 'Salbutamol', ('', '70000001')),
+            ('p3@test.com', 'M', date(2008, 10, 20), 'Inactivo', '', '', None, '', (None, None)),
+            ('p4@test.com', None, None, 'Activo', None, 'Polen', 'Diabetes', None, ('Rosa', None)),
+            ('p5@test.com', 'F', date(1981, 10, 19), 'Inactivo', 'O+', None, None, 'Metformina', ('Eva', '70000002')),
+        ]
+        for email, genero, nacimiento, estado, sangre, alergias, enfermedades, medicamentos, contacto in datos:
+            Paciente.objects.create(
+                usuario=crear_usuario(email=email, genero=genero, fecha_nacimiento=nacimiento),
+                estado=estado, tipo_sangre=sangre, alergias=alergias, enfermedades_cronicas=enfermedades,
+                medicamentos_actuales=medicamentos, contacto_emergencia_nombre=contacto[0],
+                contacto_emergencia_telefono=contacto[1],
+            )
+
+    def _informado(self, *campos):
+        queryset = Paciente.objects.all()
+        for campo in campos:
+            queryset = queryset.exclude(Q(**{f'{campo}__isnull': True}) | Q(**{f'{campo}__exact': ''}))
+        return queryset.count()
+
+    def test_totales_iguales_a_los_conteos_por_consulta(self):
+        estadisticas = estadisticas_pacientes.calcular(hoy=self.HOY)
+
+        self.assertEqual(estadisticas['total_pacientes'], Paciente.objects.count())
+        self.assertEqual(estadisticas['pacientes_activos'], Paciente.objects.filter(estado='Activo').count())
+        self.assertEqual(estadisticas['pacientes_inactivos'], Paciente.objects.filter(estado='Inactivo').count())
+        self.assertEqual(estadisticas['pacientes_con_alergias'], self._informado('alergias'))
+        self.assertEqual(estadisticas['pacientes_con_enfermedades_cronicas'], self._informado('enfermedades_cronicas'))
+        self.assertEqual(estadisticas['pacientes_con_medicamentos_actuales'], self._informado('medicamentos_actuales'))
+        self.assertEqual(estadisticas['pacientes_con_contacto_emergencia'], self._informado(
+            'contacto_emergencia_nombre', 'contacto_emergencia_telefono'
+        ))
+        self.assertEqual(
+            estadisticas['distribucion_tipos_sangre'],
+            [{'tipo_sangre': 'A-', 'total': 1}, {'tipo_sangre': 'O+', 'total': 2}]
+        )
+        self.assertEqual(estadisticas['porcentaje_activos'], 60.0)
+
+    def test_agrupar_por_genero(self):
+        grupos = {g['grupo']: g for g in estadisticas_pacientes.calcular('genero', self.HOY)['grupos']}
+
+        self.assertEqual({grupo: g['total'] for grupo, g in grupos.items()},
+                         {'Femenino': 2, 'Masculino': 2, 'Sin dato': 1})
+        self.assertEqual(grupos['Masculino']['activos'], 1)
+        self.assertEqual(grupos['Femenino']['con_alergias'], 1)
+        self.assertEqual(grupos['Sin dato']['con_enfermedades_cronicas'], 1)
+
+    def test_agrupar_por_edad(self):
+        grupos = estadisticas_pacientes.calcular('edad', self.HOY)['grupos']
+
+        # p2 cumple 18 hoy, p3 mañana; p5 cumple 45 hoy
+        self.assertEqual(
+            {g['grupo']: g['total'] for g in grupos},
+            {'60+': 1, '45-59': 1, '18-29': 1, '0-17': 1, 'Sin dato': 1}
+        )
+
+    def test_agrupar_invalido(self):
+        cliente = APIClient(HTTP_HOST='localhost')
+        cliente.force_authenticate(Usuario.objects.get(email='p1@test.com'))
+
+        self.assertEqual(cliente.get('/api/pacientes/estadisticas/', {'agrupar': 'sangre'}).status_code, 400)
+        respuesta = cliente.get('/api/pacientes/estadisticas/', {'agrupar': 'genero'})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.data['agrupar'], 'genero')
+
+    def test_guardar_paciente_invalida_la_cache(self):
+        self.assertEqual(estadisticas_pacientes.estadisticas()['pacientes_activos'], 3)
+        paciente = Paciente.objects.get(usuario__email='p3@test.com')
+
+        paciente.estado = 'Activo'
+        with self.captureOnCommitCallbacks(execute=True):
+            paciente.save()
+
+        self.assertEqual(estadisticas_pacientes.estadisticas()['pacientes_activos'], 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            paciente.delete()
+
+        self.assertEqual(estadisticas_pacientes.estadisticas()['total_pacientes'], 4)
+
+    def _por_genero(self):
+        return {g['grupo']: g['total'] for g in estadisticas_pacientes.estadisticas('genero')['grupos']}
+
+    def test_guardar_usuario_invalida_solo_con_genero_o_nacimiento(self):
+        self.assertEqual(self._por_genero()['Sin dato'], 1)
+        usuario = Usuario.objects.get(email='p4@test.com')
+
+        version = estadisticas_pacientes._version()
+
+        usuario.nombre = 'Rocío'
+        with self.captureOnCommitCallbacks(execute=True):
+            usuario.save(update_fields=['nombre'])
+        self.assertEqual(estadisticas_pacientes._version(), version)
+
+        usuario.genero = 'F'
+        with self.captureOnCommitCallbacks(execute=True):
+            usuario.save(update_fields=['genero'])
+
+        self.assertEqual(self._por_genero(), {'Femenino': 3, 'Masculino': 2})
+
+    def test_usuario_sin_paciente_no_invalida(self):
+        version = estadisticas_pacientes._version()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            crear_usuario(email='medico@test.com', genero='M')
+
+        self.assertEqual(estadisticas_pacientes._version(), version)
+
+
+class HaceAniosTests(SimpleTestCase):
+    def test_misma_fecha(self):
+        self.assertEqual(estadisticas_pacientes.hace_anios(date(2026, 10, 19), 18), date(2008, 10, 19))
+
+    def test_29_de_febrero(self):
+        self.assertEqual(estadisticas_pacientes.hace_anios(date(2024, 2, 29), 1), date(2023, 2, 28))
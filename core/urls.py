@@ -29,6 +29,7 @@ router.register(r'agenda-citas', AgendaCitaViewSet)
 router.register(r'historias-clinicas', HistoriaClinicaViewSet)
 router.register(r'consultas', ConsultaViewSet)
 router.register(r'backups', RegistroBackupViewSet)
+router.register(r'exports', ExportJobViewSet, basename='export')
 
 #---prueba---
 router.register(r'autos', AutoViewSet)
@@ -87,6 +88,10 @@ urlpatterns = [
     # Reemplazar el endpoint antiguo o agregar el nuevo
     path('historial-medico/paciente/<int:paciente_id>/', historial_medico_completo, name='historial-medico-completo'),
 
+    # Perfiles de requests (?__profile=1), solo administradores
+    path('perfiles/', perfiles_listar, name='perfiles'),
+    path('perfiles/<str:nombre>/', perfil_descargar, name='perfil-descargar'),
+
     # Notificaciones personalizadas
     path('notificaciones/enviar-personalizada/', EnviarNotificacionPersonalizadaView.as_view(), name='enviar-notificacion-personalizada'),
 ]
@@ -2,10 +2,13 @@ from rest_framework import viewsets, status, generics, permissions
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from django.db.models import Count, Sum, Q, F
+from django.db.models.functions import Collate
 from datetime import datetime, timedelta, time
 
 from rest_framework_simplejwt.views import TokenObtainPairView
@@ -14,10 +17,13 @@ from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, Ou
 from django.contrib.auth import authenticate
 from django.db import transaction
 
+import hmac
 import os
+from itertools import islice
 import subprocess
 from django.conf import settings
-from django.http import HttpResponse
+from django.http import HttpResponse, FileResponse
+from django.urls import reverse
 from django.core.files.storage import FileSystemStorage
 from shutil import which
 import platform
@@ -26,6 +32,11 @@ from .models import *
 from .serializers import *
 
 from .services.notificaciones import NotificacionesCitas, NotificacionesExamenes
+from .pagination import BitacoraPagination, NotificacionPagination, AgendaCitaPagination
+from .filters import BitacoraSearchFilter, SimilitudSearchFilter, filtrar_por_prefijos, filtrar_por_similitud, filtro_contiene
+from .services import exportaciones, trabajos_exportacion, archivo_bitacora, permisos as permisos_rbac, asignacion_permisos, typeahead, estadisticas_pacientes, metricas, perfilador
+from .authentication import tokens_para_usuario, invalidar_usuario
+from .routers import solo_lectura
 
 # VISTA PERSONALIZADA DE LOGIN
 @api_view(['POST'])
@@ -47,8 +58,8 @@ def login_personalizado(request):
     user = authenticate(request, username=email, password=password)
     
     if user is not None and user.is_active:
-        # Generar tokens JWT
-        refresh = RefreshToken.for_user(user)
+        # Generar tokens JWT (con claims de rol y perfil)
+        refresh = tokens_para_usuario(user)
         
         # Registrar en bitácora
         try:
@@ -148,6 +159,142 @@ def get_client_ip(request):
         ip = request.META.get('REMOTE_ADDR', '0.0.0.0')
     return ip
 
+def _entero(valor):
+    """Entero de un parámetro de consulta; None si falta o no es válido"""
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+# Mismo orden que el índice typeahead (comparación de str en Python = collation "C")
+ORDEN_SELECT = (Collate('usuario__nombre', 'C'), Collate('usuario__apellido', 'C'), 'usuario_id')
+
+def _respuesta_select(vista, request):
+    """
+    Con ?search= responde desde el índice typeahead o, si no está
+    disponible, con la misma búsqueda y el mismo límite en la base de datos
+    """
+    search = request.query_params.get('search', '').strip()
+    limite = _entero(request.query_params.get('limite'))
+    if search:
+        resultados = vista.buscar_en_indice(search, limite)
+        if resultados is not None:
+            return Response(resultados)
+        queryset = vista.filter_queryset(vista.get_queryset())[:typeahead.limite_resultados(limite)]
+        return Response(vista.get_serializer(queryset, many=True).data)
+
+    # Deshabilitar paginación
+    vista.pagination_class = None
+    return generics.ListAPIView.list(vista, request)
+
+def _exportacion_asincrona(request):
+    """?asincrono=true: la exportación se genera en segundo plano (ExportJob)"""
+    return request.query_params.get('asincrono', '').lower() in ('1', 'true', 'si', 'sí')
+
+def _encolar_exportacion(vista, tipo, formato, nombre_archivo):
+    """
+    Registra (o reutiliza) el ExportJob con los EXPORTACION_* de la vista y
+    responde 202; el avance y la descarga quedan en /api/exports/<id>/.
+    La tarea arma el queryset con ``vista.queryset_exportacion`` y los mismos
+    parámetros de la solicitud.
+    """
+    trabajo, _creado = trabajos_exportacion.crear_trabajo(
+        vista.request.user,
+        tipo,
+        formato,
+        vista.request.query_params,
+        vista.action,
+        vista.EXPORTACION_CAMPOS,
+        vista.EXPORTACION_ENCABEZADOS,
+        nombre_archivo,
+        titulo=vista.EXPORTACION_TITULO,
+        hoja=vista.EXPORTACION_HOJA,
+        anchos=vista.EXPORTACION_ANCHOS,
+    )
+    serializer = ExportJobSerializer(trabajo, context={'request': vista.request})
+    return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+class ExportacionMixin:
+    """
+    Exportación en streaming sobre values_list (services/exportaciones.py),
+    sin instancias ni serializer por fila. Cada ViewSet define sus columnas
+    en EXPORTACION_* y puede redefinir ``_queryset_exportacion``.
+    """
+    EXPORTACION_CAMPOS = []
+    EXPORTACION_ENCABEZADOS = []
+    EXPORTACION_TITULO = ''
+    EXPORTACION_HOJA = 'Datos'
+    EXPORTACION_ANCHOS = None
+    # False si las exportaciones usan get_queryset() sin los filtros de la URL
+    EXPORTACION_FILTRAR = True
+
+    def queryset_exportacion(self):
+        """Queryset exportado para la solicitud actual (también lo usa la tarea de ExportJob)"""
+        queryset = self.get_queryset()
+        if self.EXPORTACION_FILTRAR:
+            queryset = self.filter_queryset(queryset)
+        return self._queryset_exportacion(queryset)
+
+    def _queryset_exportacion(self, queryset):
+        # Desempate por pk para que el orden sea estable entre bloques del cursor
+        return queryset.order_by(*queryset.query.order_by, 'pk')
+
+    def _filas_exportacion(self, queryset):
+        return exportaciones.iterar_filas(self._queryset_exportacion(queryset), self.EXPORTACION_CAMPOS)
+
+    def _nombre_exportacion(self, nombre_archivo):
+        return f"{nombre_archivo}_{timezone.now().strftime('%Y%m%d_%H%M')}"
+
+    def _exportar_pdf(self, queryset, nombre_archivo):
+        """Método para exportar a PDF"""
+        return exportaciones.respuesta_pdf(
+            self._filas_exportacion(queryset),
+            self.EXPORTACION_ENCABEZADOS,
+            nombre_archivo,
+            titulo=self.EXPORTACION_TITULO,
+            anchos=self.EXPORTACION_ANCHOS
+        )
+
+    def _exportar_excel(self, queryset, nombre_archivo):
+        """Método para exportar a Excel"""
+        return exportaciones.respuesta_xlsx(
+            self._filas_exportacion(queryset),
+            self.EXPORTACION_ENCABEZADOS,
+            nombre_archivo,
+            hoja=self.EXPORTACION_HOJA
+        )
+
+    def _exportar_html(self, queryset, nombre_archivo):
+        """Método para exportar a HTML"""
+        return exportaciones.respuesta_html(
+            self._filas_exportacion(queryset),
+            self.EXPORTACION_ENCABEZADOS,
+            nombre_archivo,
+            titulo=self.EXPORTACION_TITULO
+        )
+
+    def _exportar_csv(self, queryset, nombre_archivo):
+        """Método para exportar a CSV"""
+        return exportaciones.respuesta_csv(
+            self._filas_exportacion(queryset),
+            self.EXPORTACION_ENCABEZADOS,
+            nombre_archivo
+        )
+
+class LecturaReplicaMixin:
+    """
+    Las acciones de ``acciones_solo_lectura`` pedidas con GET se ejecutan con
+    intención de solo lectura: sus consultas van a la réplica (core/routers.py)
+    """
+    acciones_solo_lectura = ()
+
+    def dispatch(self, request, *args, **kwargs):
+        accion = getattr(self, 'action_map', {}).get(request.method.lower())
+        if request.method in ('GET', 'HEAD') and accion in self.acciones_solo_lectura:
+            with solo_lectura():
+                return super().dispatch(request, *args, **kwargs)
+        return super().dispatch(request, *args, **kwargs)
+
 #TOKEN (Mantengo por si acaso, pero usaremos login_personalizado)
 class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
@@ -177,6 +324,7 @@ class PermisoViewSet(viewsets.ModelViewSet):
 
     def perform_update(self, serializer):
         instance = serializer.save()
+        transaction.on_commit(permisos_rbac.invalidar_todos)
         # Registrar en bitácora
         Bitacora.registrar_accion(
             usuario=self.request.user,
@@ -196,6 +344,7 @@ class PermisoViewSet(viewsets.ModelViewSet):
             detalles=f"Permiso {instance.codigo} eliminado"
         )
         instance.delete()
+        transaction.on_commit(permisos_rbac.invalidar_todos)
 
 class RegistroPacienteView(generics.CreateAPIView):
     serializer_class = RegistroPacienteSerializer
@@ -235,6 +384,7 @@ class UsuarioViewSet(viewsets.ModelViewSet):
 
     def perform_update(self, serializer):
         instance = serializer.save()
+        transaction.on_commit(lambda: invalidar_usuario(instance.pk))
         # Registrar en bitácora
         Bitacora.registrar_accion(
             usuario=self.request.user,
@@ -253,7 +403,9 @@ class UsuarioViewSet(viewsets.ModelViewSet):
             modulo="usuarios",
             detalles=f"Usuario {instance.nombre} {instance.apellido} eliminado"
         )
+        usuario_id = instance.pk
         instance.delete()
+        transaction.on_commit(lambda: invalidar_usuario(usuario_id))
 
     @action(detail=True, methods=['post'], url_path='cambiar-password', permission_classes=[IsAuthenticated])
     def cambiar_password(self, request, pk=None):
@@ -266,6 +418,7 @@ class UsuarioViewSet(viewsets.ModelViewSet):
         user = self.get_object()
         user.set_password(new_password)
         user.save()
+        transaction.on_commit(lambda: invalidar_usuario(user.pk))
         
         # Registrar en bitácora
         Bitacora.registrar_accion(
@@ -279,8 +432,9 @@ class UsuarioViewSet(viewsets.ModelViewSet):
         return Response({'detail': 'Password actualizado correctamente.'}, status=status.HTTP_200_OK)
 
 # GESTIÓN COMPLETA DE PACIENTES
-class PacienteViewSet(viewsets.ModelViewSet):
+class PacienteViewSet(ExportacionMixin, LecturaReplicaMixin, viewsets.ModelViewSet):
     queryset = Paciente.objects.select_related('usuario').order_by('-usuario__id')
+    acciones_solo_lectura = ('estadisticas', 'historial_citas', 'historia_clinica')
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     filterset_fields = ['estado', 'tipo_sangre']
@@ -309,6 +463,7 @@ class PacienteViewSet(viewsets.ModelViewSet):
 
     def perform_update(self, serializer):
         instance = serializer.save()
+        transaction.on_commit(lambda: invalidar_usuario(instance.pk))
         # Registrar en bitácora
         Bitacora.registrar_accion(
             usuario=self.request.user,
@@ -332,7 +487,9 @@ class PacienteViewSet(viewsets.ModelViewSet):
         )
 
     # Eliminar el usuario asociado; por la relación OneToOne se elimina el paciente automáticamente
+        usuario_id = instance.pk
         instance.usuario.delete()
+        transaction.on_commit(lambda: invalidar_usuario(usuario_id))
 
 
     @action(detail=True, methods=['post'], url_path='cambiar-estado')
@@ -352,6 +509,7 @@ class PacienteViewSet(viewsets.ModelViewSet):
         estado_anterior = paciente.estado
         paciente.estado = nuevo_estado
         paciente.save()
+        transaction.on_commit(lambda: invalidar_usuario(paciente.pk))
         
         # Registrar en bitácora
         Bitacora.registrar_accion(
@@ -407,7 +565,8 @@ class PacienteViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'], url_path='exportar-pacientes')
     def exportar_pacientes(self, request):
         """
-        Exportar lista de pacientes a PDF/Excel
+        Exportar lista de pacientes (?formato=pdf|excel|html|csv) respetando
+        los filtros, la búsqueda y el orden del listado
         """
         queryset = self.filter_queryset(self.get_queryset())
         
@@ -422,82 +581,100 @@ class PacienteViewSet(viewsets.ModelViewSet):
         
         formato = request.query_params.get('formato', 'pdf')
         nombre_archivo = f"Reporte_Pacientes_{timezone.now().strftime('%Y%m%d_%H%M')}"
+
+        if _exportacion_asincrona(request):
+            formato = formato.lower() if formato.lower() in exportaciones.FORMATOS else 'pdf'
+            return _encolar_exportacion(self, 'pacientes', formato, nombre_archivo)
         
         if formato.lower() == 'excel':
             return self._exportar_excel(queryset, nombre_archivo)
         elif formato.lower() == 'html':
             return self._exportar_html(queryset, nombre_archivo)
+        elif formato.lower() == 'csv':
+            return self._exportar_csv(queryset, nombre_archivo)
         else:
             return self._exportar_pdf(queryset, nombre_archivo)
 
     @action(detail=False, methods=['get'], url_path='estadisticas')
     def estadisticas(self, request):
         """
-        Estadísticas de pacientes
+        Estadísticas de pacientes (cacheadas hasta el próximo cambio).
+        ?agrupar=genero|edad agrega la distribución por esa dimensión.
         """
-        from django.db.models import Count, Q
-        
-        total_pacientes = Paciente.objects.count()
-        pacientes_activos = Paciente.objects.filter(estado='Activo').count()
-        pacientes_inactivos = Paciente.objects.filter(estado='Inactivo').count()
-        
-        # Conteo por tipo de sangre
-        tipos_sangre = Paciente.objects.exclude(
-            Q(tipo_sangre__isnull=True) | Q(tipo_sangre__exact='')
-        ).values('tipo_sangre').annotate(total=Count('tipo_sangre'))
-        
-        # Pacientes con alergias
-        pacientes_con_alergias = Paciente.objects.exclude(
-            Q(alergias__isnull=True) | Q(alergias__exact='')
-        ).count()
-        
-        # Pacientes con enfermedades crónicas
-        pacientes_con_enfermedades = Paciente.objects.exclude(
-            Q(enfermedades_cronicas__isnull=True) | Q(enfermedades_cronicas__exact='')
-        ).count()
-        
-        estadisticas = {
-            'total_pacientes': total_pacientes,
-            'pacientes_activos': pacientes_activos,
-            'pacientes_inactivos': pacientes_inactivos,
-            'pacientes_con_alergias': pacientes_con_alergias,
-            'pacientes_con_enfermedades_cronicas': pacientes_con_enfermedades,
-            'distribucion_tipos_sangre': list(tipos_sangre),
-            'porcentaje_activos': round((pacientes_activos / total_pacientes * 100) if total_pacientes > 0 else 0, 2)
-        }
-        
-        return Response(estadisticas)
+        agrupar = request.query_params.get('agrupar') or None
+        if agrupar and agrupar not in estadisticas_pacientes.DIMENSIONES:
+            return Response(
+                {'detail': f"agrupar debe ser uno de: {', '.join(estadisticas_pacientes.DIMENSIONES)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-    # Métodos de exportación
-    def _exportar_pdf(self, queryset, nombre_archivo):
-        """Método para exportar a PDF"""
-        from django.http import HttpResponse
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="{nombre_archivo}.pdf"'
-        
-        # Aquí iría tu lógica de generación de PDF
-        # Por ahora retornamos un response básico
-        return response
+        return Response(estadisticas_pacientes.estadisticas(agrupar))
 
-    def _exportar_excel(self, queryset, nombre_archivo):
-        """Método para exportar a Excel"""
-        from django.http import HttpResponse
-        response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        response['Content-Disposition'] = f'attachment; filename="{nombre_archivo}.xlsx"'
-        
-        # Aquí iría tu lógica de generación de Excel
-        # Por ahora retornamos un response básico
-        return response
+    @action(detail=False, methods=['post'], url_path='importar')
+    def importar(self, request):
+        """
+        Importación de pacientes desde CSV (campo ``archivo``).
+        Columnas: email, nombre, apellido (obligatorias) y opcionalmente
+        password, telefono, direccion, fecha_nacimiento, genero y los datos
+        clínicos del paciente. ?crear_historia=false omite la historia clínica.
+        Se procesa dentro del request hasta IMPORTACION_API_MAX_FILAS filas e
+        IMPORTACION_API_MAX_PASSWORDS contraseñas; los archivos más grandes
+        se importan con ``manage.py importar_pacientes``. Los pacientes sin
+        password no pueden iniciar sesión hasta que un administrador se la
+        asigne con /usuarios/<id>/cambiar-password/ (``restablecer_password``).
+        """
+        if not hasattr(request.user, 'administrador'):
+            return Response(
+                {'detail': 'Solo los administradores pueden importar pacientes.'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        if 'archivo' not in request.FILES:
+            return Response({'detail': 'No se proporcionó el archivo CSV.'}, status=status.HTTP_400_BAD_REQUEST)
 
-    def _exportar_html(self, queryset, nombre_archivo):
-        """Método para exportar a HTML"""
-        from django.http import HttpResponse
-        response = HttpResponse(content_type='text/html')
-        response['Content-Disposition'] = f'attachment; filename="{nombre_archivo}.html"'
-        
-        # Aquí iría tu lógica de generación de HTML
-        # Por ahora retornamos un response básico
-        return response
+        from .services import importacion_pacientes
+
+        crear_historia = request.query_params.get('crear_historia', 'true').lower() not in ('0', 'false', 'no')
+        try:
+            resultado = importacion_pacientes.importar(
+                request.FILES['archivo'],
+                crear_historia=crear_historia,
+                max_filas=getattr(settings, 'IMPORTACION_API_MAX_FILAS', 1000),
+                max_passwords=getattr(settings, 'IMPORTACION_API_MAX_PASSWORDS', 20),
+                paralelo=False,
+            )
+        except importacion_pacientes.ArchivoDemasiadoGrande as e:
+            return Response(
+                {'detail': f'{str(e)}. Importe el archivo con el comando importar_pacientes.'},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+        except (ValueError, UnicodeDecodeError) as e:
+            return Response({'detail': f'Archivo inválido: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
+        except Rol.DoesNotExist:
+            return Response({'detail': 'No existe el rol Paciente.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        Bitacora.registrar_accion(
+            usuario=self.request.user,
+            request=self.request,
+            accion="Importó pacientes desde CSV",
+            modulo="pacientes",
+            detalles=f"Archivo {request.FILES['archivo'].name}: {resultado['creados']} creados, {resultado['con_errores']} con errores"
+        )
+        resultado.pop('ids_creados')
+        return Response(resultado, status=status.HTTP_200_OK)
+
+    # Métodos de exportación (streaming sobre values_list, sin instancias ni serializer por fila)
+    EXPORTACION_CAMPOS = [
+        'usuario__nombre', 'usuario__apellido', 'usuario__email', 'usuario__telefono',
+        'usuario__fecha_nacimiento', 'tipo_sangre', 'estado',
+        'tiene_alergias', 'tiene_enfermedades_cronicas', 'contacto_emergencia_nombre',
+    ]
+    EXPORTACION_ENCABEZADOS = [
+        'Nombre', 'Apellido', 'Email', 'Teléfono', 'Fecha Nac.', 'Tipo Sangre', 'Estado',
+        'Alergias', 'Enf. Crónicas', 'Contacto Emergencia',
+    ]
+    EXPORTACION_TITULO = "Reporte de Pacientes"
+    EXPORTACION_HOJA = "Pacientes"
+    EXPORTACION_ANCHOS = [2.5, 2.5, 4, 2, 1.8, 1.2, 1.3, 1.2, 1.3, 3]
 
 class PacienteSelectView(generics.ListAPIView):
     """
@@ -512,21 +689,21 @@ class PacienteSelectView(generics.ListAPIView):
             estado='Activo'
         ).order_by('usuario__nombre', 'usuario__apellido')
         
-        # Filtro por nombre o apellido
-        search = self.request.query_params.get('search', None)
+        # Filtro por prefijo de palabra en nombre, apellido o email (sin acentos)
+        search = self.request.query_params.get('search', '').strip()
         if search:
-            queryset = queryset.filter(
-                Q(usuario__nombre__icontains=search) |
-                Q(usuario__apellido__icontains=search) |
-                Q(usuario__email__icontains=search)
-            )
+            queryset = filtrar_por_prefijos(
+                queryset, search, ['usuario__nombre', 'usuario__apellido', 'usuario__email']
+            ).order_by(*ORDEN_SELECT)
         
         return queryset
     
+    def buscar_en_indice(self, search, limite):
+        return typeahead.buscar_pacientes(search, limite)
+
     def list(self, request, *args, **kwargs):
-        # Deshabilitar paginación
-        self.pagination_class = None
-        return super().list(request, *args, **kwargs)
+        # Con búsqueda, primeros TYPEAHEAD_MAX_RESULTADOS (índice en memoria o base de datos)
+        return _respuesta_select(self, request)
 
 class PacienteBusquedaAvanzadaView(generics.ListAPIView):
     """
@@ -534,6 +711,13 @@ class PacienteBusquedaAvanzadaView(generics.ListAPIView):
     """
     serializer_class = PacienteSerializer
     permission_classes = [IsAuthenticated]
+    # Parámetro (?x=true|false) -> columna generada de Paciente
+    FILTROS_INDICADORES = {
+        'tiene_alergias': 'tiene_alergias',
+        'tiene_enfermedades': 'tiene_enfermedades_cronicas',
+        'tiene_medicamentos': 'tiene_medicamentos_actuales',
+        'tiene_contacto_emergencia': 'tiene_contacto_emergencia',
+    }
     
     def get_queryset(self):
         queryset = Paciente.objects.select_related('usuario').all()
@@ -541,9 +725,7 @@ class PacienteBusquedaAvanzadaView(generics.ListAPIView):
         # Filtros avanzados
         estado = self.request.query_params.get('estado', None)
         tipo_sangre = self.request.query_params.get('tipo_sangre', None)
-        tiene_alergias = self.request.query_params.get('tiene_alergias', None)
-        tiene_enfermedades = self.request.query_params.get('tiene_enfermedades', None)
-        search = self.request.query_params.get('search', None)
+        search = self.request.query_params.get('search', '').strip()
         
         if estado:
             queryset = queryset.filter(estado=estado)
@@ -551,26 +733,32 @@ class PacienteBusquedaAvanzadaView(generics.ListAPIView):
         if tipo_sangre:
             queryset = queryset.filter(tipo_sangre__iexact=tipo_sangre)
         
-        if tiene_alergias:
-            if tiene_alergias.lower() == 'true':
-                queryset = queryset.filter(~Q(alergias__isnull=True) & ~Q(alergias__exact=''))
-            elif tiene_alergias.lower() == 'false':
-                queryset = queryset.filter(Q(alergias__isnull=True) | Q(alergias__exact=''))
-        
-        if tiene_enfermedades:
-            if tiene_enfermedades.lower() == 'true':
-                queryset = queryset.filter(~Q(enfermedades_cronicas__isnull=True) & ~Q(enfermedades_cronicas__exact=''))
-            elif tiene_enfermedades.lower() == 'false':
-                queryset = queryset.filter(Q(enfermedades_cronicas__isnull=True) | Q(enfermedades_cronicas__exact=''))
+        # Indicadores clínicos: columnas generadas con índice parcial
+        for parametro, campo in self.FILTROS_INDICADORES.items():
+            valor = self.request.query_params.get(parametro, '').lower()
+            if valor in ('true', 'false'):
+                queryset = queryset.filter(**{campo: valor == 'true'})
+        
+        # Rango de edad sobre usuario__fecha_nacimiento (indexado)
+        hoy = timezone.localdate()
+        edad_min = _entero(self.request.query_params.get('edad_min'))
+        edad_max = _entero(self.request.query_params.get('edad_max'))
+        if edad_min is not None:
+            queryset = queryset.filter(usuario__fecha_nacimiento__lte=estadisticas_pacientes.hace_anios(hoy, edad_min))
+        if edad_max is not None:
+            queryset = queryset.filter(usuario__fecha_nacimiento__gt=estadisticas_pacientes.hace_anios(hoy, edad_max + 1))
+        
+        enfermedad = self.request.query_params.get('enfermedad', '').strip()
+        if enfermedad:
+            queryset = queryset.filter(tiene_enfermedades_cronicas=True).filter(
+                filtro_contiene('enfermedades_cronicas', enfermedad)
+            )
         
         if search:
-            queryset = queryset.filter(
-                Q(usuario__nombre__icontains=search) |
-                Q(usuario__apellido__icontains=search) |
-                Q(usuario__email__icontains=search) |
-                Q(contacto_emergencia_nombre__icontains=search) |
-                Q(tipo_sangre__icontains=search)
-            )
+            queryset = filtrar_por_similitud(queryset, search, [
+                'usuario__nombre', 'usuario__apellido', 'usuario__email',
+                'contacto_emergencia_nombre', 'tipo_sangre'
+            ]).order_by('-similitud', 'usuario__nombre', 'usuario__apellido')
         
         return queryset
 
@@ -596,26 +784,28 @@ class MedicoSelectView(generics.ListAPIView):
         ).order_by('usuario__nombre', 'usuario__apellido')
         
         # Filtro por nombre, apellido o especialidad
-        search = self.request.query_params.get('search', None)
+        search = self.request.query_params.get('search', '').strip()
         especialidad_id = self.request.query_params.get('especialidad', None)
         
         if search:
-            queryset = queryset.filter(
-                Q(usuario__nombre__icontains=search) |
-                Q(usuario__apellido__icontains=search) |
-                Q(usuario__email__icontains=search) |
-                Q(numero_licencia__icontains=search)
-            )
+            queryset = filtrar_por_prefijos(queryset, search, [
+                'usuario__nombre', 'usuario__apellido', 'usuario__email', 'numero_licencia'
+            ]).order_by(*ORDEN_SELECT)
         
         if especialidad_id:
             queryset = queryset.filter(especialidades__id=especialidad_id)
         
         return queryset
     
+    def buscar_en_indice(self, search, limite):
+        especialidad = self.request.query_params.get('especialidad')
+        if especialidad and _entero(especialidad) is None:
+            return None
+        return typeahead.buscar_medicos(search, limite, _entero(especialidad))
+
     def list(self, request, *args, **kwargs):
-        # Deshabilitar paginación
-        self.pagination_class = None
-        return super().list(request, *args, **kwargs)
+        # Con búsqueda, primeros TYPEAHEAD_MAX_RESULTADOS (índice en memoria o base de datos)
+        return _respuesta_select(self, request)
 
 class AdministradorViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Administrador.objects.select_related('usuario').order_by('-usuario__id')
@@ -627,10 +817,14 @@ class MiPerfilView(generics.RetrieveUpdateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
+        # Con autenticación por claims el usuario viene con campos diferidos
+        if self.request.user.get_deferred_fields():
+            return Usuario.objects.get(pk=self.request.user.pk)
         return self.request.user
 
     def perform_update(self, serializer):
         instance = serializer.save()
+        transaction.on_commit(lambda: invalidar_usuario(instance.pk))
         # Registrar en bitácora
         Bitacora.registrar_accion(
             usuario=self.request.user,
@@ -695,29 +889,93 @@ class RolViewSet(viewsets.ModelViewSet):
                 } for p in permisos
             ])
         elif request.method == 'PUT':
-            ids = request.data.get('permisos', [])
-            if not isinstance(ids, list):
-                return Response({'detail': 'El campo permisos debe ser una lista de IDs.'}, status=status.HTTP_400_BAD_REQUEST)
-            
-            # Registrar cambio de permisos
-            permisos_anteriores = set(rol.permisos.values_list('id', flat=True))
-            permisos_nuevos = set(ids)
-            
-            rol.permisos.set(ids)
-            rol.save()
-            
+            serializer = PermisosRolSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+
+            try:
+                with transaction.atomic():
+                    agregados, removidos = asignacion_permisos.sincronizar_permisos_rol(
+                        rol, serializer.validated_data['permisos']
+                    )
+            except ValueError as e:
+                return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+            if agregados or removidos:
+                transaction.on_commit(lambda: permisos_rbac.invalidar_rol(rol.id))
+
             # Registrar en bitácora
             Bitacora.registrar_accion(
                 usuario=self.request.user,
                 request=self.request,
                 accion=f"Actualizó permisos del rol: {rol.nombre_rol}",
                 modulo="roles",
-                detalles=f"Permisos modificados: {len(permisos_nuevos - permisos_anteriores)} agregados, {len(permisos_anteriores - permisos_nuevos)} removidos"
-            
+                detalles=f"Permisos modificados: {len(agregados)} agregados, {len(removidos)} removidos"
             )
-            
+
             return Response({'detail': 'Permisos actualizados correctamente.'})
 
+    @action(detail=False, methods=['post'], url_path='asignar-matriz')
+    def asignar_matriz(self, request):
+        """
+        Asignación masiva de permisos para varios roles en una sola transacción.
+        Cuerpo:
+        {
+            "roles": [
+                {
+                    "rol": 3,
+                    "permisos": [1, 2],                          // opcional, reemplaza Rol.permisos
+                    "componentes": {"menu_usuarios": ["ver"]}    // opcional, matriz componente × acciones
+                }
+            ]
+        }
+        """
+        serializer = AsignacionMatrizSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        entradas = serializer.validated_data['roles']
+        roles = {entrada['rol'].id: entrada['rol'] for entrada in entradas}
+
+        resultado = {rol_id: {'rol': rol_id, 'permisos_agregados': 0, 'permisos_removidos': 0,
+                              'componentes_agregados': 0, 'componentes_removidos': 0} for rol_id in roles}
+        try:
+            with transaction.atomic():
+                matrices = {
+                    entrada['rol']: entrada['componentes']
+                    for entrada in entradas if 'componentes' in entrada
+                }
+                if matrices:
+                    for rol_id, (agregados, removidos) in asignacion_permisos.sincronizar_matrices(matrices).items():
+                        resultado[rol_id]['componentes_agregados'] = agregados
+                        resultado[rol_id]['componentes_removidos'] = removidos
+
+                for entrada in entradas:
+                    if 'permisos' in entrada:
+                        agregados, removidos = asignacion_permisos.sincronizar_permisos_rol(
+                            entrada['rol'], entrada['permisos']
+                        )
+                        resultado[entrada['rol'].id]['permisos_agregados'] = len(agregados)
+                        resultado[entrada['rol'].id]['permisos_removidos'] = len(removidos)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Una sola invalidación por rol modificado
+        modificados = [rol_id for rol_id, r in resultado.items() if any(v for k, v in r.items() if k != 'rol')]
+
+        def invalidar_modificados():
+            for rol_id in modificados:
+                permisos_rbac.invalidar_rol(rol_id)
+
+        transaction.on_commit(invalidar_modificados)
+
+        Bitacora.registrar_accion(
+            usuario=self.request.user,
+            request=self.request,
+            accion="Asignó matriz de permisos",
+            modulo="roles",
+            detalles=f"Roles modificados: {len(modificados)} de {len(roles)}"
+        )
+
+        return Response({'detail': 'Matriz de permisos aplicada correctamente.', 'roles': list(resultado.values())})
+
 class EspecialidadViewSet(viewsets.ModelViewSet):
     queryset = Especialidad.objects.all().order_by('-id')
     serializer_class = EspecialidadSerializer
@@ -822,6 +1080,7 @@ class ComponenteUIViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         instance = serializer.save()
+        transaction.on_commit(permisos_rbac.invalidar_todos)
         # Registrar en bitácora
         Bitacora.registrar_accion(
             usuario=self.request.user,
@@ -833,6 +1092,7 @@ class ComponenteUIViewSet(viewsets.ModelViewSet):
 
     def perform_update(self, serializer):
         instance = serializer.save()
+        transaction.on_commit(permisos_rbac.invalidar_todos)
         # Registrar en bitácora
         Bitacora.registrar_accion(
             usuario=self.request.user,
@@ -852,6 +1112,26 @@ class ComponenteUIViewSet(viewsets.ModelViewSet):
             detalles=f"Componente {instance.codigo_componente} eliminado"
         )
         instance.delete()
+        transaction.on_commit(permisos_rbac.invalidar_todos)
+
+    @action(detail=False, methods=['get'], url_path='mi-menu')
+    def mi_menu(self, request):
+        """
+        Árbol de menú (módulo -> componentes) filtrado por el rol del usuario.
+        Responde 304 si el cliente envía el ETag vigente en If-None-Match.
+        """
+        menu = permisos_rbac.menu_rol(request.user.id_rol_id)
+        etag = f'"{menu["etag"]}"'
+
+        if etag in request.headers.get('If-None-Match', ''):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(menu['arbol'])
+
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        response['Vary'] = 'Authorization'
+        return response
 
 class PermisoComponenteViewSet(viewsets.ModelViewSet):
     queryset = PermisoComponente.objects.select_related('permiso', 'componente').all().order_by('id')
@@ -862,6 +1142,7 @@ class PermisoComponenteViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         instance = serializer.save()
+        transaction.on_commit(permisos_rbac.invalidar_todos)
         # Registrar en bitácora
         Bitacora.registrar_accion(
             usuario=self.request.user,
@@ -873,6 +1154,7 @@ class PermisoComponenteViewSet(viewsets.ModelViewSet):
 
     def perform_update(self, serializer):
         instance = serializer.save()
+        transaction.on_commit(permisos_rbac.invalidar_todos)
         # Registrar en bitácora
         Bitacora.registrar_accion(
             usuario=self.request.user,
@@ -892,14 +1174,23 @@ class PermisoComponenteViewSet(viewsets.ModelViewSet):
             detalles=f"Permiso {instance.accion_permitida} eliminado"
         )
         instance.delete()
+        transaction.on_commit(permisos_rbac.invalidar_todos)
 
-class BitacoraViewSet(viewsets.ReadOnlyModelViewSet):
+class BitacoraViewSet(ExportacionMixin, LecturaReplicaMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Bitacora.objects.select_related('usuario').all().order_by('-fecha_hora')
+    acciones_solo_lectura = ('list', 'retrieve', 'detalle_completo')
     serializer_class = BitacoraSerializer
     permission_classes = [IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    filterset_fields = ['modulo_afectado', 'usuario']
-    search_fields = ['accion_realizada', 'modulo_afectado', 'usuario__email', 'detalles']
+    pagination_class = BitacoraPagination
+    filter_backends = [DjangoFilterBackend, OrderingFilter, BitacoraSearchFilter]
+    # Los filtros por rango de fecha_hora permiten a PostgreSQL descartar particiones
+    filterset_fields = {
+        'modulo_afectado': ['exact'],
+        'usuario': ['exact'],
+        'fecha_hora': ['gte', 'lte'],
+    }
+    # ?search= es texto completo sobre accion_realizada, modulo_afectado y
+    # detalles más el email del usuario (ver BitacoraSearchFilter)
     ordering_fields = ['fecha_hora', 'accion_realizada']
     ordering = ['-fecha_hora']
 
@@ -921,7 +1212,10 @@ class BitacoraViewSet(viewsets.ReadOnlyModelViewSet):
         )
         
         # Usa tu método existente de exportación PDF
-        return self._exportar_pdf(queryset, "Reporte_Bitacora")
+        if _exportacion_asincrona(request):
+            return _encolar_exportacion(self, 'bitacora', 'pdf', self._nombre_exportacion("Reporte_Bitacora"))
+
+        return self._exportar_pdf(queryset, self._nombre_exportacion("Reporte_Bitacora"))
 
     # EXPORTAR A EXCEL
     @action(detail=False, methods=['get'], url_path='exportar-excel')
@@ -941,7 +1235,10 @@ class BitacoraViewSet(viewsets.ReadOnlyModelViewSet):
         )
         
         # Usa tu método existente de exportación Excel
-        return self._exportar_excel(queryset, "Reporte_Bitacora")
+        if _exportacion_asincrona(request):
+            return _encolar_exportacion(self, 'bitacora', 'excel', self._nombre_exportacion("Reporte_Bitacora"))
+
+        return self._exportar_excel(queryset, self._nombre_exportacion("Reporte_Bitacora"))
 
     # EXPORTAR A HTML
     @action(detail=False, methods=['get'], url_path='exportar-html')
@@ -961,7 +1258,101 @@ class BitacoraViewSet(viewsets.ReadOnlyModelViewSet):
         )
         
         # Usa tu método existente de exportación HTML
-        return self._exportar_html(queryset, "Reporte_Bitacora")
+        if _exportacion_asincrona(request):
+            return _encolar_exportacion(self, 'bitacora', 'html', self._nombre_exportacion("Reporte_Bitacora"))
+
+        return self._exportar_html(queryset, self._nombre_exportacion("Reporte_Bitacora"))
+
+    # EXPORTAR A CSV
+    @action(detail=False, methods=['get'], url_path='exportar-csv')
+    def exportar_csv(self, request):
+        """
+        Exportar bitácora a CSV
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+
+        # Registrar en bitácora
+        Bitacora.registrar_accion(
+            usuario=self.request.user,
+            request=self.request,
+            accion="Exportó bitácora a CSV",
+            modulo="bitacora",
+            detalles="Exportación de registros de bitácora en formato CSV"
+        )
+
+        if _exportacion_asincrona(request):
+            return _encolar_exportacion(self, 'bitacora', 'csv', self._nombre_exportacion("Reporte_Bitacora"))
+
+        return self._exportar_csv(queryset, self._nombre_exportacion("Reporte_Bitacora"))
+
+    # CONSULTA DEL ARCHIVO EN FRÍO
+    @action(detail=False, methods=['get'], url_path='archivo')
+    def archivo(self, request):
+        """
+        Consultar registros de bitácora ya archivados fuera de la base de datos.
+        Filtros: desde, hasta (fecha o fecha/hora), usuario, modulo_afectado, search.
+        Paginación: page, page_size. Sin total: solo se descomprime hasta
+        completar la página pedida (y una fila más para saber si hay siguiente).
+        """
+        try:
+            desde = self._parsear_fecha_archivo(request.query_params.get('desde'))
+            hasta = self._parsear_fecha_archivo(request.query_params.get('hasta'), fin_de_dia=True)
+            page = max(int(request.query_params.get('page', 1)), 1)
+            page_size = min(max(int(request.query_params.get('page_size', 50)), 1), 500)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        usuario = request.query_params.get('usuario')
+        modulo = request.query_params.get('modulo_afectado')
+        termino = (request.query_params.get('search') or '').strip().lower()
+
+        def filtro(fila):
+            if usuario and str(fila['usuario']) != usuario:
+                return False
+            if modulo and fila['modulo_afectado'] != modulo:
+                return False
+            if termino:
+                contenido = ' '.join(str(fila[c] or '') for c in ('accion_realizada', 'modulo_afectado', 'detalles', 'usuario_email'))
+                return termino in contenido.lower()
+            return True
+
+        inicio = (page - 1) * page_size
+        filas = islice(archivo_bitacora.consultar_archivo(desde, hasta, filtro), inicio, inicio + page_size + 1)
+        resultados = list(filas)
+        hay_mas = len(resultados) > page_size
+
+        url = request.build_absolute_uri()
+        return Response({
+            'page': page,
+            'page_size': page_size,
+            'next': replace_query_param(url, 'page', page + 1) if hay_mas else None,
+            'previous': replace_query_param(url, 'page', page - 1) if page > 1 else None,
+            'results': resultados[:page_size],
+        })
+
+    @action(detail=False, methods=['get'], url_path='archivo/meses')
+    def archivo_meses(self, request):
+        """
+        Meses disponibles en el archivo en frío
+        """
+        return Response([
+            {'mes': mes.strftime('%Y-%m'), 'segmentos': segmentos, 'registros': filas}
+            for mes, segmentos, filas in archivo_bitacora.meses_archivados()
+        ])
+
+    def _parsear_fecha_archivo(self, valor, fin_de_dia=False):
+        if not valor:
+            return None
+        solo_fecha = parse_date(valor)
+        if solo_fecha is not None:
+            fecha = datetime.combine(solo_fecha, time.max if fin_de_dia else time.min)
+        else:
+            fecha = parse_datetime(valor)
+            if fecha is None:
+                raise ValueError(f"Fecha inválida: {valor}")
+        if timezone.is_naive(fecha):
+            fecha = timezone.make_aware(fecha)
+        return fecha
 
     # ENDPOINT PARA VER DETALLES COMPLETOS
     @action(detail=True, methods=['get'], url_path='detalle-completo')
@@ -1020,38 +1411,19 @@ class BitacoraViewSet(viewsets.ReadOnlyModelViewSet):
                 return 'Navegador no identificado'
         return 'No disponible'
 
-    # MÉTODOS DE EXPORTACIÓN (ajusta según tus métodos existentes)
-    def _exportar_pdf(self, queryset, nombre_archivo):
-        """Método para exportar a PDF - ajusta según tu implementación existente"""
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="{nombre_archivo}_{timezone.now().strftime("%Y%m%d_%H%M")}.pdf"'
-        
-        # Tu código de generación PDF aquí (como lo tienes en otros ViewSets)
-        # ...
-        
-        return response
-
-    def _exportar_excel(self, queryset, nombre_archivo):
-        """Método para exportar a Excel - ajusta según tu implementación existente"""
-        response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        response['Content-Disposition'] = f'attachment; filename="{nombre_archivo}_{timezone.now().strftime("%Y%m%d_%H%M")}.xlsx"'
-        
-        # Tu código de generación Excel aquí (como lo tienes en otros ViewSets)
-        # ...
-        
-        return response
+    # MÉTODOS DE EXPORTACIÓN
+    # Se escriben en streaming fila por fila (ver services/exportaciones.py),
+    # así exportar un año de bitácora no crece la memoria del worker.
+    EXPORTACION_CAMPOS = ['fecha_hora', 'usuario__email', 'accion_realizada', 'modulo_afectado', 'ip_address', 'detalles']
+    EXPORTACION_ENCABEZADOS = ['Fecha/Hora', 'Usuario', 'Acción', 'Módulo', 'IP', 'Detalles']
+    EXPORTACION_TITULO = "Reporte de Bitácora"
+    EXPORTACION_HOJA = "Bitacora"
+    EXPORTACION_ANCHOS = [2, 3, 4, 2, 1.5, 6]
 
-    def _exportar_html(self, queryset, nombre_archivo):
-        """Método para exportar a HTML - ajusta según tu implementación existente"""
-        response = HttpResponse(content_type='text/html')
-        response['Content-Disposition'] = f'attachment; filename="{nombre_archivo}_{timezone.now().strftime("%Y%m%d_%H%M")}.html"'
-        
-        # Tu código de generación HTML aquí (como lo tienes en otros ViewSets)
-        # ...
-        
-        return response
+    def _queryset_exportacion(self, queryset):
+        return queryset.order_by('-fecha_hora', '-id')
 
-class HorarioMedicoViewSet(viewsets.ModelViewSet):
+class HorarioMedicoViewSet(ExportacionMixin, viewsets.ModelViewSet):
     queryset = HorarioMedico.objects.select_related(
         'medico_especialidad__medico__usuario',
         'medico_especialidad__especialidad'
@@ -1116,7 +1488,9 @@ class HorarioMedicoViewSet(viewsets.ModelViewSet):
             modulo="horarios",
             detalles="Exportación de horarios médicos en formato PDF"
         )
-        return self._exportar_pdf(queryset, "Reporte_Horarios_Medicos")
+        if _exportacion_asincrona(request):
+            return _encolar_exportacion(self, 'horarios', 'pdf', self._nombre_exportacion("Reporte_Horarios_Medicos"))
+        return self._exportar_pdf(queryset, self._nombre_exportacion("Reporte_Horarios_Medicos"))
 
     @action(detail=False, methods=['get'], url_path='exportar-excel')
     def exportar_excel(self, request):
@@ -1128,7 +1502,9 @@ class HorarioMedicoViewSet(viewsets.ModelViewSet):
             modulo="horarios",
             detalles="Exportación de horarios médicos en formato Excel"
         )
-        return self._exportar_excel(queryset, "Reporte_Horarios_Medicos")
+        if _exportacion_asincrona(request):
+            return _encolar_exportacion(self, 'horarios', 'excel', self._nombre_exportacion("Reporte_Horarios_Medicos"))
+        return self._exportar_excel(queryset, self._nombre_exportacion("Reporte_Horarios_Medicos"))
 
     @action(detail=False, methods=['get'], url_path='exportar-html')
     def exportar_html(self, request):
@@ -1140,7 +1516,20 @@ class HorarioMedicoViewSet(viewsets.ModelViewSet):
             modulo="horarios",
             detalles="Exportación de horarios médicos en formato HTML"
         )
-        return self._exportar_html(queryset, "Reporte_Horarios_Medicos")
+        if _exportacion_asincrona(request):
+            return _encolar_exportacion(self, 'horarios', 'html', self._nombre_exportacion("Reporte_Horarios_Medicos"))
+        return self._exportar_html(queryset, self._nombre_exportacion("Reporte_Horarios_Medicos"))
+
+    EXPORTACION_CAMPOS = [
+        'medico_especialidad__medico__usuario__nombre', 'medico_especialidad__medico__usuario__apellido',
+        'medico_especialidad__especialidad__nombre', 'dia_semana', 'hora_inicio', 'hora_fin', 'activo',
+    ]
+    EXPORTACION_ENCABEZADOS = ['Nombre', 'Apellido', 'Especialidad', 'Día', 'Hora Inicio', 'Hora Fin', 'Activo']
+    EXPORTACION_TITULO = "Reporte de Horarios Médicos"
+    EXPORTACION_HOJA = "Horarios"
+    EXPORTACION_ANCHOS = [3, 3, 4, 2, 1.8, 1.8, 1.2]
+    # Las exportaciones de horarios no aplican los filtros de la URL
+    EXPORTACION_FILTRAR = False
 
     # ---------------- VER DETALLES DEL HORARIO ----------------
     @action(detail=True, methods=['get'], url_path='detalles')
@@ -1430,7 +1819,8 @@ class AgendaCitaViewSet(viewsets.ModelViewSet):
     ).all().order_by('-fecha_cita', '-hora_cita')
     serializer_class = AgendaCitaSerializer
     permission_classes = [IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    pagination_class = AgendaCitaPagination
+    filter_backends = [DjangoFilterBackend, OrderingFilter, SimilitudSearchFilter]
     filterset_fields = ['estado', 'medico_especialidad__medico', 'paciente', 'fecha_cita']
     search_fields = [
         'paciente__usuario__nombre', 'paciente__usuario__apellido',
@@ -1657,6 +2047,7 @@ class HistoriaClinicaViewSet(viewsets.ModelViewSet):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@solo_lectura()
 def historias_clinicas_por_paciente(request, paciente_id):
     """
     Endpoint para obtener todas las historias clínicas de un paciente específico
@@ -1726,6 +2117,7 @@ def historias_clinicas_por_paciente(request, paciente_id):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@solo_lectura()
 def historial_medico_completo(request, paciente_id):
     """
     Endpoint para obtener el historial médico completo de un paciente
@@ -2502,6 +2894,42 @@ class RegistroBackupViewSet(viewsets.ModelViewSet):
                 'valido': False
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+class ExportJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Exportaciones en segundo plano del usuario (?asincrono=true en los
+    endpoints de exportación). Se consulta el avance con GET /api/exports/<id>/
+    y se descarga el archivo con /api/exports/<id>/descargar/.
+    """
+    serializer_class = ExportJobSerializer
+    permission_classes = [IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['tipo', 'formato', 'estado']
+
+    def get_queryset(self):
+        return ExportJob.objects.filter(usuario=self.request.user).order_by('-fecha_creacion')
+
+    @action(detail=True, methods=['get'], url_path='descargar')
+    def descargar(self, request, pk=None):
+        trabajo = self.get_object()
+        if trabajo.estado != 'completado':
+            return Response(
+                {'detail': f'La exportación no está lista (estado: {trabajo.estado}).', 'progreso': trabajo.progreso},
+                status=status.HTTP_409_CONFLICT
+            )
+        if not trabajo.ruta_archivo or not os.path.exists(trabajo.ruta_archivo):
+            return Response(
+                {'detail': 'El archivo de la exportación ya no está disponible.'},
+                status=status.HTTP_410_GONE
+            )
+
+        extension, content_type = exportaciones.FORMATOS[trabajo.formato]
+        return FileResponse(
+            open(trabajo.ruta_archivo, 'rb'),
+            as_attachment=True,
+            filename=f"{trabajo.nombre_archivo}.{extension}",
+            content_type=content_type
+        )
+
 class MedicoEspecialidadSelectView(generics.ListAPIView):
     """
     Endpoint para select de MedicoEspecialidad - sin paginación
@@ -2595,7 +3023,7 @@ class TipoExamenViewSet(viewsets.ModelViewSet):
         )
         instance.delete()
 
-class SolicitudExamenViewSet(viewsets.ModelViewSet):
+class SolicitudExamenViewSet(ExportacionMixin, viewsets.ModelViewSet):
     queryset = SolicitudExamen.objects.select_related(
         'paciente__usuario',
         'medico__usuario',
@@ -2604,9 +3032,9 @@ class SolicitudExamenViewSet(viewsets.ModelViewSet):
     ).all().order_by('-fecha_solicitud')
     
     permission_classes = [IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, SearchFilter]
+    filter_backends = [DjangoFilterBackend, SimilitudSearchFilter]
     filterset_fields = ['estado', 'urgencia', 'paciente', 'medico', 'tipo_examen']
-    search_fields = ['paciente__usuario__nombre', 'tipo_examen__nombre']
+    search_fields = ['paciente__usuario__nombre', 'paciente__usuario__apellido', 'tipo_examen__nombre']
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -2701,10 +3129,21 @@ class SolicitudExamenViewSet(viewsets.ModelViewSet):
             modulo="examenes",
             detalles="Reporte de solicitudes de exámenes en PDF"
         )
-        
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="reporte_examenes_{timezone.now().strftime("%Y%m%d_%H%M")}.pdf"'
-        return response
+
+        nombre_archivo = f"reporte_examenes_{timezone.now().strftime('%Y%m%d_%H%M')}"
+        if _exportacion_asincrona(request):
+            return _encolar_exportacion(self, 'examenes', 'pdf', nombre_archivo)
+
+        return self._exportar_pdf(queryset, nombre_archivo)
+
+    EXPORTACION_CAMPOS = [
+        'fecha_solicitud', 'paciente__usuario__nombre', 'paciente__usuario__apellido',
+        'medico__usuario__apellido', 'tipo_examen__nombre', 'urgencia', 'estado', 'fecha_resultado',
+    ]
+    EXPORTACION_ENCABEZADOS = ['Fecha Solicitud', 'Nombre', 'Apellido', 'Médico', 'Examen', 'Urgencia', 'Estado', 'Fecha Resultado']
+    EXPORTACION_TITULO = "Reporte de Solicitudes de Exámenes"
+    EXPORTACION_HOJA = "Examenes"
+    EXPORTACION_ANCHOS = [2.5, 2.5, 2.5, 2.5, 4, 1.5, 1.5, 2.5]
 
     @action(detail=True, methods=['post'], url_path='registrar-resultado')
     def registrar_resultado(self, request, pk=None):
@@ -2898,6 +3337,7 @@ class NotificacionViewSet(viewsets.ModelViewSet):
     queryset = Notificacion.objects.all()
     serializer_class = NotificacionSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = NotificacionPagination
     filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_fields = ['tipo', 'leida']
     ordering_fields = ['fecha_envio']
@@ -3146,6 +3586,7 @@ class EnviarNotificacionPersonalizadaView(generics.CreateAPIView):
 # Endpoint para Dashboard
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@solo_lectura()
 def dashboard(request):
     """
     Endpoint para dashboard con datos listos para gráficas
@@ -3432,4 +3873,48 @@ def dashboard_admin(fecha_actual, mes_actual, año_actual):
         return Response(
             {'error': f'Error generando dashboard admin: {str(e)}'},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
\ No newline at end of file
+        )
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def perfiles_listar(request):
+    """Perfiles guardados por ?__profile= (services/perfilador.py), solo administradores"""
+    if not hasattr(request.user, 'administrador'):
+        return Response({'detail': 'Solo los administradores pueden ver los perfiles.'}, status=status.HTTP_403_FORBIDDEN)
+    return Response([
+        {**entrada, 'url_descarga': request.build_absolute_uri(reverse('perfil-descargar', args=[entrada['nombre']]))}
+        for entrada in perfilador.listar()
+    ])
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def perfil_descargar(request, nombre):
+    if not hasattr(request.user, 'administrador'):
+        return Response({'detail': 'Solo los administradores pueden descargar perfiles.'}, status=status.HTTP_403_FORBIDDEN)
+    ruta = perfilador.ruta_archivo(nombre)
+    if ruta is None:
+        return Response({'detail': 'El perfil no existe.'}, status=status.HTTP_404_NOT_FOUND)
+    return FileResponse(
+        open(ruta, 'rb'),
+        as_attachment=True,
+        filename=nombre,
+        content_type='text/plain' if nombre.endswith('.txt') else 'application/octet-stream'
+    )
+
+
+def metricas_prometheus(request):
+    """
+    Métricas en formato Prometheus (services/metricas.py). Vista de Django
+    simple, sin JWT ni throttling: exige 'Authorization: Bearer <token>' con
+    METRICAS_TOKEN, salvo METRICAS_PUBLICAS. Solo se enruta con
+    METRICAS_ACTIVAS.
+    """
+    token = getattr(settings, 'METRICAS_TOKEN', '')
+    if not getattr(settings, 'METRICAS_PUBLICAS', False) and not (
+        token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    ):
+        return HttpResponse('No autorizado', status=401, content_type='text/plain')
+
+    contenido, tipo = metricas.exponer()
+    return HttpResponse(contenido, content_type=tipo)
@@ -11,9 +11,11 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+import copy
 import os
 from datetime import timedelta
 from celery.schedules import crontab
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -50,6 +52,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'django_filters',
     'rest_framework',
     'core',
@@ -144,6 +147,42 @@ DATABASES = {
     }
 }
 
+# Manejo de conexiones a PostgreSQL por entorno (manage.py benchmark_conexiones los compara):
+# 'nueva': una conexión por request, se cierra al terminar
+# 'persistente': cada proceso/hilo reutiliza su conexión hasta DB_CONN_MAX_AGE y la verifica al empezar cada request
+# 'pool': pool de psycopg 3 por proceso (DB_POOL_MIN..DB_POOL_MAX); la conexión se verifica al prestarla
+DB_CONEXIONES_MODO = os.environ.get('DB_CONEXIONES_MODO', 'persistente')
+if DB_CONEXIONES_MODO == 'persistente':
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', 60))  # Segundos; None = sin límite
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+elif DB_CONEXIONES_MODO == 'pool':
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True  # Django lo pasa al pool como check=ConnectionPool.check_connection
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.environ.get('DB_POOL_MIN', 2)),
+        'max_size': int(os.environ.get('DB_POOL_MAX', 10)),  # Por proceso: al menos los hilos del worker
+        'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),  # Espera máxima por una conexión libre
+        'max_idle': float(os.environ.get('DB_POOL_MAX_IDLE', 300)),
+    }
+elif DB_CONEXIONES_MODO != 'nueva':
+    raise ImproperlyConfigured(f"DB_CONEXIONES_MODO inválido: {DB_CONEXIONES_MODO} (nueva, persistente o pool)")
+
+# Réplica de lectura (core/routers.py): dashboard, estadísticas, bitácora, historiales y exportaciones
+# leen del alias 'replica'. DB_REPLICA_MISMA_BASE=true crea el alias sobre la misma base (pruebas locales).
+DB_REPLICA_HOST = os.environ.get('DB_REPLICA_HOST', '')
+DB_REPLICA_MISMA_BASE = os.getenv('DB_REPLICA_MISMA_BASE', 'False').lower() == 'true'
+if DB_REPLICA_HOST or DB_REPLICA_MISMA_BASE:
+    DATABASES['replica'] = copy.deepcopy(DATABASES['default'])
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+    if DB_REPLICA_HOST:
+        DATABASES['replica'].update({
+            'HOST': DB_REPLICA_HOST,
+            'PORT': os.environ.get('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+            'NAME': os.environ.get('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+            'USER': os.environ.get('DB_REPLICA_USER', DATABASES['default']['USER']),
+            'PASSWORD': os.environ.get('DB_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']),
+        })
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
 AUTH_USER_MODEL = 'core.Usuario'
 
 # Password validation
@@ -191,9 +230,20 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 #opcional
+# 'db': el usuario se carga de la base de datos en cada request (por defecto)
+# 'claims': el usuario se arma desde los claims firmados del token (core/authentication.py)
+# 'cache': el usuario completo (con rol y perfiles) se toma de la caché compartida
+JWT_AUTH_MODO = os.environ.get('JWT_AUTH_MODO', 'db')
+JWT_AUTENTICACION_CLASES = {
+    'db': 'rest_framework_simplejwt.authentication.JWTAuthentication',
+    'claims': 'core.authentication.ClaimsJWTAuthentication',
+    'cache': 'core.authentication.CachedUserJWTAuthentication',
+}
+AUTH_USUARIO_CACHE_TTL = int(os.environ.get('AUTH_USUARIO_CACHE_TTL', 300))  # Segundos
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        JWT_AUTENTICACION_CLASES[JWT_AUTH_MODO],
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -230,6 +280,7 @@ SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': False,
     'BLACKLIST_AFTER_ROTATION': True,
     'AUTH_HEADER_TYPES': ('Bearer',),                  # Usa "Bearer <token>" en los headers
+    'TOKEN_REFRESH_SERIALIZER': 'core.authentication.ClaimsTokenRefreshSerializer',  # Renueva los claims de rol
 }
 
 CORS_ALLOW_HEADERS = [
@@ -295,8 +346,125 @@ CELERY_BEAT_SCHEDULE = {
         # O usar crontab:
         # 'schedule': crontab(hour=3, minute=0, day_of_week=0),  # Domingos a las 3:00 AM
     },
+    'particiones-bitacora-diario': {
+        'task': 'core.tasks.mantener_particiones_bitacora',
+        'schedule': crontab(hour=1, minute=30),  # 1:30 AM diario
+    },
+    'archivo-bitacora-diario': {
+        'task': 'core.tasks.archivar_bitacora_antigua',
+        'schedule': crontab(hour=2, minute=30),  # 2:30 AM diario
+    },
+    'exportaciones-vencidas-cada-hora': {
+        'task': 'core.tasks.limpiar_exportaciones_vencidas',
+        'schedule': crontab(minute=15),  # Cada hora, al minuto 15
+    },
 }
 
+# Particionado mensual de la bitácora
+BITACORA_PARTICIONES_FUTURAS = int(os.environ.get('BITACORA_PARTICIONES_FUTURAS', 3))  # Meses creados por adelantado
+BITACORA_RETENCION_MESES = int(os.environ.get('BITACORA_RETENCION_MESES', 24))  # 0 = sin retención
+BITACORA_RETENCION_ACCION = os.environ.get('BITACORA_RETENCION_ACCION', 'detach')  # 'detach' o 'drop'
+
+# Archivo en frío de la bitácora (gzip JSONL + índice en backups/)
+BITACORA_ARCHIVO_MESES = int(os.environ.get('BITACORA_ARCHIVO_MESES', 12))  # Meses que quedan en PostgreSQL; 0 = no archivar
+BITACORA_ARCHIVO_DIR = os.environ.get('BITACORA_ARCHIVO_DIR', os.path.join(BACKUP_DIR, 'bitacora_archivo'))
+BITACORA_ARCHIVO_FILAS_SEGMENTO = int(os.environ.get('BITACORA_ARCHIVO_FILAS_SEGMENTO', 5000))
+
+# Caché compartida (Redis en producción, memoria local en desarrollo)
+CACHE_URL = os.environ.get('CACHE_URL')
+if CACHE_URL or os.environ.get('ENVIRONMENT') == 'production':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL or os.environ.get('REDIS_URL', 'redis://localhost:6379/1'),
+            'KEY_PREFIX': 'gdoc',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Las versiones de rol y de usuario de los claims viven en la caché: con memoria
+# local cada proceso tendría las suyas y rechazaría los tokens emitidos por otro
+if JWT_AUTH_MODO == 'claims' and CACHES['default']['BACKEND'].endswith('LocMemCache'):
+    raise ImproperlyConfigured("JWT_AUTH_MODO=claims requiere una caché compartida (CACHE_URL)")
+
+# Lo mismo vale para las versiones de la matriz RBAC, del índice typeahead y de
+# las estadísticas: con varios workers (WEB_CONCURRENCY, la variable que lee
+# gunicorn) una invalidación solo llegaría al proceso que la hizo
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', 1))
+if WEB_CONCURRENCY > 1 and CACHES['default']['BACKEND'].endswith('LocMemCache'):
+    raise ImproperlyConfigured("WEB_CONCURRENCY > 1 requiere una caché compartida (CACHE_URL)")
+
+# Matriz RBAC compilada (services/permisos.py)
+RBAC_MATRIZ_TTL = int(os.environ.get('RBAC_MATRIZ_TTL', 3600))
+RBAC_VERSION_REVALIDAR_SEGUNDOS = float(os.environ.get('RBAC_VERSION_REVALIDAR_SEGUNDOS', 5))
+
+# Exportaciones en streaming: filas leídas por bloque desde el cursor del servidor
+EXPORTACION_CHUNK_SIZE = int(os.environ.get('EXPORTACION_CHUNK_SIZE', 2000))
+
+# Índice typeahead en memoria de los selects de pacientes/médicos (services/typeahead.py)
+TYPEAHEAD_MAX_RESULTADOS = int(os.environ.get('TYPEAHEAD_MAX_RESULTADOS', 50))  # Top-K por búsqueda
+TYPEAHEAD_REVALIDAR_SEGUNDOS = float(os.environ.get('TYPEAHEAD_REVALIDAR_SEGUNDOS', 2))  # Retraso máximo entre procesos
+TYPEAHEAD_CAMBIOS_TTL = int(os.environ.get('TYPEAHEAD_CAMBIOS_TTL', 3600))  # Sin el registro de cambios se reconstruye
+TYPEAHEAD_RECONSTRUIR_EN_SEGUNDO_PLANO = os.environ.get('TYPEAHEAD_RECONSTRUIR_EN_SEGUNDO_PLANO', 'True').lower() == 'true'  # Reconstrucción completa fuera del request
+TYPEAHEAD_PRECARGAR = os.environ.get('TYPEAHEAD_PRECARGAR', 'True').lower() == 'true'  # Construir los índices al iniciar el proceso WSGI
+
+# Estadísticas de pacientes cacheadas por versión (services/estadisticas_pacientes.py)
+ESTADISTICAS_CACHE_TTL = int(os.environ.get('ESTADISTICAS_CACHE_TTL', 300))
+
+# Exportaciones en segundo plano (services/trabajos_exportacion.py)
+EXPORTACION_TRABAJOS_DIR = os.environ.get('EXPORTACION_TRABAJOS_DIR', os.path.join(BACKUP_DIR, 'exportaciones'))
+EXPORTACION_TRABAJOS_TTL_HORAS = int(os.environ.get('EXPORTACION_TRABAJOS_TTL_HORAS', 24))  # Vigencia del archivo generado
+EXPORTACION_TRABAJOS_ESTANCADO_MINUTOS = int(os.environ.get('EXPORTACION_TRABAJOS_ESTANCADO_MINUTOS', 60))  # Pendiente/procesando por más tiempo = fallido
+
+# Importación masiva de pacientes (services/importacion_pacientes.py)
+IMPORTACION_LOTE = int(os.environ.get('IMPORTACION_LOTE', 1000))  # Filas por bulk_create/transacción
+IMPORTACION_PROCESOS = int(os.environ.get('IMPORTACION_PROCESOS', 0)) or None  # Procesos para hashear contraseñas; vacío = núcleos
+IMPORTACION_API_MAX_FILAS = int(os.environ.get('IMPORTACION_API_MAX_FILAS', 1000))  # Más filas: manage.py importar_pacientes
+IMPORTACION_API_MAX_PASSWORDS = int(os.environ.get('IMPORTACION_API_MAX_PASSWORDS', 20))  # ~0,3 s por hash dentro del request
+
+# Benchmark de endpoints (manage.py benchmark): línea base versionada en el repositorio
+BENCHMARK_LINEA_BASE = os.environ.get('BENCHMARK_LINEA_BASE', os.path.join(BASE_DIR, 'benchmarks', 'linea_base.json'))
+
+# Detector de N+1 por request (core/middleware.py): solo desarrollo/staging
+SQL_PERFIL_ACTIVO = os.getenv('SQL_PERFIL_ACTIVO', 'False').lower() == 'true'
+SQL_N1_UMBRAL = int(os.environ.get('SQL_N1_UMBRAL', 5))  # Repeticiones de la misma consulta para marcar N+1
+SQL_N1_MAXIMO_REPORTADAS = int(os.environ.get('SQL_N1_MAXIMO_REPORTADAS', 5))
+SQL_PERFIL_PROFUNDIDAD_PILA = int(os.environ.get('SQL_PERFIL_PROFUNDIDAD_PILA', 3))  # Frames del proyecto por consulta
+if SQL_PERFIL_ACTIVO:
+    # Primero, para contar también las consultas de los demás middlewares
+    MIDDLEWARE.insert(0, 'core.middleware.PerfilSQLMiddleware')
+
+# Métricas Prometheus en /metrics (services/metricas.py). Con varios procesos
+# (gunicorn, Celery prefork) definir PROMETHEUS_MULTIPROC_DIR en el entorno.
+# Desactivadas por defecto; activas, /metrics exige METRICAS_TOKEN salvo que
+# se declare público a propósito (p. ej. solo accesible desde la red interna).
+METRICAS_ACTIVAS = os.getenv('METRICAS_ACTIVAS', 'False').lower() == 'true'
+METRICAS_TOKEN = os.environ.get('METRICAS_TOKEN', '')  # 'Authorization: Bearer <token>'
+METRICAS_PUBLICAS = os.getenv('METRICAS_PUBLICAS', 'False').lower() == 'true'
+if METRICAS_ACTIVAS and not METRICAS_TOKEN and not METRICAS_PUBLICAS:
+    raise ImproperlyConfigured("METRICAS_ACTIVAS requiere METRICAS_TOKEN (o METRICAS_PUBLICAS=True)")
+if METRICAS_ACTIVAS:
+    MIDDLEWARE.insert(0, 'core.middleware.MetricasMiddleware')
+
+# Perfilado bajo demanda con ?__profile=1 / ?__profile=muestreo, solo administradores (services/perfilador.py)
+PERFILADOR_ACTIVO = os.getenv('PERFILADOR_ACTIVO', 'True').lower() == 'true'
+PERFILADOR_DIR = os.environ.get('PERFILADOR_DIR', os.path.join(BACKUP_DIR, 'perfiles'))
+PERFILADOR_MAXIMO = int(os.environ.get('PERFILADOR_MAXIMO', 50))  # Perfiles guardados; se borran los más antiguos
+PERFILADOR_INTERVALO_MS = float(os.environ.get('PERFILADOR_INTERVALO_MS', 5))  # Intervalo del muestreador
+if PERFILADOR_ACTIVO:
+    MIDDLEWARE.append('core.middleware.PerfiladorMiddleware')
+
+# Registro de consultas lentas (services/consultas_lentas.py, reporte: manage.py consultas_lentas)
+SQL_LENTAS_ACTIVO = os.getenv('SQL_LENTAS_ACTIVO', 'True').lower() == 'true'
+SQL_LENTAS_UMBRAL_MS = float(os.environ.get('SQL_LENTAS_UMBRAL_MS', 200))
+SQL_LENTAS_EXPLAIN = os.getenv('SQL_LENTAS_EXPLAIN', 'False').lower() == 'true'  # Re-ejecuta la peor muestra con EXPLAIN ANALYZE
+SQL_LENTAS_DIR = os.environ.get('SQL_LENTAS_DIR', os.path.join(BACKUP_DIR, 'consultas_lentas'))
+
 # En settings.py - Agregar estas configuraciones
 #DBBACKUP_POSTGRESQL_BACKUP_CMD = r'C:\Program Files\PostgreSQL\16\bin\pg_dump.exe'
 #DBBACKUP_POSTGRESQL_RESTORE_CMD = r'C:\Program Files\PostgreSQL\16\bin\psql.exe'
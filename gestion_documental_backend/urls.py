@@ -14,11 +14,17 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 
+from core.views import metricas_prometheus
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('core.urls')),  # Asegúrate de usar el nombre correcto de tu app
     
 ]
+
+if settings.METRICAS_ACTIVAS:
+    urlpatterns.append(path('metrics', metricas_prometheus, name='metricas'))
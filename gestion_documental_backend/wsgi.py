@@ -9,8 +9,14 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gestion_documental_backend.settings')
 
 application = get_wsgi_application()
+
+# Índices de los selects listos antes del primer request (en segundo plano)
+if settings.TYPEAHEAD_PRECARGAR:
+    from core.services import typeahead
+    typeahead.calentar()